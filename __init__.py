@@ -1,5 +1,19 @@
+from src.embeddings import *
 from src.llamaindex_rag import *
+from src.sqlite_cache import *
+from src.emotion_cache import *
+from src.response_cache import *
+from src.emotion_engines import *
+from src.fulltext import *
 from src.nlp import *
+from src.analysis_store import *
+from src.backfill import *
 from src.pdf import  *
 from src.plots import *
+from src.summary import *
+from src.trends import *
+from src.synthetic import *
+from src.agent import *
+from src.query_router import *
+from src.storage import *
 from src.prompts import  *
\ No newline at end of file
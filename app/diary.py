@@ -2,32 +2,27 @@ import pandas as pd
 from dotenv import load_dotenv
 import streamlit as st
 from src.pdf import CreateDiary
+from src.analysis_store import AnalysisStore, get_entry_keys
+from src.fulltext import FullTextIndex
+from src.storage import get_storage
+from src.prompts import diary_questions, format_diary_section
 from datetime import datetime
-from src.nlp import get_emotions_from_text, get_labels_by_category,add_remaining_ner_labels
-import os
+from src.nlp import count_words, get_entry_entity_counts, get_entry_records
 
 load_dotenv()
 
-def save_df(df, folder, filename):
+def save_df(df, table):
     """
-    Saves a DataFrame to a CSV file within a specified folder. If a CSV file with the same name already exists,
-    it appends the new DataFrame to the existing one.
+    Appends a DataFrame to one of the diary tables through the configured storage backend.
 
     Args:
         df (pd.DataFrame): The DataFrame to be saved.
-        folder (str): The folder where the CSV file will be saved.
-        filename (str): The name of the CSV file (without the .csv extension).
+        table (str): The table name ('emotions' or 'text').
 
     Returns:
         None
     """
-    df_path = os.path.join(base_dir, 'data', folder).replace('\\', '/')
-    if create_diary.is_folder_empty(df_path):
-        df.to_csv(f"data/{folder}/{filename}.csv", index=False)
-    else:
-        stored_df = pd.read_csv(f"data/{folder}/{filename}.csv")
-        stored_df = pd.concat([df, stored_df])
-        stored_df.to_csv(f"data/{folder}/{filename}.csv", index=False)
+    get_storage().append(table, df)
 
 def clear_text():
     """
@@ -49,10 +44,44 @@ def transforming_text(question, text):
     Returns:
         str: The transformed text, starting with the date and question, followed by the main text.
     """
-    starting_sentence = f'On {current_month_name} {current_day}, {current_year},'
-    diary_text = starting_sentence + '' + text
-    diary_text = "\n\n".join([question, diary_text])
-    return diary_text
+    return format_diary_section(question, text, selected_date)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def analyse_entry(selected_date, highlights_txt, work_txt, family_txt, friends_txt):
+    """
+    Runs the emotion, named entity and word count analysis of a diary entry, parsing it with spaCy once.
+
+    The result is memoised by Streamlit on the hash of the arguments, so the analysis runs once per
+    distinct entry instead of on every rerun of the script.
+
+    Args:
+        selected_date (datetime.date): The date of the entry.
+        highlights_txt (str): The text about the highlights of the day.
+        work_txt (str): The text about work.
+        family_txt (str): The text about family.
+        friends_txt (str): The text about friends.
+
+    Returns:
+        tuple: The emotions DataFrame (emotion scores and most frequent entities by type), the text
+        DataFrame, and the entity counts and word counts of the entry for the analysis store.
+    """
+    combined_text = "\n\n".join([highlights_txt, work_txt, family_txt, friends_txt])
+
+    text_df = pd.DataFrame({
+        'record_dt': selected_date.strftime("%Y-%m-%d"),
+        'highlights_txt': highlights_txt,
+        'work_txt': work_txt,
+        'family_txt': family_txt,
+        'friends_txt': friends_txt,
+        'combined_txt': combined_text,
+    },
+        index=[0]
+    )
+
+    entity_counts = get_entry_entity_counts(text_df)
+    emotions_df = get_entry_records(text_df, entity_counts=entity_counts)
+    word_counts = [count_words(combined_text)]
+    return emotions_df, text_df, entity_counts, word_counts
 
 if __name__ == '__main__':
     ## INTRODUCTION
@@ -70,10 +99,10 @@ if __name__ == '__main__':
     ''', unsafe_allow_html=True)
 
     # Questions
-    q1 = "What were the highlights of your day?"
-    q2 = "How did your tasks and activities at work unfold today, and how did you feel in the work environment?"
-    q3 = "how was the moments you shared with your family today?"
-    q4 = "How did your interactions with friends go today?"
+    q1 = diary_questions['highlights']
+    q2 = diary_questions['work']
+    q3 = diary_questions['family']
+    q4 = diary_questions['friends']
 
     st.header("Begin Your Daily Journey")
     st.write("Let's start documenting your memories and emotions!")
@@ -105,63 +134,29 @@ if __name__ == '__main__':
     combined_text = "\n\n".join([highlights_txt, work_txt, family_txt, friends_txt])
     combined_text_qa = "\n\n".join([highlights_txt_qa, work_txt_qa, family_txt_qa, friends_txt_qa])
 
-    highlights_emotions = get_emotions_from_text(highlights_txt,'highlights',selected_date=selected_date, filter=False)
-    work_emotions = get_emotions_from_text(work_txt,'work', selected_date=selected_date, filter=False)
-    family_emotions = get_emotions_from_text(family_txt,'family', selected_date=selected_date, filter=False)
-    friends_emotions = get_emotions_from_text(friends_txt,'friends', selected_date=selected_date, filter=False)
-    all_emotions = get_emotions_from_text(combined_text,'day', selected_date=selected_date, filter=False)
-    emotions_df = pd.concat(
-        [
-                 highlights_emotions,
-                 work_emotions,
-                 family_emotions,
-                 friends_emotions,
-                 all_emotions
-        ],
-        axis=0
-    ).reset_index(drop=True)
-
-    text_df = pd.DataFrame({
-        'record_dt': selected_date.strftime("%Y-%m-%d"),
-        'highlights_txt': highlights_txt,
-        'work_txt': work_txt,
-        'family_txt': family_txt,
-        'friends_txt': friends_txt,
-        'combined_txt': combined_text,
-    },
-        index=[0]
-    )
-
-    highlights_label = get_labels_by_category(text_df, category='highlights', record_dt=selected_date)
-    work_label = get_labels_by_category(text_df, category='work', record_dt=selected_date)
-    family_label = get_labels_by_category(text_df, category='family', record_dt=selected_date)
-    friends_label = get_labels_by_category(text_df, category='friends', record_dt=selected_date)
-    combined_label = get_labels_by_category(text_df, category='combined', record_dt=selected_date)
-
-    label_occurrences = pd.concat([
-        highlights_label,
-        work_label,
-        family_label,
-        friends_label,
-        combined_label
-    ]).reset_index(drop=True)
-
-    emotions_df = emotions_df.merge(label_occurrences, on=['record_dt','type'], how='left')
-    emotions_df = add_remaining_ner_labels(emotions_df)
-
-
     if st.button("Save", type="primary", key='registry'):
+        # The analysis only runs on Save and is memoised on the entry text
+        with st.spinner("Analysing your writing..."):
+            emotions_df, text_df, entity_counts, word_counts = analyse_entry(
+                selected_date, highlights_txt, work_txt, family_txt, friends_txt
+            )
+
         create_diary = CreateDiary()
-        base_dir = os.path.dirname(__file__)[:-4]
 
         # Saving tabular data
-        save_df(emotions_df,'stats', 'emotions_df')
-        save_df(text_df,'text', 'text')
+        save_df(emotions_df, 'emotions')
+        save_df(text_df, 'text')
+
+        # Storing the entry analysis for the dashboard, and indexing it for the full-text search
+        analysis_store = AnalysisStore()
+        entry_keys = get_entry_keys(text_df)[0]
+        analysis_store.index_entries(entry_keys, entity_counts)
+        analysis_store.index_word_counts(entry_keys, word_counts)
+        FullTextIndex().index_text_df(text_df)
 
         # Saving pdf
-        print(combined_text)
         new_page_name = f'diary_from_{current_month_name}_{current_day}_{current_year}.pdf'
-        create_diary.create_pdf(new_page_name, combined_text_qa)
+        create_diary.create_pdf(new_page_name, combined_text_qa, record_dt=selected_date)
         st.write("Your writing has been successfully saved.")
         current_dt = datetime.now()
         formatted_time = current_dt.strftime("%Y-%m-%d %H:%M:%S")
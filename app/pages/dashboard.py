@@ -1,10 +1,10 @@
-from src.prompts import new_prompt, instruction_str, context, instruction_str_ner
-from llama_index.core.tools import QueryEngineTool, ToolMetadata
-from llama_index.core.agent import ReActAgent
-from llama_index.llms.openai import OpenAI
-from src.llamaindex_rag import query_engine
-from llama_index.experimental.query_engine import PandasQueryEngine
+from src.agent import CachedAgent
+from src.query_router import QueryRouter, get_router_stats
+from src.llamaindex_rag import warm_up_index
 from src.plots import *
+from src.summary import (
+    get_dashboard_data, get_dashboard_summary, get_data_version, get_date_bounds, get_emotion_figures
+)
 import os
 from src.nlp import *
 
@@ -12,14 +12,22 @@ st.set_page_config(
     page_title="Hello",
     page_icon=":chart_with_upwards_trend:",
 )
-base_dir = os.path.dirname(__file__)[:-10]
-csv_path = os.path.join(base_dir, 'data', 'stats','emotions_df.csv').replace('\\', '/')
-emotions_df = pd.read_csv(csv_path)
-text_df = pd.read_csv("data/text/text.csv")
 
-min_date = emotions_df['record_dt'].min()
+# Start building the memories index in the background; the agent itself is only built on the
+# first chat message
+if os.getenv("LLM_DIARY_WARM_UP_INDEX", "1") == "1":
+    warm_up_index()
+
+# Every derived artefact below is cached per (date range, data version); saving an entry bumps
+# the data version, and any other rerun (chat message, tab switch) reuses the cached results
+data_version = get_data_version()
+
+min_date, max_date = get_date_bounds(data_version)
+if min_date is None:
+    st.write("# Welcome to Dashboard! 👋")
+    st.info("Your diary is empty. Write your first entry on the diary page to see your dashboard.")
+    st.stop()
 min_date = datetime.strptime(min_date, '%Y-%m-%d').date()
-max_date = emotions_df['record_dt'].max()
 max_date = datetime.strptime(max_date, '%Y-%m-%d').date()
 
 with st.sidebar:
@@ -29,80 +37,33 @@ with st.sidebar:
     end_dt = st.date_input("End date", value=max_date, label_visibility="visible")
     end_dt = end_dt.strftime("%Y-%m-%d")
 
-# Filtering datasets based on the selected date
-emotions_df = emotions_df[(emotions_df['record_dt'] >= begin_dt) & (emotions_df['record_dt'] <= end_dt)]
-text_df = text_df[(text_df['record_dt'] >= begin_dt) & (text_df['record_dt'] <= end_dt)]
-
-
-# Combine the strings according to type
-combine_string = combine_string_category(text_df)
-combine_highlights_string = combine_string_category(text_df, filter='highlights')
-combine_work_string = combine_string_category(text_df, filter='work')
-combine_family_string = combine_string_category(text_df, filter='family')
-combine_friends_string = combine_string_category(text_df, filter='friends')
-
-# Get NER count for each type
-ner_combined = get_ner(combine_string)
-ner_highlights_combined = get_ner(combine_highlights_string)
-ner_work_combined = get_ner(combine_work_string)
-ner_family_combined = get_ner(combine_family_string)
-ner_friends_combined = get_ner(combine_friends_string)
-
-
-# Emotions df
-emotions_query_engine = PandasQueryEngine(
-    df=emotions_df, verbose=True, instruction_str=instruction_str
-)
-emotions_query_engine.update_prompts({"pandas_prompt": new_prompt})
-
-# The most common names
-text_emotions_query_engine = PandasQueryEngine(
-    df=ner_combined, verbose=True, instruction_str=instruction_str_ner
-)
-text_emotions_query_engine.update_prompts({"pandas_prompt": new_prompt})
-
-## AI Agent
-tools = [
-    QueryEngineTool(
-        query_engine= emotions_query_engine,
-        metadata=ToolMetadata(
-            name="emotions_score",
-            description="this gives information about the score of the emotions (happy, angry, surprise, sad, fear) over time",
-        ),
-    ),
-    QueryEngineTool(
-        query_engine=text_emotions_query_engine,
-        metadata=ToolMetadata(
-            name="most_frequent_name",
-            description="this gives information about the most frequent names",
-        ),
-    ),
-    QueryEngineTool(
-        query_engine=query_engine,
-        metadata=ToolMetadata(
-            name="memories",
-            description="this gives detailed information and the date when it happend for the memories recorded",
-        ),
-    ),
-]
-
-llm = OpenAI(model="gpt-3.5-turbo")
-agent = ReActAgent.from_tools(tools, llm=llm, verbose=True, context=context)
-
-latest_dt = emotions_df['record_dt'].max()
+# Loading only the rows of the selected dates, with the NER count for each type from the
+# per-entry analysis store
+dashboard_data = get_dashboard_data(begin_dt, end_dt, data_version)
+emotions_df = dashboard_data['emotions_df']
+ner_combined = dashboard_data['ner']['combined']
+ner_highlights_combined = dashboard_data['ner']['highlights']
+ner_work_combined = dashboard_data['ner']['work']
+ner_family_combined = dashboard_data['ner']['family']
+ner_friends_combined = dashboard_data['ner']['friends']
 
 ## Introduction
 st.write("# Welcome to Dashboard! 👋")
 
 ## Summary
-overall_emotion = get_current_emotion(emotions_df)
-emotions_sentences = get_sentences_from_emotions(emotions_df)
-happy_trend = get_emotions_trend(emotions_df, category='happy')
-angry_trend = get_emotions_trend(emotions_df, category='angry')
-surprise_trend = get_emotions_trend(emotions_df, category='surprise')
-sad_trend = get_emotions_trend(emotions_df, category='sad')
-fear_trend = get_emotions_trend(emotions_df, category='fear')
-names = get_most_cited_person(ner_combined)
+dashboard_summary = get_dashboard_summary(begin_dt, end_dt, data_version)
+if dashboard_summary is None:
+    st.info("There are no entries between the selected dates. Pick another start or end date.")
+    st.stop()
+latest_dt = dashboard_summary['latest_dt']
+overall_emotion = dashboard_summary['overall_emotion']
+emotions_sentences = dashboard_summary['emotions_sentences']
+happy_trend = dashboard_summary['trends']['happy']
+angry_trend = dashboard_summary['trends']['angry']
+surprise_trend = dashboard_summary['trends']['surprise']
+sad_trend = dashboard_summary['trends']['sad']
+fear_trend = dashboard_summary['trends']['fear']
+names = dashboard_summary['names']
 
 # Creating the summary in Markdown
 # Creating the summary in Markdown without f-strings
@@ -140,6 +101,10 @@ The person you mentioned the most in your diary is **{}**.
 # Display the summary in Streamlit
 st.markdown(summary, unsafe_allow_html=True)
 
+with st.expander("Recent trends"):
+    for window, window_trends in dashboard_summary['window_trends'].items():
+        st.markdown(f"**Last {window} days**  \n" + "  \n".join(window_trends.values()))
+
 ## Emotions over time
 st.markdown('''
  <hr style="border: none; height: 2px; background-color: blue;">  
@@ -152,18 +117,19 @@ st.markdown('''
 ''',
             unsafe_allow_html=True)
 tab1, tab2, tab3, tab4 = st.tabs(["Highlights", "Work", "Family", "Friends"])
+emotion_figures = get_emotion_figures(begin_dt, end_dt, data_version)
 
 with tab1:
-    plot_filtered_df(emotions_df, category='highlights')
+    st.plotly_chart(emotion_figures['highlights'], use_container_width=True, key='plot_highlights')
 
 with tab2:
-    plot_filtered_df(emotions_df, category='work')
+    st.plotly_chart(emotion_figures['work'], use_container_width=True, key='plot_work')
 
 with tab3:
-    plot_filtered_df(emotions_df, category='family')
+    st.plotly_chart(emotion_figures['family'], use_container_width=True, key='plot_family')
 
 with tab4:
-    plot_filtered_df(emotions_df, category='friends')
+    st.plotly_chart(emotion_figures['friends'], use_container_width=True, key='plot_friends')
 
 
 ## Name entities count
@@ -222,13 +188,58 @@ with st.sidebar:
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-            # Use the new agent to get the assistant response
+            # One query router and cached agent per selected dates and data version. The router
+            # answers the common analytics questions locally, repeated questions are answered from
+            # the response cache and the agent is only built on the first question left
+            agent_key = (begin_dt, end_dt, data_version)
+            if st.session_state.get("agent_key") != agent_key:
+                st.session_state.router = QueryRouter(emotions_df, ner_combined)
+                st.session_state.agent = CachedAgent(emotions_df, ner_combined, begin_dt, end_dt, data_version)
+                st.session_state.agent_key = agent_key
+            agent = st.session_state.agent
+
+            # Use the new agent to get the assistant response, streaming its steps and answer.
+            # Pressing Stop reruns the script, which closes the stream and cancels the agent
             with st.chat_message("assistant"):
-                result = agent.query(prompt)
-                st.markdown(result)
+                result = st.session_state.router.route(prompt)
+                if result is not None:
+                    agent.remember(prompt, result)
+                else:
+                    result = agent.get_cached_answer(prompt)
+                if result is None:
+                    st.button("Stop", key="stop_chat")
+                    chat_stream = agent.stream(prompt)
+                    steps = st.status("Getting your memories ready...", expanded=False)
+
+                    def answer_tokens():
+                        for kind, text in chat_stream.iter_events():
+                            if kind == 'step':
+                                steps.write(text)
+                            else:
+                                yield text
+
+                    st.write_stream(answer_tokens())
+                    result = chat_stream.answer
+                    if chat_stream.status == 'done':
+                        steps.update(label="Memories ready", state="complete")
+                    else:
+                        steps.update(label="No complete answer", state="error")
+                        if chat_stream.status == 'timeout':
+                            st.warning("The answer took too long, please try again or ask a simpler question.")
+                        elif chat_stream.status == 'error':
+                            st.error(chat_stream.error)
+                else:
+                    st.markdown(result)
 
             st.session_state.messages.append({"role": "assistant", "content": result})
 
+    router_stats = get_router_stats()
+    if router_stats['questions']:
+        st.caption(
+            f"Answered without the LLM: {router_stats['hits']} of {router_stats['questions']} "
+            f"questions ({router_stats['hit_rate']:.0%})"
+        )
+
 ## Word cloud
 st.markdown('''
  <hr style="border: none; height: 2px; background-color: blue;">  
@@ -236,4 +247,4 @@ st.markdown('''
 <h2 style="color: blue;">Word Cloud</h2>
 ''',
             unsafe_allow_html=True)
-plot_word_cloud(combine_string)
+plot_word_cloud_frequencies(dashboard_data['word_frequencies'])
@@ -0,0 +1,353 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from llama_index.core.agent import ReActAgent
+from llama_index.core.agent.react.types import ResponseReasoningStep
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.chat_engine.types import StreamingAgentChatResponse
+from llama_index.core.tools import FunctionTool, QueryEngineTool, ToolMetadata
+from llama_index.experimental.query_engine import PandasQueryEngine
+from llama_index.llms.openai import OpenAI
+from src.fulltext import search_diary
+from src.llamaindex_rag import get_query_engine
+from src.prompts import new_prompt, instruction_str, context, instruction_str_ner
+from src.response_cache import CachedQueryEngine, ResponseCache, normalize_question
+
+# Seconds after which a streamed chat answer is given up
+CHAT_TIMEOUT = float(os.getenv("LLM_DIARY_CHAT_TIMEOUT", "60"))
+
+
+def build_agent(emotions_df, ner_df, begin_dt=None, end_dt=None, data_version=None, cache=None):
+    """
+    Builds the ReAct agent used by the dashboard chat with its four tools: the emotion scores,
+    the most frequent names, the diary memories and the full-text diary search.
+
+    Args:
+        emotions_df (pd.DataFrame): The emotion scores of the selected dates.
+        ner_df (pd.DataFrame): The combined named entity counts of the selected dates.
+        begin_dt (str, optional): The first selected date, formatted as '%Y-%m-%d'.
+        end_dt (str, optional): The last selected date, formatted as '%Y-%m-%d'.
+        data_version (int or str, optional): The diary data version. When given, the results of the
+            emotion, name and memories tools are cached for this version and date range.
+        cache (ResponseCache, optional): The response cache. Defaults to a new ResponseCache.
+
+    Returns:
+        ReActAgent: The agent that answers the chat messages.
+    """
+    scope = {'data_version': data_version, 'begin_dt': begin_dt, 'end_dt': end_dt}
+    cache = cache or ResponseCache()
+
+    def cached(query_engine, tool_name):
+        if data_version is None:
+            return query_engine
+        return CachedQueryEngine(query_engine=query_engine, tool_name=tool_name, scope=scope, cache=cache)
+
+    # Emotions df
+    emotions_query_engine = PandasQueryEngine(
+        df=emotions_df, verbose=True, instruction_str=instruction_str
+    )
+    emotions_query_engine.update_prompts({"pandas_prompt": new_prompt})
+
+    # The most common names
+    text_emotions_query_engine = PandasQueryEngine(
+        df=ner_df, verbose=True, instruction_str=instruction_str_ner
+    )
+    text_emotions_query_engine.update_prompts({"pandas_prompt": new_prompt})
+
+    def search(query: str) -> str:
+        """Finds the diary sections that mention exact words, names or dates."""
+        results = search_diary(query, begin_dt=begin_dt, end_dt=end_dt)
+        if not results:
+            return "No diary entry matches."
+        return "\n\n".join(f"{result['record_dt']} ({result['type']}): {result['text']}" for result in results)
+
+    tools = [
+        QueryEngineTool(
+            query_engine=cached(emotions_query_engine, "emotions_score"),
+            metadata=ToolMetadata(
+                name="emotions_score",
+                description="this gives information about the score of the emotions (happy, angry, surprise, sad, fear) over time",
+            ),
+        ),
+        QueryEngineTool(
+            query_engine=cached(text_emotions_query_engine, "most_frequent_name"),
+            metadata=ToolMetadata(
+                name="most_frequent_name",
+                description="this gives information about the most frequent names",
+            ),
+        ),
+        QueryEngineTool(
+            query_engine=cached(get_query_engine(begin_dt, end_dt), "memories"),
+            metadata=ToolMetadata(
+                name="memories",
+                description="this gives detailed information and the date when it happend for the memories recorded",
+            ),
+        ),
+        FunctionTool.from_defaults(
+            fn=search,
+            name="search_diary",
+            description="this finds the memories that mention an exact name, word or date (e.g. 'Alice' or 'March 3rd') and when they were written",
+        ),
+    ]
+
+    llm = OpenAI(model="gpt-3.5-turbo")
+    return ReActAgent.from_tools(tools, llm=llm, verbose=True, context=context)
+
+
+def iter_agent_events(agent, prompt, cancel_event=None):
+    """
+    Runs the agent one reasoning step at a time and yields what it does as soon as it happens.
+
+    Args:
+        agent (ReActAgent): The agent.
+        prompt (str): The chat message.
+        cancel_event (threading.Event, optional): Stops the agent between two steps or two tokens
+            once set. The LLM call in progress is not interrupted, it runs until it returns.
+
+    Returns:
+        iterator of tuple: ('step', text) for every thought, tool call and tool observation, then
+        ('token', text) for every piece of the final answer.
+    """
+    task = agent.create_task(prompt)
+    seen = 0
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            agent.delete_task(task.task_id)
+            return
+        step_output = agent.stream_step(task.task_id)
+        reasoning = task.extra_state["current_reasoning"]
+        for step in reasoning[seen:]:
+            if not isinstance(step, ResponseReasoningStep):
+                yield 'step', step.get_content()
+        seen = len(reasoning)
+        if step_output.is_last:
+            break
+
+    response = agent.finalize_response(task.task_id, step_output)
+    if not isinstance(response, StreamingAgentChatResponse):
+        # The answer came from a tool or a non-streamed step: there is nothing left to wait for
+        yield 'token', response.response
+        return
+    first = True
+    for token in response.response_gen:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if first:
+            # The stream starts with the chunk in which the agent wrote 'Answer: '
+            token = token.split('Answer:', 1)[-1].lstrip()
+            first = not token
+            if first:
+                continue
+        yield 'token', token
+
+
+class ChatStream:
+    """
+    Runs the agent on a chat message in a background thread, so that its steps and answer tokens
+    can be shown while they come in.
+
+    The stream is given up after a timeout, and cancel() stops the agent at its next step or token.
+    Neither interrupts the LLM call in progress: the worker thread runs it to the end, and the agent
+    may still write the whole turn to its memory; on_abort lets the owner of the agent discard it.
+    Once iter_events() is exhausted, status is 'done', 'cancelled', 'timeout' or 'error' and answer
+    holds the text received.
+    """
+
+    def __init__(self, agent, prompt, timeout=None, on_done=None, on_abort=None):
+        self.answer = ''
+        self.steps = []
+        self.status = 'running'
+        self.error = None
+        self.on_done = on_done
+        self.on_abort = on_abort
+        self.deadline = time.monotonic() + (timeout or CHAT_TIMEOUT)
+        self._events = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(agent, prompt), daemon=True)
+        self._thread.start()
+
+    def _run(self, agent, prompt):
+        try:
+            for event in iter_agent_events(agent, prompt, self._cancel_event):
+                self._events.put(event)
+        except Exception as error:
+            self._events.put(('error', str(error)))
+        finally:
+            self._events.put(('end', None))
+
+    def cancel(self):
+        """
+        Stops the agent at its next step or answer token.
+
+        Returns:
+            None
+        """
+        self._abort('cancelled')
+
+    def _abort(self, status):
+        self._cancel_event.set()
+        if self.status == 'running':
+            self.status = status
+            if self.on_abort is not None:
+                self.on_abort()
+
+    def iter_events(self):
+        """
+        Yields the events of the agent as they come in, until the answer is complete, the stream is
+        cancelled or the timeout is reached. Closing the iterator early cancels the agent.
+
+        Returns:
+            iterator of tuple: The ('step', text) and ('token', text) events of iter_agent_events.
+        """
+        try:
+            while self.status == 'running':
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    self._abort('timeout')
+                    return
+                try:
+                    kind, text = self._events.get(timeout=min(remaining, 0.1))
+                except queue.Empty:
+                    continue
+                if kind == 'end':
+                    self.status = 'done'
+                    if self.on_done is not None:
+                        self.on_done(self.answer)
+                    return
+                if kind == 'error':
+                    self.error = text
+                    self._abort('error')
+                    return
+                if kind == 'step':
+                    self.steps.append(text)
+                else:
+                    self.answer += text
+                yield kind, text
+        finally:
+            # e.g. the Streamlit script was stopped or rerun while the answer was streaming
+            self.cancel()
+
+
+class CachedAgent:
+    """
+    Answers the chat messages of one date range and data version through the response cache.
+
+    A repeated question is answered from the cache without any LLM call, and the agent itself is
+    only built on the first question that misses the cache. The agent remembers the conversation,
+    so an answer is only reused for the same question asked after the same previous turns, and the
+    turns answered without the agent are added to its memory.
+    """
+
+    def __init__(self, emotions_df, ner_df, begin_dt, end_dt, data_version, cache=None):
+        self.emotions_df = emotions_df
+        self.ner_df = ner_df
+        self.scope = {'data_version': data_version, 'begin_dt': begin_dt, 'end_dt': end_dt}
+        self.cache = cache or ResponseCache()
+        self.history = []
+        self._agent = None
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            self._agent = build_agent(
+                self.emotions_df, self.ner_df, self.scope['begin_dt'], self.scope['end_dt'],
+                data_version=self.scope['data_version'], cache=self.cache
+            )
+            self._agent.memory.set(list(self.history))
+        return self._agent
+
+    def get_answer_scope(self):
+        """
+        Returns the cache scope of the next answer: the data version, the date range and a digest
+        of the conversation so far.
+
+        Returns:
+            dict: The scope of the answer cache entries.
+        """
+        turns = [
+            [message.role.value, normalize_question(message.content) if message.role == MessageRole.USER else message.content]
+            for message in self.history
+        ]
+        history = hashlib.sha256(json.dumps(turns).encode('utf-8')).hexdigest() if turns else None
+        return {**self.scope, 'history': history}
+
+    def remember(self, prompt, answer, in_agent=True):
+        """
+        Adds a turn of the conversation to the history, and to the memory of the agent.
+
+        Args:
+            prompt (str): The chat message.
+            answer (str): The answer, e.g. from the query router or the cache.
+            in_agent (bool, optional): Whether the turn must also be added to the memory of the
+                agent. False when the agent gave the answer and already remembers it. Defaults to True.
+
+        Returns:
+            None
+        """
+        turn = [ChatMessage(role=MessageRole.USER, content=prompt), ChatMessage(role=MessageRole.ASSISTANT, content=answer)]
+        self.history.extend(turn)
+        if in_agent and self._agent is not None:
+            self._agent.memory.put_messages(turn)
+
+    def get_cached_answer(self, prompt):
+        """
+        Returns the cached answer to a question, if any, and adds the turn to the conversation.
+
+        Args:
+            prompt (str): The chat message.
+
+        Returns:
+            str: The cached answer, or None.
+        """
+        answer = self.cache.get('answer', self.get_answer_scope(), prompt)
+        if answer is not None:
+            self.remember(prompt, answer)
+        return answer
+
+    def query(self, prompt):
+        """
+        Answers a chat message, from the cache when the same question was already answered.
+
+        Args:
+            prompt (str): The chat message.
+
+        Returns:
+            str: The answer.
+        """
+        answer = self.get_cached_answer(prompt)
+        if answer is None:
+            scope = self.get_answer_scope()
+            answer = str(self.agent.query(prompt))
+            self.cache.put('answer', scope, prompt, answer)
+            self.remember(prompt, answer, in_agent=False)
+        return answer
+
+    def stream(self, prompt, timeout=None):
+        """
+        Starts answering a chat message in the background. The answer is cached once complete.
+
+        If the stream is cancelled, times out or fails, the agent is discarded and the next question
+        builds a new one from history: the LLM call left running in the background may still write
+        the whole turn to the old agent memory, which would no longer match history.
+
+        Args:
+            prompt (str): The chat message.
+            timeout (float, optional): The seconds after which the answer is given up. Defaults to
+                CHAT_TIMEOUT.
+
+        Returns:
+            ChatStream: The stream of the agent steps and answer tokens.
+        """
+        scope = self.get_answer_scope()
+
+        def on_done(answer):
+            self.cache.put('answer', scope, prompt, answer.strip())
+            self.remember(prompt, answer.strip(), in_agent=False)
+
+        def on_abort():
+            self._agent = None
+
+        return ChatStream(self.agent, prompt, timeout=timeout, on_done=on_done, on_abort=on_abort)
@@ -0,0 +1,285 @@
+from contextlib import closing
+from datetime import datetime
+import hashlib
+import os
+import sqlite3
+import pandas as pd
+from src.nlp import (
+    NER_CATEGORIES, NER_MODEL_NAME, count_words, get_entry_entity_counts, merge_word_counts, name_counts_to_df, sum_name_counts
+)
+from src.storage import format_date
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+
+def entry_hash(texts):
+    """
+    Computes the content hash of a diary entry from the text of each category.
+
+    Args:
+        texts (dict): A dictionary mapping each category to its text.
+
+    Returns:
+        str: The SHA-256 hex digest of the entry content.
+    """
+    content = '\x1f'.join(
+        f"{category}\x1e{texts.get(category) if isinstance(texts.get(category), str) else ''}"
+        for category in NER_CATEGORIES
+    )
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_entry_keys(text_df):
+    """
+    Computes the store key of every entry of the text DataFrame.
+
+    Args:
+        text_df (pd.DataFrame): The DataFrame with 'record_dt' and the '<category>_txt' columns.
+
+    Returns:
+        tuple: The (record_dt, content_hash) key of each row, and the dictionary mapping each
+        category to its text for each row.
+    """
+    texts = [
+        {category: text if isinstance(text, str) else '' for category, text in zip(NER_CATEGORIES, row_texts)}
+        for row_texts in zip(*(text_df[f'{category}_txt'] for category in NER_CATEGORIES))
+    ]
+    keys = [(format_date(record_dt), entry_hash(entry_texts)) for record_dt, entry_texts in zip(text_df['record_dt'], texts)]
+    return keys, texts
+
+
+class AnalysisStore:
+    """
+    Persistent per-entry analysis results, keyed by record date and content hash.
+
+    Diary entries never change once saved, so their entity counts are computed once and stored.
+    Results for any date range are then aggregated from the stored rows instead of re-running NER
+    over the whole text. Entity counts also belong to the spaCy model that found them, the same way
+    the emotion cache keeps the engine name, so changing the model re-analyses every entry.
+    """
+
+    def __init__(self, db_path=None, model_name=None):
+        self.db_path = db_path or os.path.join(base_dir, 'data', 'analysis', 'analysis.db').replace('\\', '/')
+        self.model_name = model_name or NER_MODEL_NAME
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            # Entity counts stored before the model was part of the key can't be attributed to a
+            # model, they are dropped and computed again
+            if 'model_name' not in {row[1] for row in conn.execute('PRAGMA table_info(entries)')}:
+                conn.executescript('DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS entity_counts;')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    record_dt TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    analyzed_at TEXT NOT NULL,
+                    PRIMARY KEY (record_dt, content_hash, model_name)
+                );
+                CREATE TABLE IF NOT EXISTS entity_counts (
+                    record_dt TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    label TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    count INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_entity_counts_dt ON entity_counts (model_name, record_dt);
+                CREATE TABLE IF NOT EXISTS word_entries (
+                    record_dt TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    PRIMARY KEY (record_dt, content_hash)
+                );
+                CREATE TABLE IF NOT EXISTS word_counts (
+                    record_dt TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    word TEXT NOT NULL,
+                    count INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_word_counts_dt ON word_counts (record_dt);
+            ''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def get_indexed_hashes(self, table='entries'):
+        """
+        Returns the keys of all the entries already analysed.
+
+        Args:
+            table (str, optional): 'entries' for the entity counts of the store model or
+                'word_entries' for the word counts. Defaults to 'entries'.
+
+        Returns:
+            set of tuple: A set of (record_dt, content_hash) pairs.
+        """
+        with closing(self._connect()) as conn:
+            if table == 'entries':
+                return set(conn.execute(
+                    'SELECT record_dt, content_hash FROM entries WHERE model_name = ?', (self.model_name,)
+                ))
+            return set(conn.execute(f'SELECT record_dt, content_hash FROM {table}'))
+
+    def index_entries(self, entries, entity_counts):
+        """
+        Stores the entity counts found by the store model in several entries, in a single transaction.
+
+        Args:
+            entries (list of tuple): The (record_dt, content_hash) key of each entry.
+            entity_counts (list of dict): For each entry, a dictionary mapping each category to its
+                nested {label: {entity text: count}} dictionary.
+
+        Returns:
+            None
+        """
+        analyzed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = [
+            (record_dt, content_hash, self.model_name, category, label, text, count)
+            for (record_dt, content_hash), counts in zip(entries, entity_counts)
+            for category, name_counts in counts.items()
+            for label, label_counts in name_counts.items()
+            for text, count in label_counts.items()
+        ]
+        keys = [(record_dt, content_hash, self.model_name) for record_dt, content_hash in entries]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                'DELETE FROM entity_counts WHERE record_dt = ? AND content_hash = ? AND model_name = ?', keys
+            )
+            conn.executemany('INSERT INTO entity_counts VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', [key + (analyzed_at,) for key in keys])
+
+    def index_word_counts(self, entries, word_counts):
+        """
+        Stores the word counts of several entries in a single transaction.
+
+        Args:
+            entries (list of tuple): The (record_dt, content_hash) key of each entry.
+            word_counts (list of dict): For each entry, the count of every word, as returned by count_words.
+
+        Returns:
+            None
+        """
+        rows = [
+            (record_dt, content_hash, word, count)
+            for (record_dt, content_hash), counts in zip(entries, word_counts)
+            for word, count in counts.items()
+        ]
+        with closing(self._connect()) as conn, conn:
+            conn.executemany('DELETE FROM word_counts WHERE record_dt = ? AND content_hash = ?', entries)
+            conn.executemany('INSERT INTO word_counts VALUES (?, ?, ?, ?)', rows)
+            conn.executemany('INSERT OR REPLACE INTO word_entries VALUES (?, ?)', entries)
+
+    def index_text_df(self, text_df):
+        """
+        Analyses and stores the entries of the text DataFrame that are not in the store yet: their
+        entity counts with the store model and their word counts.
+
+        Args:
+            text_df (pd.DataFrame): The DataFrame with 'record_dt' and the '<category>_txt' columns.
+
+        Returns:
+            int: The number of entries that were analysed.
+        """
+        keys, texts = get_entry_keys(text_df)
+
+        indexed_words = self.get_indexed_hashes('word_entries')
+        missing_words = [i for i, key in enumerate(keys) if key not in indexed_words]
+        if missing_words:
+            self.index_word_counts(
+                [keys[i] for i in missing_words],
+                [count_words("\n\n".join(texts[i].values())) for i in missing_words]
+            )
+
+        indexed = self.get_indexed_hashes()
+        missing = [i for i, key in enumerate(keys) if key not in indexed]
+        if not missing:
+            return 0
+
+        entity_counts = get_entry_entity_counts(text_df.iloc[missing], model_name=self.model_name)
+        self.index_entries([keys[i] for i in missing], entity_counts)
+        return len(missing)
+
+    def get_name_counts(self, begin_dt, end_dt, category='combined'):
+        """
+        Aggregates the stored entity counts of a date range.
+
+        Args:
+            begin_dt (str): The first date of the range, formatted as '%Y-%m-%d'.
+            end_dt (str): The last date of the range, formatted as '%Y-%m-%d'.
+            category (str, optional): The category to aggregate, or 'combined' for all of them.
+                Defaults to 'combined'.
+
+        Returns:
+            dict: A nested dictionary of {label: {entity text: count}}.
+        """
+        query = 'SELECT label, text, SUM(count) FROM entity_counts WHERE model_name = ? AND record_dt BETWEEN ? AND ?'
+        params = [self.model_name, begin_dt, end_dt]
+        if category != 'combined':
+            query += ' AND type = ?'
+            params.append(category)
+        query += ' GROUP BY label, text'
+
+        name_counts = {}
+        with closing(self._connect()) as conn:
+            for label, text, count in conn.execute(query, params):
+                name_counts.setdefault(label, {})[text] = count
+        return name_counts
+
+    def get_word_frequencies(self, begin_dt, end_dt, max_words=200):
+        """
+        Sums the stored word counts of a date range, for the word cloud.
+
+        Args:
+            begin_dt (str): The first date of the range, formatted as '%Y-%m-%d'.
+            end_dt (str): The last date of the range, formatted as '%Y-%m-%d'.
+            max_words (int, optional): The number of most frequent words returned. Defaults to 200.
+
+        Returns:
+            dict: The count of the most frequent words, with case variants and plurals merged.
+        """
+        query = 'SELECT word, SUM(count) FROM word_counts WHERE record_dt BETWEEN ? AND ? GROUP BY word'
+        with closing(self._connect()) as conn:
+            word_counts = merge_word_counts(dict(conn.execute(query, (begin_dt, end_dt))))
+        return dict(sorted(word_counts.items(), key=lambda item: item[1], reverse=True)[:max_words])
+
+    def get_ner(self, begin_dt, end_dt, category='combined'):
+        """
+        Returns the named entity counts of a date range in the get_ner layout.
+
+        Args:
+            begin_dt (str): The first date of the range, formatted as '%Y-%m-%d'.
+            end_dt (str): The last date of the range, formatted as '%Y-%m-%d'.
+            category (str, optional): The category to aggregate, or 'combined' for all of them.
+                Defaults to 'combined'.
+
+        Returns:
+            pd.DataFrame: A DataFrame with a 'text' column and one column per entity label.
+        """
+        return name_counts_to_df(self.get_name_counts(begin_dt, end_dt, category=category))
+
+    def get_ner_by_category(self, begin_dt, end_dt):
+        """
+        Returns the named entity counts of a date range for every category and for all of them combined.
+
+        Args:
+            begin_dt (str): The first date of the range, formatted as '%Y-%m-%d'.
+            end_dt (str): The last date of the range, formatted as '%Y-%m-%d'.
+
+        Returns:
+            dict: A dictionary mapping each category, plus 'combined', to a DataFrame in the get_ner layout.
+        """
+        query = '''
+            SELECT type, label, text, SUM(count) FROM entity_counts
+            WHERE model_name = ? AND record_dt BETWEEN ? AND ?
+            GROUP BY type, label, text
+        '''
+        category_counts = {category: {} for category in NER_CATEGORIES}
+        with closing(self._connect()) as conn:
+            for category, label, text, count in conn.execute(query, (self.model_name, begin_dt, end_dt)):
+                category_counts.setdefault(category, {}).setdefault(label, {})[text] = count
+
+        ner_dfs = {category: name_counts_to_df(counts) for category, counts in category_counts.items()}
+        ner_dfs['combined'] = name_counts_to_df(sum_name_counts(category_counts.values()))
+        return ner_dfs
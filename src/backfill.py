@@ -0,0 +1,236 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import json
+import os
+import time
+import pandas as pd
+from src.analysis_store import AnalysisStore, get_entry_keys
+from src.emotion_engines import get_emotion_engine
+from src.nlp import NER_MODEL_NAME, get_entry_entity_counts, get_entry_records
+from src.storage import get_storage
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+BACKFILL_DIR = os.path.join(base_dir, 'data', 'backfill').replace('\\', '/')
+# Number of text rows analysed per task of the process pool
+BACKFILL_CHUNK_SIZE = int(os.getenv("LLM_DIARY_BACKFILL_CHUNK_SIZE", "500"))
+
+
+def analyse_text_chunk(text_df, engine=None, model_name=None, analysis_db_path=None):
+    """
+    Recomputes the emotions rows of a chunk of text rows, and stores the entity counts of the model
+    in the analysis store so that the dashboard does not run NER on them again. Used by the backfill
+    process pool.
+
+    Args:
+        text_df (pd.DataFrame): The text rows, with 'record_dt' and the '<category>_txt' columns.
+        engine (str, optional): The emotion engine. Defaults to EMOTION_ENGINE.
+        model_name (str, optional): The spaCy model. Defaults to NER_MODEL_NAME.
+        analysis_db_path (str, optional): The analysis store database. Defaults to data/analysis/analysis.db.
+
+    Returns:
+        pd.DataFrame: The emotions rows in the layout saved by the diary form.
+    """
+    text_df = text_df.reset_index(drop=True)
+    entity_counts = get_entry_entity_counts(text_df, model_name=model_name)
+    AnalysisStore(analysis_db_path, model_name).index_entries(get_entry_keys(text_df)[0], entity_counts)
+    return get_entry_records(text_df, engine=engine, model_name=model_name, entity_counts=entity_counts)
+
+
+def get_run_signature(engine=None, model_name=None, chunk_size=None, text_rows=None):
+    """
+    Identifies a backfill run by what it depends on, so that a checkpoint is only resumed by a run
+    with the same engine, model, chunking and source rows.
+
+    Returns:
+        str: The run signature.
+    """
+    signature = {
+        'engine': get_emotion_engine(engine).name,
+        'model_name': model_name or NER_MODEL_NAME,
+        'chunk_size': chunk_size,
+        'text_rows': text_rows,
+    }
+    return hashlib.sha1(json.dumps(signature, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def get_chunk_path(work_dir, signature, chunk_id):
+    """
+    Returns the path of the emotions rows of a chunk of a backfill run.
+
+    Args:
+        work_dir (str): The work directory of the run.
+        signature (str): The signature of the run.
+        chunk_id (int): The chunk number.
+
+    Returns:
+        str: The path of the chunk file.
+    """
+    return os.path.join(work_dir, f'{signature}_{int(chunk_id):05d}.pkl').replace('\\', '/')
+
+
+def remove_files(paths):
+    """
+    Deletes files, skipping the ones that do not exist.
+
+    Args:
+        paths (iterable of str): The paths of the files.
+
+    Returns:
+        None
+    """
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_checkpoint(checkpoint_path, signature):
+    """
+    Loads the progress of a backfill run, or starts a new one if the signature changed.
+
+    Args:
+        checkpoint_path (str): The path of the checkpoint file.
+        signature (str): The signature of the current run.
+
+    Returns:
+        dict: The checkpoint with the columns of every completed chunk under 'chunks'.
+    """
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint['signature'] == signature:
+            return checkpoint
+        # The chunks of a run with another signature can never be resumed
+        work_dir = os.path.dirname(checkpoint_path)
+        remove_files(get_chunk_path(work_dir, checkpoint['signature'], chunk_id) for chunk_id in checkpoint['chunks'])
+    return {'signature': signature, 'chunks': {}}
+
+
+def save_checkpoint(checkpoint, checkpoint_path):
+    """
+    Saves the progress of a backfill run atomically.
+
+    Args:
+        checkpoint (dict): The checkpoint to be saved.
+        checkpoint_path (str): The path of the checkpoint file.
+
+    Returns:
+        None
+    """
+    tmp_path = f'{checkpoint_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, indent=2)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def backfill_emotions(storage=None, engine=None, model_name=None, chunk_size=None, workers=None, work_dir=None,
+                      analysis_db_path=None):
+    """
+    Recomputes the emotions table from the text table, for instance after the emotion engine, the
+    spaCy model or the NER label set changed. The entity counts of the model are stored in the
+    analysis store along the way.
+
+    The text rows are streamed in chunks and analysed in a process pool. Each finished chunk is
+    written to the work directory and recorded in a checkpoint, so an interrupted run resumes
+    where it stopped. The emotions table is only replaced, atomically, once every chunk is done.
+
+    Args:
+        storage (CsvStorage or SQLiteStorage, optional): The storage backend. Defaults to get_storage().
+        engine (str, optional): The emotion engine. Defaults to EMOTION_ENGINE.
+        model_name (str, optional): The spaCy model. Defaults to NER_MODEL_NAME.
+        chunk_size (int, optional): The number of text rows per chunk. Defaults to BACKFILL_CHUNK_SIZE.
+        workers (int, optional): The number of analysis processes. Defaults to the number of CPUs;
+            1 analyses in the current process.
+        work_dir (str, optional): Where the chunk results and the checkpoint are kept. Defaults to data/backfill.
+        analysis_db_path (str, optional): The analysis store database. Defaults to data/analysis/analysis.db.
+
+    Returns:
+        dict: The number of entries and emotions rows written, the elapsed seconds and the entries per second.
+    """
+    storage = storage or get_storage()
+    chunk_size = chunk_size or BACKFILL_CHUNK_SIZE
+    workers = workers or os.cpu_count() or 1
+    work_dir = work_dir or BACKFILL_DIR
+    os.makedirs(work_dir, exist_ok=True)
+
+    text_rows = storage.count('text')
+    signature = get_run_signature(engine, model_name, chunk_size, text_rows)
+    checkpoint_path = os.path.join(work_dir, 'checkpoint.json').replace('\\', '/')
+    checkpoint = load_checkpoint(checkpoint_path, signature)
+    if checkpoint['chunks']:
+        print(f"Resuming backfill {signature}: {len(checkpoint['chunks'])} chunk(s) already done.")
+
+    def chunk_path(chunk_id):
+        return get_chunk_path(work_dir, signature, chunk_id)
+
+    def save_chunk(chunk_id, emotions_df):
+        tmp_path = f'{chunk_path(chunk_id)}.tmp'
+        emotions_df.to_pickle(tmp_path)
+        os.replace(tmp_path, chunk_path(chunk_id))
+        checkpoint['chunks'][str(chunk_id)] = emotions_df.columns.to_list()
+        save_checkpoint(checkpoint, checkpoint_path)
+
+    start = time.perf_counter()
+    entries = 0
+    pending = {}
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for chunk_id, text_df in enumerate(storage.iter_chunks('text', chunk_size)):
+            if str(chunk_id) in checkpoint['chunks']:
+                continue
+            entries += len(text_df)
+            if executor is None:
+                save_chunk(chunk_id, analyse_text_chunk(text_df, engine, model_name, analysis_db_path))
+                continue
+
+            pending[chunk_id] = executor.submit(analyse_text_chunk, text_df, engine, model_name, analysis_db_path)
+            # Keep a bounded number of chunks in flight so memory does not grow with the history
+            if len(pending) >= 2 * workers:
+                done_id = min(pending)
+                save_chunk(done_id, pending.pop(done_id).result())
+        for chunk_id in sorted(pending):
+            save_chunk(chunk_id, pending.pop(chunk_id).result())
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    # Every column seen in any chunk, in order of appearance
+    columns = list(dict.fromkeys(column for chunk_columns in checkpoint['chunks'].values() for column in chunk_columns))
+    chunk_ids = sorted(int(chunk_id) for chunk_id in checkpoint['chunks'])
+    rows = 0
+
+    def chunks():
+        nonlocal rows
+        for chunk_id in chunk_ids:
+            emotions_df = pd.read_pickle(chunk_path(chunk_id))
+            rows += len(emotions_df)
+            yield emotions_df
+
+    storage.replace('emotions', chunks(), columns)
+    # Only the files of this run are deleted: work_dir may be any directory chosen by the caller
+    remove_files([chunk_path(chunk_id) for chunk_id in chunk_ids] + [checkpoint_path])
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'entries': entries,
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'entries_per_second': round(entries / elapsed, 1) if elapsed > 0 else None,
+    }
+    print(
+        f"Backfilled {rows} emotions rows from {text_rows} entries ({entries} analysed in this run) "
+        f"in {elapsed:.1f}s, {stats['entries_per_second']} entries/s."
+    )
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recompute the emotions table from the diary text.')
+    parser.add_argument('--engine', help="Emotion engine, 'text2emotion' or 'lexicon'. Defaults to LLM_DIARY_EMOTION_ENGINE.")
+    parser.add_argument('--model', help='spaCy model used for NER. Defaults to LLM_DIARY_SPACY_MODEL.')
+    parser.add_argument('--chunk-size', type=int, help='Number of entries per chunk.')
+    parser.add_argument('--workers', type=int, help='Number of analysis processes.')
+    args = parser.parse_args()
+
+    backfill_emotions(engine=args.engine, model_name=args.model, chunk_size=args.chunk_size, workers=args.workers)
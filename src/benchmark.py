@@ -0,0 +1,311 @@
+from collections import Counter
+from datetime import datetime
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import PyPDF2
+import pandas as pd
+import src.nlp as nlp
+from src.emotion_cache import EmotionCache
+from src.emotion_engines import EMOTION_ENGINE
+from src.nlp import (
+    NER_MODEL_NAME, combine_string_category, count_words, get_emotions_from_text, get_labels_by_category,
+    get_ner, get_nlp, merge_word_counts
+)
+from src.pdf import CreateDiary
+from src.storage import SQLiteStorage
+from src.synthetic import generate_diary, generate_emotions
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+BENCHMARK_DIR = os.path.join(base_dir, 'data', 'benchmarks').replace('\\', '/')
+BENCHMARK_BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json').replace('\\', '/')
+BENCHMARK_RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'latest.json').replace('\\', '/')
+# Numbers of diary entries every function is benchmarked with
+BENCHMARK_SIZES = [1000, 10000, 100000]
+# Relative slowdown or memory growth over the baseline reported as a regression
+BENCHMARK_TOLERANCE = float(os.getenv("LLM_DIARY_BENCHMARK_TOLERANCE", "0.25"))
+# Differences below these are noise, whatever their relative size
+BENCHMARK_MIN_SECONDS = 0.05
+BENCHMARK_MIN_MB = 1.0
+
+
+# Every benchmark takes the synthetic diary of one size and a scratch folder, does its setup and
+# returns the call that is measured.
+
+def call_each(function, calls):
+    """Returns a call running function on every argument tuple, dropping the results."""
+    def run():
+        for args in calls:
+            function(*args)
+    return run
+
+
+def setup_get_ner(text_df, emotions_df, work_dir):
+    """Named entities of every entry, one get_ner() call each."""
+    get_nlp()
+    return call_each(get_ner, [(text,) for text in text_df['combined_txt']])
+
+
+def setup_get_emotions_from_text(text_df, emotions_df, work_dir):
+    """Emotions of every entry, one get_emotions_from_text() call each, with an empty emotion cache."""
+    nlp._emotion_cache = EmotionCache(db_path=os.path.join(work_dir, 'emotions.db'))
+    record_dts = pd.to_datetime(text_df['record_dt'])
+    calls = [(text, 'day', record_dt) for text, record_dt in zip(text_df['combined_txt'], record_dts)]
+    return call_each(get_emotions_from_text, calls)
+
+
+def setup_get_labels_by_category(text_df, emotions_df, work_dir):
+    """Most frequent entities of every entry, one get_labels_by_category() call each."""
+    get_nlp()
+    record_dts = pd.to_datetime(text_df['record_dt'])
+    calls = [(text_df.iloc[[i]], 'combined', record_dt) for i, record_dt in enumerate(record_dts)]
+    return call_each(get_labels_by_category, calls)
+
+
+def setup_save_df(text_df, emotions_df, work_dir):
+    """Saving one more entry (text and emotions rows) to a database that holds the whole history."""
+    storage = SQLiteStorage(db_path=os.path.join(work_dir, 'diary.db'))
+    storage.append('text', text_df.iloc[:-1])
+    storage.append('emotions', emotions_df.iloc[:-5])
+    last_text_df, last_emotions_df = text_df.iloc[-1:], emotions_df.iloc[-5:]
+
+    def save():
+        storage.append('emotions', last_emotions_df)
+        storage.append('text', last_text_df)
+    return save
+
+
+def setup_merge_pdfs(text_df, emotions_df, work_dir):
+    """Merging the page of the last entry into the volume of its month."""
+    create_diary = CreateDiary()
+    record_dts = pd.to_datetime(text_df['record_dt'])
+    last_month = record_dts.dt.to_period('M') == record_dts.iloc[-1].to_period('M')
+    pdf_writer = PyPDF2.PdfWriter()
+    entries = zip(text_df.loc[last_month, 'combined_txt'].iloc[:-1], record_dts[last_month].iloc[:-1])
+    for i, (content, record_dt) in enumerate(entries):
+        page_path = os.path.join(work_dir, f'page_{i}.pdf')
+        create_diary.render_page(page_path, content, record_dt)
+        pdf_writer.append(page_path)
+    volume_path = os.path.join(work_dir, 'volume.pdf')
+    with open(volume_path, 'wb') as volume_file:
+        pdf_writer.write(volume_file)
+    page_path = os.path.join(work_dir, 'page.pdf')
+    create_diary.render_page(page_path, text_df['combined_txt'].iloc[-1], record_dts.iloc[-1])
+    return lambda: create_diary.merge_pdfs(volume_path, page_path, os.path.join(work_dir, 'merged.pdf'))
+
+
+def setup_combine_string_category(text_df, emotions_df, work_dir):
+    """Concatenation of the text of every entry."""
+    return lambda: combine_string_category(text_df)
+
+
+def setup_word_cloud_data(text_df, emotions_df, work_dir):
+    """Word frequencies of every entry, the data the word cloud is drawn from."""
+    texts = text_df['combined_txt'].to_list()
+
+    def word_frequencies():
+        word_counts = Counter()
+        for text in texts:
+            word_counts.update(count_words(text))
+        return merge_word_counts(word_counts)
+    return word_frequencies
+
+
+BENCHMARKS = {
+    'get_ner': setup_get_ner,
+    'get_emotions_from_text': setup_get_emotions_from_text,
+    'get_labels_by_category': setup_get_labels_by_category,
+    'save_df': setup_save_df,
+    'merge_pdfs': setup_merge_pdfs,
+    'combine_string_category': setup_combine_string_category,
+    'word_cloud_data': setup_word_cloud_data,
+}
+
+
+def measure(setup, text_df, emotions_df, work_dir, repeat=1):
+    """
+    Measures the time and the peak Python memory of a benchmark.
+
+    The time is the best of repeat runs without tracing; the memory comes from one more run traced
+    with tracemalloc, which slows the code down. The setup runs before each run, untimed, in a new
+    scratch folder.
+
+    Args:
+        setup (callable): The setup function of the benchmark.
+        text_df (pd.DataFrame): The synthetic diary.
+        emotions_df (pd.DataFrame): Its emotions rows.
+        work_dir (str): The scratch folder.
+        repeat (int, optional): The number of timed runs. Defaults to 1.
+
+    Returns:
+        dict: The 'seconds' and 'peak_mb' of the benchmark.
+    """
+    def prepare():
+        run = setup(text_df, emotions_df, tempfile.mkdtemp(dir=work_dir))
+        gc.collect()
+        return run
+
+    seconds = []
+    for _ in range(repeat):
+        run = prepare()
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+
+    run = prepare()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(min(seconds), 4), 'peak_mb': round(peak / 2 ** 20, 2)}
+
+
+def run_benchmarks(sizes=None, names=None, seed=0, repeat=1):
+    """
+    Benchmarks the diary functions on synthetic diaries of several sizes. Everything runs locally.
+
+    A benchmark that cannot run here, e.g. because the spaCy model is not installed, is reported as
+    skipped with the reason.
+
+    Args:
+        sizes (list of int, optional): The numbers of entries. Defaults to BENCHMARK_SIZES.
+        names (list of str, optional): The benchmarks to run. Defaults to all of BENCHMARKS.
+        seed (int, optional): The seed of the synthetic diaries. Defaults to 0.
+        repeat (int, optional): The number of timed runs of each benchmark. Defaults to 1.
+
+    Returns:
+        dict: The 'meta' data of the run and the 'results' of every benchmark, keyed by name and size.
+    """
+    sizes = sizes or BENCHMARK_SIZES
+    names = names or list(BENCHMARKS)
+    results = {name: {} for name in names}
+    work_dir = tempfile.mkdtemp(prefix='llm_diary_benchmark_')
+    try:
+        for size in sizes:
+            text_df = generate_diary(size, seed=seed)
+            emotions_df = generate_emotions(text_df, seed=seed)
+            for name in names:
+                emotion_cache = nlp._emotion_cache
+                try:
+                    result = {'status': 'ok', **measure(BENCHMARKS[name], text_df, emotions_df, work_dir, repeat)}
+                except Exception as error:
+                    result = {'status': 'skipped', 'reason': f'{type(error).__name__}: {error}'}
+                finally:
+                    nlp._emotion_cache = emotion_cache
+                results[name][str(size)] = result
+                print(format_result(name, size, result))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'emotion_engine': EMOTION_ENGINE,
+            'spacy_model': NER_MODEL_NAME,
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def format_result(name, size, result):
+    if result['status'] != 'ok':
+        return f"{name:<26}{size:>8}  skipped ({result['reason']})"
+    return f"{name:<26}{size:>8}{result['seconds']:>11.3f} s{result['peak_mb']:>10.1f} MB"
+
+
+def find_regressions(report, baseline, tolerance=None):
+    """
+    Compares a benchmark report with a baseline report.
+
+    Args:
+        report (dict): The report of run_benchmarks.
+        baseline (dict): The baseline report.
+        tolerance (float, optional): The relative growth reported as a regression. Defaults to
+            BENCHMARK_TOLERANCE.
+
+    Returns:
+        list of dict: The 'name', 'size', 'metric', 'baseline' and 'value' of every regression.
+    """
+    tolerance = BENCHMARK_TOLERANCE if tolerance is None else tolerance
+    regressions = []
+    for name, sizes in report['results'].items():
+        for size, result in sizes.items():
+            base = baseline['results'].get(name, {}).get(size)
+            if result['status'] != 'ok' or not base or base['status'] != 'ok':
+                continue
+            for metric, noise in (('seconds', BENCHMARK_MIN_SECONDS), ('peak_mb', BENCHMARK_MIN_MB)):
+                if result[metric] > base[metric] * (1 + tolerance) and result[metric] - base[metric] > noise:
+                    regressions.append({
+                        'name': name, 'size': int(size), 'metric': metric,
+                        'baseline': base[metric], 'value': result[metric],
+                    })
+    return regressions
+
+
+def save_report(report, path):
+    """
+    Writes a benchmark report as JSON.
+
+    Args:
+        report (dict): The report of run_benchmarks.
+        path (str): The JSON file path.
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the diary functions on synthetic diaries.')
+    parser.add_argument('--sizes', type=int, nargs='+', help=f'Numbers of entries. Defaults to {BENCHMARK_SIZES}.')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run. Defaults to all.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic diaries.')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of timed runs, the best one is kept.')
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE_PATH, help='Baseline JSON file.')
+    parser.add_argument('--output', default=BENCHMARK_RESULTS_PATH, help='Where the results are written.')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, help='Relative growth reported as a regression.')
+    args = parser.parse_args()
+
+    report = run_benchmarks(sizes=args.sizes, names=args.only, seed=args.seed, repeat=args.repeat)
+    save_report(report, args.output)
+    print(f"Results written to '{args.output}'.")
+
+    if args.save_baseline:
+        save_report(report, args.baseline)
+        print(f"Baseline written to '{args.baseline}'.")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        for key in ('platform', 'emotion_engine', 'spacy_model'):
+            if baseline['meta'].get(key) != report['meta'][key]:
+                print(f"Warning: the baseline {key} is '{baseline['meta'].get(key)}', not '{report['meta'][key]}'.")
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['name']} ({regression['size']} entries): {regression['metric']} "
+                f"{regression['baseline']} -> {regression['value']}"
+            )
+        print(f"{len(regressions)} regression(s) against '{args.baseline}'.")
+        sys.exit(1 if regressions else 0)
+    else:
+        print(f"No baseline at '{args.baseline}', run with --save-baseline to create it.")
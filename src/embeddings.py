@@ -0,0 +1,181 @@
+from contextlib import closing
+import hashlib
+import os
+import re
+import sqlite3
+from typing import Any, List
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+# Embedding backend used by get_embed_model: 'openai', 'local' (sentence-transformers) or 'hashing'
+EMBED_BACKEND = os.getenv("LLM_DIARY_EMBED_BACKEND", "openai")
+LOCAL_EMBED_MODEL = os.getenv("LLM_DIARY_LOCAL_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_CACHE_PATH = os.path.join(base_dir, 'data', 'embeddings', 'cache.db').replace('\\', '/')
+
+
+class HashingEmbedding(BaseEmbedding):
+    """
+    Deterministic embedding based on the hashing trick. It needs no model and no network, which
+    makes it suitable for tests and offline use, but it only captures word overlap.
+    """
+
+    embed_dim: int = Field(default=256, description="The size of the embedding vectors.")
+
+    def __init__(self, embed_dim: int = 256, **kwargs: Any) -> None:
+        super().__init__(embed_dim=embed_dim, model_name=f"hashing-{embed_dim}", **kwargs)
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.embed_dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+            vector[digest % self.embed_dim] += 1.0 if (digest >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+
+class SentenceTransformerEmbedding(BaseEmbedding):
+    """
+    Local embedding with a sentence-transformers model running on CPU. Requires the optional
+    sentence-transformers package.
+    """
+
+    _model: Any = PrivateAttr()
+
+    def __init__(self, model_name: str = LOCAL_EMBED_MODEL, device: str = "cpu", **kwargs: Any) -> None:
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "The local embedding backend requires sentence-transformers: pip install sentence-transformers"
+            ) from e
+        super().__init__(model_name=model_name, **kwargs)
+        self._model = SentenceTransformer(model_name, device=device)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(texts, normalize_embeddings=True).tolist()
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embeddings([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps any embedding model with a content-addressed cache on disk, keyed by model name and the
+    hash of the text. Unchanged chunks are never sent to the wrapped model twice.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache_path: str = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache_path: str = None, **kwargs: Any) -> None:
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs
+        )
+        self._embed_model = embed_model
+        self._cache_path = cache_path or EMBED_CACHE_PATH
+        os.makedirs(os.path.dirname(self._cache_path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, kind, text_hash)
+                )
+            ''')
+
+    def _connect(self):
+        return sqlite3.connect(self._cache_path, timeout=30)
+
+    def _cached_embeddings(self, texts, kind, embed_missing):
+        hashes = [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in texts]
+        with closing(self._connect()) as conn:
+            found = {}
+            unique_hashes = list(set(hashes))
+            # Stay below the SQLite limit of bound parameters
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                rows = conn.execute(
+                    f'''SELECT text_hash, vector FROM embeddings
+                        WHERE model = ? AND kind = ? AND text_hash IN ({', '.join('?' for _ in batch)})''',
+                    [self.model_name, kind, *batch]
+                )
+                found.update(
+                    (text_hash, np.frombuffer(vector, dtype=np.float32).tolist()) for text_hash, vector in rows
+                )
+
+            missing = {text_hash: text for text_hash, text in zip(hashes, texts) if text_hash not in found}
+            if missing:
+                vectors = embed_missing(list(missing.values()))
+                found.update(zip(missing.keys(), vectors))
+                with conn:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)',
+                        [
+                            (self.model_name, kind, text_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                            for text_hash, vector in zip(missing.keys(), vectors)
+                        ]
+                    )
+        return [found[text_hash] for text_hash in hashes]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._cached_embeddings(texts, 'text', self._embed_model.get_text_embedding_batch)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._cached_embeddings(
+            [query], 'query', lambda queries: [self._embed_model.get_query_embedding(q) for q in queries]
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+
+def get_embed_model(backend=None, cache=True):
+    """
+    Returns the embedding model used to index and query the diary.
+
+    Args:
+        backend (str, optional): 'openai', 'local' (sentence-transformers on CPU) or 'hashing'.
+            Defaults to EMBED_BACKEND.
+        cache (bool, optional): Whether to wrap the model with the on-disk embedding cache. Defaults to True.
+
+    Returns:
+        BaseEmbedding: The embedding model.
+    """
+    backend = backend or EMBED_BACKEND
+    if backend == 'openai':
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        embed_model = OpenAIEmbedding()
+    elif backend == 'local':
+        embed_model = SentenceTransformerEmbedding()
+    elif backend == 'hashing':
+        embed_model = HashingEmbedding()
+    else:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected 'openai', 'local' or 'hashing'.")
+    return CachedEmbedding(embed_model) if cache else embed_model
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+from src.sqlite_cache import SQLiteLRUCache
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+EMOTION_CACHE_PATH = os.path.join(base_dir, 'data', 'cache', 'emotions.db').replace('\\', '/')
+EMOTION_CACHE_SIZE = int(os.getenv("LLM_DIARY_EMOTION_CACHE_SIZE", "10000"))
+
+
+class EmotionCache(SQLiteLRUCache):
+    """
+    Persistent LRU cache of emotion scores, keyed by the analyser version and the hash of the text.
+
+    The analyser version is part of the key, so upgrading the emotion analyser never returns scores
+    computed by the previous one. The cache holds at most max_entries texts; the least recently
+    used are evicted first.
+    """
+
+    table = 'emotion_cache'
+    key_columns = ('analyser', 'text_hash')
+    value_columns = ('scores',)
+
+    def __init__(self, db_path=None, max_entries=None):
+        super().__init__(db_path or EMOTION_CACHE_PATH, max_entries or EMOTION_CACHE_SIZE)
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, analyser, text):
+        """
+        Returns the cached scores of a text, marking them as recently used.
+
+        Args:
+            analyser (str): The analyser name and version.
+            text (str): The analysed text.
+
+        Returns:
+            dict: The cached scores, or None if the text is not cached.
+        """
+        row = self.get_row((analyser, self.text_hash(text)))
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, analyser, text, scores):
+        """
+        Stores the scores of a text and evicts the least recently used entries above max_entries.
+
+        Args:
+            analyser (str): The analyser name and version.
+            text (str): The analysed text.
+            scores (dict): The emotion scores.
+
+        Returns:
+            None
+        """
+        self.put_row((analyser, self.text_hash(text)), (json.dumps(scores),))
+    def get_or_compute(self, analyser, text, compute):
+        """
+        Returns the cached scores of a text, computing and storing them on a miss.
+
+        Args:
+            analyser (str): The analyser name and version.
+            text (str): The text to analyse.
+            compute (callable): The function that computes the scores of a text on a miss.
+
+        Returns:
+            dict: The emotion scores.
+        """
+        scores = self.get(analyser, text)
+        if scores is None:
+            scores = compute(text)
+            self.put(analyser, text, scores)
+        return scores
@@ -0,0 +1,245 @@
+from importlib.metadata import PackageNotFoundError, version
+import ast
+import importlib.util
+import os
+import re
+import numpy as np
+from scipy import sparse
+
+# Emotion engine used by default, overridable without touching the code
+EMOTION_ENGINE = os.getenv("LLM_DIARY_EMOTION_ENGINE", "text2emotion")
+# Emotions in the order of the score columns
+EMOTIONS = ['Happy', 'Angry', 'Surprise', 'Sad', 'Fear']
+# NLTK's English stopwords, used by the lexicon engine when the NLTK stopwords corpus is not downloaded
+ENGLISH_STOPWORDS = set("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself yourselves he
+him his himself she she's her hers herself it it's its itself they them their theirs themselves what
+which who whom this that that'll these those am is are was were be been being have has had having do
+does did doing a an the and but if or because as until while of at by for with about against between
+into through during before after above below to from up down in out on off over under again further
+then once here there when where why how all any both each few more most other some such no nor not
+only own same so than too very s t can will just don don't should should've now d ll m o re ve y ain
+aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn hasn't haven haven't isn isn't
+ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn shouldn't wasn wasn't weren
+weren't won won't wouldn wouldn't
+""".split())
+
+
+def normalize_emotion_counts(counts):
+    """
+    Converts emotion word counts into scores the way text2emotion does: each emotion's share of the
+    emotion words, rounded to two decimals, or all zeros when there are none.
+
+    Args:
+        counts (np.ndarray): An array of shape (n_documents, 5) with the counts in EMOTIONS order.
+
+    Returns:
+        np.ndarray: The scores, with the same shape as counts.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    scores = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    return np.round(scores, 2)
+
+
+class EmotionEngine:
+    """
+    Interface of the emotion engines behind get_emotions_from_text.
+
+    Engines score a batch of texts at once. Engines that set supports_counts also return the raw
+    emotion word counts, which lets the scores of a combined text be derived by summing the counts
+    of its parts instead of scoring it again.
+    """
+
+    name = 'emotion-engine'
+    supports_counts = False
+
+    def score(self, texts):
+        """
+        Scores the emotions of several texts.
+
+        Args:
+            texts (list of str): The texts to be analyzed.
+
+        Returns:
+            np.ndarray: An array of shape (len(texts), 5) with the scores in EMOTIONS order.
+        """
+        return normalize_emotion_counts(self.count(texts))
+
+    def count(self, texts):
+        """
+        Counts the emotion words of several texts.
+
+        Args:
+            texts (list of str): The texts to be analyzed.
+
+        Returns:
+            np.ndarray: An array of shape (len(texts), 5) with the counts in EMOTIONS order.
+        """
+        raise NotImplementedError(f"The '{self.name}' engine does not provide emotion counts.")
+
+
+class Text2EmotionEngine(EmotionEngine):
+    """
+    The original engine: text2emotion, one document at a time.
+    """
+
+    def __init__(self):
+        try:
+            self.name = f"text2emotion-{version('text2emotion')}"
+        except PackageNotFoundError:
+            self.name = "text2emotion"
+
+    def score(self, texts):
+        import text2emotion as te
+
+        scores = []
+        for text in texts:
+            emotions = te.get_emotion(text) or {}
+            scores.append([emotions.get(emotion, 0) for emotion in EMOTIONS])
+        return np.array(scores, dtype=np.float64).reshape(len(texts), len(EMOTIONS))
+
+
+def load_text2emotion_lexicon():
+    """
+    Reads the emotion lexicon and the negation rules that text2emotion defines inside get_emotion.
+
+    The source is parsed rather than imported, so loading the lexicon does not trigger the NLTK
+    downloads text2emotion runs on import.
+
+    Returns:
+        tuple: The word to emotion dictionary, the negation dictionary ('not <word>' to emotion) and
+        the shortcut dictionary ('gr8' to 'great').
+    """
+    spec = importlib.util.find_spec('text2emotion')
+    if spec is None:
+        raise ImportError("The lexicon engine reads its lexicon from text2emotion: pip install text2emotion")
+    with open(spec.origin, 'r', encoding='utf-8') as source_file:
+        tree = ast.parse(source_file.read())
+
+    literals = {}
+    get_emotion = next(
+        node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == 'get_emotion'
+    )
+    for node in ast.walk(get_emotion):
+        if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name) \
+                and node.targets[0].id in ('df', 'd', 'shortcuts'):
+            literals[node.targets[0].id] = ast.literal_eval(node.value)
+
+    words, emotions = literals['df']['Word'], literals['df']['Emotion']
+    lexicon = {}
+    # text2emotion keeps the first occurrence of a word and never matches the word at index 0
+    for position, word in enumerate(words[1:], start=1):
+        if ' ' not in word and word not in lexicon:
+            lexicon[word] = emotions[position]
+    return lexicon, literals['d'], literals['shortcuts']
+
+
+def load_stopwords():
+    """
+    Returns the stopwords text2emotion removes before the lexicon lookup: those of every language
+    of the NLTK stopwords corpus, or the English ones when the corpus is not downloaded.
+
+    Returns:
+        tuple: The set of stopwords and the name of their source, 'nltk' or 'english'.
+    """
+    try:
+        from nltk.corpus import stopwords
+
+        return set(stopwords.words()), 'nltk'
+    except (ImportError, LookupError):
+        return ENGLISH_STOPWORDS, 'english'
+
+
+class LexiconEmotionEngine(EmotionEngine):
+    """
+    Fast lexicon engine using the text2emotion lexicon.
+
+    Texts are cleaned like text2emotion does (URLs, contractions, negations, shortcuts, digits and
+    stopwords removed), then a batch is tokenised once. Every distinct token is lemmatised and looked
+    up once through a precomputed vocabulary. The emotion counts of all documents are one sparse matrix product:
+    (documents x tokens) @ (tokens x emotions).
+    """
+
+    supports_counts = True
+    token_pattern = re.compile(r"\w+")
+    negation_pattern = re.compile(r"not\s\w+")
+    url_pattern = re.compile(r"http\S+|www.\S+")
+
+    def __init__(self):
+        self.lexicon, self.negations, self.shortcuts = load_text2emotion_lexicon()
+        self.stopwords, stopwords_source = load_stopwords()
+        self.emotion_ids = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+        self._token_emotions = {}
+        try:
+            from nltk.stem import WordNetLemmatizer
+
+            self._lemmatizer = WordNetLemmatizer()
+            self._lemmatizer.lemmatize('tests')
+        except LookupError:
+            # WordNet is not downloaded; tokens are looked up as written
+            self._lemmatizer = None
+        self.name = f"lexicon-{len(self.lexicon)}-{stopwords_source}{'-wordnet' if self._lemmatizer else ''}"
+
+    def _token_emotion(self, token):
+        # Lemmatise and look up each distinct token only once
+        if token not in self._token_emotions:
+            lemma = token
+            if self._lemmatizer is not None:
+                lemma = self._lemmatizer.lemmatize(self._lemmatizer.lemmatize(token, 'v'), 'n')
+            emotion = self.lexicon.get(lemma)
+            self._token_emotions[token] = self.emotion_ids.get(emotion, -1)
+        return self._token_emotions[token]
+
+    def _clean(self, text):
+        text = self.url_pattern.sub('', text.lower()).replace("n't", " not")
+        text = re.sub(r"ai\snot", "am not", text)
+        text = re.sub(r"wo\snot", "will not", text)
+        text = self.negation_pattern.sub(lambda match: self.negations.get(match.group(0), match.group(0)), text).lower()
+        text = ' '.join(self.shortcuts.get(token, token) for token in text.split())
+        return ' '.join(token for token in text.split() if not token.isdigit())
+
+    def count(self, texts):
+        vocabulary = {}
+        indptr, indices = [0], []
+        for text in texts:
+            for token in self.token_pattern.findall(self._clean(text or '')):
+                if len(token) > 2 and token not in self.stopwords:
+                    indices.append(vocabulary.setdefault(token, len(vocabulary)))
+            indptr.append(len(indices))
+
+        doc_term = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(texts), len(vocabulary))
+        )
+        token_ids = np.array([self._token_emotion(token) for token in vocabulary], dtype=np.int64)
+        matched = np.flatnonzero(token_ids >= 0)
+        term_emotion = sparse.csr_matrix(
+            (np.ones(len(matched), dtype=np.float32), (matched, token_ids[matched])),
+            shape=(len(vocabulary), len(EMOTIONS))
+        )
+        return np.asarray((doc_term @ term_emotion).todense())
+
+
+EMOTION_ENGINES = {
+    'text2emotion': Text2EmotionEngine,
+    'lexicon': LexiconEmotionEngine,
+}
+_engines = {}
+
+
+def get_emotion_engine(name=None):
+    """
+    Returns an emotion engine, creating it once per process.
+
+    Args:
+        name (str, optional): 'text2emotion' or 'lexicon'. Defaults to EMOTION_ENGINE.
+
+    Returns:
+        EmotionEngine: The emotion engine.
+    """
+    name = name or EMOTION_ENGINE
+    if name not in _engines:
+        if name not in EMOTION_ENGINES:
+            raise ValueError(f"Unknown emotion engine '{name}', expected one of {list(EMOTION_ENGINES)}.")
+        _engines[name] = EMOTION_ENGINES[name]()
+    return _engines[name]
@@ -0,0 +1,195 @@
+from contextlib import closing
+import calendar
+import os
+import re
+import sqlite3
+from src.analysis_store import entry_hash
+from src.nlp import NER_CATEGORIES, WORD_CLOUD_STOPWORDS
+from src.storage import format_date
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+FULLTEXT_PATH = os.path.join(base_dir, 'data', 'search', 'fulltext.db').replace('\\', '/')
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTH_PATTERN = '|'.join(sorted(MONTHS, key=len, reverse=True))
+# '2024-03-03', 'March 3rd', 'March 3, 2024', '3 March 2024', '3rd of March'
+DATE_PATTERNS = [
+    re.compile(r'\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b'),
+    re.compile(rf'\b(?P<month_name>{MONTH_PATTERN})\.?\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(?P<year>\d{{4}}))?', re.IGNORECASE),
+    re.compile(rf'\b(?P<day>\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<month_name>{MONTH_PATTERN})\b(?:,?\s+(?P<year>\d{{4}}))?', re.IGNORECASE),
+]
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def parse_query_dates(query):
+    """
+    Finds the dates mentioned in a question, with or without a year.
+
+    Args:
+        query (str): The question, e.g. "what did I do on March 3rd?".
+
+    Returns:
+        tuple: The record_dt LIKE patterns of the dates found ('2024-03-03', or '%-03-03' without a
+        year) and the question with the dates removed.
+    """
+    patterns = []
+    for date_pattern in DATE_PATTERNS:
+        for match in date_pattern.finditer(query):
+            month = int(match['month']) if 'month' in match.groupdict() else MONTHS[match['month_name'].lower()]
+            day = int(match['day'])
+            if not 1 <= month <= 12 or not 1 <= day <= 31:
+                continue
+            year = match['year'] or '%'
+            patterns.append(f'{year}-{month:02d}-{day:02d}')
+        query = date_pattern.sub(' ', query)
+    return list(dict.fromkeys(patterns)), query
+
+
+def iter_entry_sections(text_df):
+    """
+    Iterates over the non-empty sections of the diary entries.
+
+    Args:
+        text_df (pd.DataFrame): The text rows, with 'record_dt' and the '<category>_txt' columns.
+
+    Returns:
+        iterator of tuple: The (record_dt, content_hash, category, text) of every section, where
+        content_hash identifies the entry as in the analysis store.
+    """
+    for row in text_df.to_dict('records'):
+        texts = {category: row[f'{category}_txt'] for category in NER_CATEGORIES}
+        content_hash = entry_hash(texts)
+        for category, text in texts.items():
+            if isinstance(text, str) and text.strip():
+                yield format_date(row['record_dt']), content_hash, category, text
+
+
+class FullTextIndex:
+    """
+    Local full-text index of the diary sections, in an SQLite FTS5 table ranked with BM25.
+
+    Entries are indexed when they are saved, keyed by record date and content hash like the
+    analysis store. Keyword and date lookups are answered from the index in milliseconds, without
+    any embedding call.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or FULLTEXT_PATH
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    record_dt TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    PRIMARY KEY (record_dt, content_hash)
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5 (
+                    record_dt UNINDEXED,
+                    content_hash UNINDEXED,
+                    type UNINDEXED,
+                    text,
+                    tokenize = 'porter unicode61'
+                );
+            ''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def index_text_df(self, text_df):
+        """
+        Adds the entries of the text DataFrame that are not indexed yet.
+
+        Args:
+            text_df (pd.DataFrame): The text rows, with 'record_dt' and the '<category>_txt' columns.
+
+        Returns:
+            int: The number of sections added.
+        """
+        with closing(self._connect()) as conn, conn:
+            indexed = set(conn.execute('SELECT record_dt, content_hash FROM entries'))
+            sections = [section for section in iter_entry_sections(text_df) if section[:2] not in indexed]
+            conn.executemany('INSERT INTO sections VALUES (?, ?, ?, ?)', sections)
+            conn.executemany(
+                'INSERT OR IGNORE INTO entries VALUES (?, ?)',
+                {(record_dt, content_hash) for record_dt, content_hash, _, _ in sections}
+            )
+        return len(sections)
+
+    def search(self, query, begin_dt=None, end_dt=None, categories=None, limit=10):
+        """
+        Searches the diary sections by keywords and by the dates mentioned in the query.
+
+        Keywords are matched with any of them required and ranked with BM25. When the query
+        mentions dates, only the sections of those dates are returned, ranked by the keywords if
+        there are any left.
+
+        Args:
+            query (str): The question or keywords, e.g. "Alice" or "what did I do on March 3rd?".
+            begin_dt (str, optional): The first date of the range, formatted as '%Y-%m-%d'.
+            end_dt (str, optional): The last date of the range, formatted as '%Y-%m-%d'.
+            categories (list of str, optional): The categories to search, e.g. ['work', 'family'].
+            limit (int, optional): The maximum number of results. Defaults to 10.
+
+        Returns:
+            list of dict: The matching sections with their 'record_dt', 'type', 'text' and 'score'
+            (higher is better), best first.
+        """
+        date_patterns, query = parse_query_dates(query)
+        keywords = [
+            token for token in TOKEN_PATTERN.findall(query)
+            if token.lower() not in WORD_CLOUD_STOPWORDS and len(token) > 1
+        ]
+        if not keywords and not date_patterns:
+            return []
+
+        conditions, params = [], []
+        if keywords:
+            conditions.append('sections MATCH ?')
+            params.append(' OR '.join(f'"{keyword}"' for keyword in keywords))
+        if date_patterns:
+            conditions.append(f"({' OR '.join('record_dt LIKE ?' for _ in date_patterns)})")
+            params.extend(date_patterns)
+        if begin_dt:
+            conditions.append('record_dt >= ?')
+            params.append(begin_dt)
+        if end_dt:
+            conditions.append('record_dt <= ?')
+            params.append(end_dt)
+        if categories:
+            conditions.append(f"type IN ({', '.join('?' for _ in categories)})")
+            params.extend(categories)
+
+        score = '-bm25(sections)' if keywords else '0.0'
+        sql = f'''
+            SELECT record_dt, type, text, {score} AS score FROM sections
+            WHERE {' AND '.join(conditions)}
+            ORDER BY score DESC, record_dt DESC
+            LIMIT ?
+        '''
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, [*params, limit]).fetchall()
+        return [
+            {'record_dt': record_dt, 'type': category, 'text': text, 'score': score}
+            for record_dt, category, text, score in rows
+        ]
+
+
+def search_diary(query, begin_dt=None, end_dt=None, categories=None, limit=10):
+    """
+    Searches the diary with the full-text index.
+
+    Args:
+        query (str): The question or keywords.
+        begin_dt (str, optional): The first date of the range, formatted as '%Y-%m-%d'.
+        end_dt (str, optional): The last date of the range, formatted as '%Y-%m-%d'.
+        categories (list of str, optional): The categories to search.
+        limit (int, optional): The maximum number of results. Defaults to 10.
+
+    Returns:
+        list of dict: The matching sections, best first, as returned by FullTextIndex.search.
+    """
+    return FullTextIndex().search(query, begin_dt=begin_dt, end_dt=end_dt, categories=categories, limit=limit)
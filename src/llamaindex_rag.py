@@ -1,4 +1,4 @@
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
+from llama_index.core import Document, VectorStoreIndex
 from llama_index.llms.openai import OpenAI
 from llama_index.core import Settings
 from dotenv import load_dotenv
@@ -6,23 +6,352 @@ from llama_index.core.node_parser import SentenceSplitter
 from llama_index.vector_stores.chroma import ChromaVectorStore
 import chromadb
 from llama_index.core import StorageContext
-from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, TextNode
+from src.embeddings import get_embed_model
+from src.fulltext import FullTextIndex, parse_query_dates
+from src.nlp import NER_CATEGORIES
+from src.prompts import diary_questions, format_diary_section
+from src.storage import get_storage
+from datetime import datetime
+import hashlib
+import json
 import os
+import threading
 load_dotenv()
 
 base_dir = os.path.dirname(__file__)[:-4]
-file_path = os.path.join(base_dir, 'data', 'my_diary').replace('\\', '/')
-documents = SimpleDirectoryReader(input_dir=file_path, required_exts=[".pdf"]).load_data()
+chroma_path = os.path.join(base_dir, 'data', 'chroma').replace('\\', '/')
 
 text_splitter = SentenceSplitter(chunk_size=200, chunk_overlap=30)
-nodes = text_splitter.get_nodes_from_documents(documents=documents)
 
-chroma_client = chromadb.EphemeralClient()
-chroma_collection = chroma_client.create_collection("diary_app")
-vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-storage_context = StorageContext.from_defaults(vector_store=vector_store)
+# Retriever of the 'memories' tool: 'hybrid' (vector and full-text) or 'vector'
+RETRIEVER = os.getenv("LLM_DIARY_RETRIEVER", "hybrid")
+# Number of results kept by the retriever, and rank offset of the reciprocal rank fusion
+RETRIEVER_TOP_K = int(os.getenv("LLM_DIARY_RETRIEVER_TOP_K", "5"))
+RRF_K = 60
 
-index = VectorStoreIndex(nodes=nodes, storage_context=storage_context, embed_model=OpenAIEmbedding())
 
-query_engine = index.as_query_engine()
+def get_collection_name(embed_model):
+    """
+    Returns the Chroma collection name for an embedding model. Each model gets its own collection
+    and manifest, since vectors of different models cannot be mixed.
 
+    Args:
+        embed_model (BaseEmbedding): The embedding model.
+
+    Returns:
+        str: The collection name.
+    """
+    return f"diary_app_{hashlib.sha1(embed_model.model_name.encode('utf-8')).hexdigest()[:10]}"
+
+
+def get_manifest_path(collection_name):
+    """
+    Returns the path of the manifest that tracks what was ingested into a collection.
+
+    Args:
+        collection_name (str): The name of the collection.
+
+    Returns:
+        str: The manifest path.
+    """
+    return os.path.join(chroma_path, f'{collection_name}_manifest.json').replace('\\', '/')
+
+
+# The index is built on first use and then shared by the whole process
+_index = None
+_index_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def load_manifest(manifest_path):
+    """
+    Loads the manifest of the ingested diary files and documents.
+
+    Args:
+        manifest_path (str): The path of the manifest file.
+
+    Returns:
+        dict: The manifest with the number of ingested text rows and the 'documents' content hashes.
+    """
+    if not os.path.exists(manifest_path):
+        return {'text_rows': None, 'documents': {}}
+    with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Saves the manifest atomically next to the Chroma database.
+
+    Args:
+        manifest (dict): The manifest to be saved.
+        manifest_path (str): The path of the manifest file.
+
+    Returns:
+        None
+    """
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def get_vector_store(collection_name):
+    """
+    Opens the persistent Chroma collection that holds the diary embeddings.
+
+    Args:
+        collection_name (str): The name of the collection.
+
+    Returns:
+        ChromaVectorStore: The vector store backed by data/chroma.
+    """
+    chroma_client = chromadb.PersistentClient(path=chroma_path)
+    chroma_collection = chroma_client.get_or_create_collection(collection_name)
+    return ChromaVectorStore(chroma_collection=chroma_collection)
+
+
+def entries_to_documents(text_df):
+    """
+    Builds one document per diary entry and category from the stored text rows.
+
+    Each document keeps the question and the dated answer as text, and carries record_dt, type and
+    record_ts (the date as a yyyymmdd integer, for range filters) as metadata.
+
+    Args:
+        text_df (pd.DataFrame): The text rows with 'record_dt' as '%Y-%m-%d' strings.
+
+    Returns:
+        list of Document: The documents, with ids stable across runs.
+    """
+    documents = []
+    entries_per_date = {}
+    for row in text_df.to_dict('records'):
+        record_dt = row['record_dt']
+        # Several entries can be saved for the same date
+        entry_number = entries_per_date.get(record_dt, 0)
+        entries_per_date[record_dt] = entry_number + 1
+        record_date = datetime.strptime(record_dt, '%Y-%m-%d')
+
+        for category in NER_CATEGORIES:
+            text = row[f'{category}_txt']
+            if not isinstance(text, str) or not text.strip():
+                continue
+            documents.append(Document(
+                id_=f"{record_dt}:{entry_number}:{category}",
+                text=format_diary_section(diary_questions[category], text, record_date),
+                metadata={
+                    'record_dt': record_dt,
+                    'type': category,
+                    'record_ts': int(record_date.strftime('%Y%m%d')),
+                },
+                excluded_embed_metadata_keys=['record_ts'],
+                excluded_llm_metadata_keys=['record_ts'],
+            ))
+    return documents
+
+
+def sync_index(index, manifest, manifest_path, storage=None):
+    """
+    Chunks and embeds only the diary entries that are new or changed since the last run.
+
+    Entries are read from the text table rather than extracted back from the diary PDF. When the
+    number of stored rows matches the manifest nothing is read at all; otherwise every entry
+    section whose text hash changed is replaced in the index and removed ones are deleted.
+
+    Args:
+        index (VectorStoreIndex): The index to be updated.
+        manifest (dict): The manifest of the ingested rows and documents, updated in place.
+        manifest_path (str): The path where the manifest is saved.
+        storage (CsvStorage or SQLiteStorage, optional): The storage backend. Defaults to get_storage().
+
+    Returns:
+        int: The number of entry sections that were embedded.
+    """
+    storage = storage or get_storage()
+    text_rows = storage.count('text')
+    # Manifests written before the text table was the source have no 'text_rows'
+    if manifest.get('text_rows') == text_rows:
+        return 0
+
+    documents = entries_to_documents(storage.load('text'))
+    current_ids = {document.id_ for document in documents}
+    new_documents = []
+    for document in documents:
+        content_hash = hashlib.sha256(document.text.encode('utf-8')).hexdigest()
+        if manifest['documents'].get(document.id_) == content_hash:
+            continue
+        if document.id_ in manifest['documents']:
+            index.delete_ref_doc(document.id_)
+        new_documents.append(document)
+        manifest['documents'][document.id_] = content_hash
+
+    for doc_id in set(manifest['documents']) - current_ids:
+        index.delete_ref_doc(doc_id)
+        del manifest['documents'][doc_id]
+
+    # Embed all the new chunks in batches
+    if new_documents:
+        index.insert_nodes(text_splitter.get_nodes_from_documents(new_documents))
+
+    manifest['text_rows'] = text_rows
+    manifest.pop('files', None)
+    save_manifest(manifest, manifest_path)
+    return len(new_documents)
+
+
+def get_metadata_filters(begin_dt=None, end_dt=None, categories=None):
+    """
+    Builds the vector store filters that restrict retrieval to a date range and to some categories.
+
+    Args:
+        begin_dt (str, optional): The first date of the range, formatted as '%Y-%m-%d'.
+        end_dt (str, optional): The last date of the range, formatted as '%Y-%m-%d'.
+        categories (list of str, optional): The categories to search, e.g. ['work', 'family'].
+
+    Returns:
+        MetadataFilters: The filters, or None if nothing is restricted.
+    """
+    filters = []
+    if begin_dt:
+        filters.append(MetadataFilter(
+            key='record_ts', value=int(begin_dt.replace('-', '')), operator=FilterOperator.GTE
+        ))
+    if end_dt:
+        filters.append(MetadataFilter(
+            key='record_ts', value=int(end_dt.replace('-', '')), operator=FilterOperator.LTE
+        ))
+    if categories:
+        filters.append(MetadataFilter(key='type', value=list(categories), operator=FilterOperator.IN))
+    return MetadataFilters(filters=filters) if filters else None
+
+
+def build_index():
+    """
+    Opens the persistent diary index and ingests the entries added or changed since the last run.
+
+    Returns:
+        VectorStoreIndex: The index over the diary entries.
+    """
+    os.makedirs(chroma_path, exist_ok=True)
+    embed_model = get_embed_model()
+    collection_name = get_collection_name(embed_model)
+    manifest_path = get_manifest_path(collection_name)
+    index = VectorStoreIndex.from_vector_store(
+        get_vector_store(collection_name),
+        embed_model=embed_model,
+        transformations=[text_splitter],
+    )
+    embedded = sync_index(index, load_manifest(manifest_path), manifest_path)
+    print(f"Diary index ready, {embedded} new or changed entry sections embedded.")
+    return index
+
+
+def get_index():
+    """
+    Returns the diary index, building it on the first call. Concurrent callers wait for the same build.
+
+    Returns:
+        VectorStoreIndex: The index over the diary entries.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_index()
+    return _index
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves diary sections from both the vector index and the full-text index, merged with
+    reciprocal rank fusion. Full-text search recalls exact names and words that embeddings miss.
+    Questions about specific dates are answered from the full-text index alone, without
+    embedding the question.
+    """
+
+    def __init__(self, vector_retriever, fulltext_index=None, begin_dt=None, end_dt=None, categories=None,
+                 top_k=None):
+        self._vector_retriever = vector_retriever
+        self._fulltext_index = fulltext_index or FullTextIndex()
+        self._begin_dt = begin_dt
+        self._end_dt = end_dt
+        self._categories = categories
+        self._top_k = top_k or RETRIEVER_TOP_K
+        super().__init__()
+
+    def _fulltext_nodes(self, query):
+        results = self._fulltext_index.search(
+            query, begin_dt=self._begin_dt, end_dt=self._end_dt, categories=self._categories, limit=self._top_k
+        )
+        nodes = []
+        for result in results:
+            record_date = datetime.strptime(result['record_dt'], '%Y-%m-%d')
+            node = TextNode(
+                text=format_diary_section(diary_questions[result['type']], result['text'], record_date),
+                metadata={'record_dt': result['record_dt'], 'type': result['type']},
+            )
+            nodes.append(NodeWithScore(node=node, score=result['score']))
+        return nodes
+
+    def _retrieve(self, query_bundle):
+        fulltext_nodes = self._fulltext_nodes(query_bundle.query_str)
+        date_patterns, _ = parse_query_dates(query_bundle.query_str)
+        if date_patterns and fulltext_nodes:
+            return fulltext_nodes
+
+        # Reciprocal rank fusion; a section found by both retrievers is kept once, as its full text
+        fused = {}
+        for nodes in (self._vector_retriever.retrieve(query_bundle), fulltext_nodes):
+            for rank, node in enumerate(nodes):
+                metadata = node.node.metadata
+                key = (metadata['record_dt'], metadata['type']) if 'record_dt' in metadata else node.node.node_id
+                score, _ = fused.get(key, (0.0, None))
+                fused[key] = (score + 1.0 / (RRF_K + rank + 1), node.node)
+        ranked = sorted(fused.values(), key=lambda item: item[0], reverse=True)[:self._top_k]
+        return [NodeWithScore(node=node, score=score) for score, node in ranked]
+
+
+def get_query_engine(begin_dt=None, end_dt=None, categories=None):
+    """
+    Returns a query engine over the diary index, building the index if needed. Retrieval is filtered
+    by date and category in the vector store, and combined with the full-text index unless
+    LLM_DIARY_RETRIEVER is 'vector'.
+
+    Args:
+        begin_dt (str, optional): The first date of the range, formatted as '%Y-%m-%d'.
+        end_dt (str, optional): The last date of the range, formatted as '%Y-%m-%d'.
+        categories (list of str, optional): The categories to search, e.g. ['work', 'family'].
+
+    Returns:
+        BaseQueryEngine: The query engine used by the 'memories' tool.
+    """
+    filters = get_metadata_filters(begin_dt, end_dt, categories)
+    if RETRIEVER == 'vector':
+        return get_index().as_query_engine(filters=filters)
+    retriever = HybridRetriever(
+        get_index().as_retriever(filters=filters, similarity_top_k=RETRIEVER_TOP_K),
+        begin_dt=begin_dt, end_dt=end_dt, categories=categories
+    )
+    return RetrieverQueryEngine.from_args(retriever)
+
+
+def warm_up_index():
+    """
+    Starts building the diary index in a background thread so the first chat message does not
+    wait for it. Does nothing if the index is already built.
+
+    Returns:
+        threading.Thread: The warm-up thread, or None if the index was already built.
+    """
+    global _warm_up_thread
+    if _index is not None:
+        return None
+    if _warm_up_thread is None or not _warm_up_thread.is_alive():
+        _warm_up_thread = threading.Thread(target=get_index, name='diary-index-warm-up', daemon=True)
+        _warm_up_thread.start()
+    return _warm_up_thread
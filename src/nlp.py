@@ -1,8 +1,247 @@
+from collections import Counter
 from datetime import datetime
-import text2emotion as te
+import os
+import re
+import threading
+import sys
+import time
+import numpy as np
 import pandas as pd
 import spacy
-from scipy.stats import linregress
+from wordcloud import STOPWORDS
+from src.emotion_cache import EmotionCache
+from src.emotion_engines import EMOTIONS, get_emotion_engine, normalize_emotion_counts
+
+# spaCy model used for NER, overridable without touching the code
+NER_MODEL_NAME = os.getenv("LLM_DIARY_SPACY_MODEL", "en_core_web_sm")
+# Batching for nlp.pipe when several documents are processed at once
+NER_BATCH_SIZE = int(os.getenv("LLM_DIARY_NER_BATCH_SIZE", "64"))
+NER_N_PROCESS = int(os.getenv("LLM_DIARY_NER_N_PROCESS", "1"))
+# Diary sections analysed separately; 'combined' is derived from them
+NER_CATEGORIES = ['highlights', 'work', 'family', 'friends']
+# Rows saved per entry in the emotions table: one per category plus the whole day
+EMOTION_RECORD_TYPES = NER_CATEGORIES + ['day']
+# Entity labels of the emotions table: the spaCy (OntoNotes) labels and the CoNLL ones (misc, per)
+NER_LABELS = ['cardinal', 'date', 'event', 'fac', 'gpe', 'language', 'law', 'loc', 'misc', 'money',
+              'norp', 'ordinal', 'org', 'per', 'percent', 'person', 'product', 'quantity', 'time',
+              'work_of_art']
+# Components that NER does not depend on; excluding them speeds up loading and parsing
+NER_EXCLUDED_PIPES = ["parser", "lemmatizer"]
+
+# Words left out of the word cloud, compared in lowercase
+WORD_CLOUD_STOPWORDS = {word.lower() for word in STOPWORDS | {"and", "or", "the", "of", "to",
+                                                              "January", "February", "March"}}
+# Same tokens as WordCloud.process_text
+WORD_PATTERN = re.compile(r"\w[\w']*")
+
+# Process-wide registry so the model stays warm across Streamlit reruns
+_nlp_registry = {}
+_nlp_load_stats = {}
+_nlp_lock = threading.Lock()
+_emotion_cache = None
+
+
+def get_peak_rss_mb():
+    """
+    Returns the peak resident memory of the process, read from the OS without tracing allocations.
+
+    Returns:
+        float: The peak RSS in MB, or None where the resource module is not available (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+def get_nlp(model_name=None):
+    """
+    Returns a spaCy pipeline for NER, loading it only the first time it is requested in the process.
+
+    Args:
+        model_name (str, optional): The spaCy model to load. Defaults to NER_MODEL_NAME.
+
+    Returns:
+        spacy.language.Language: The loaded pipeline without the components excluded for NER.
+    """
+    model_name = model_name or NER_MODEL_NAME
+    nlp = _nlp_registry.get(model_name)
+    if nlp is not None:
+        return nlp
+
+    with _nlp_lock:
+        # Another thread may have loaded the model while we were waiting
+        if model_name in _nlp_registry:
+            return _nlp_registry[model_name]
+
+        # Peak RSS before and after the load: tracing the allocations would make it several times slower
+        memory_before = get_peak_rss_mb()
+        start = time.perf_counter()
+
+        nlp = spacy.load(model_name, exclude=NER_EXCLUDED_PIPES)
+
+        load_seconds = time.perf_counter() - start
+        memory_mb = get_peak_rss_mb() - memory_before if memory_before is not None else None
+
+        _nlp_registry[model_name] = nlp
+        _nlp_load_stats[model_name] = {
+            'load_seconds': round(load_seconds, 3),
+            'memory_mb': round(memory_mb, 1) if memory_mb is not None else None,
+            'pipes': list(nlp.pipe_names),
+        }
+        memory = f" using {memory_mb:.1f} MB" if memory_mb is not None else ''
+        print(f"Loaded spaCy model '{model_name}' in {load_seconds:.2f}s{memory}")
+    return nlp
+
+def get_nlp_stats():
+    """
+    Returns the load time and memory use of every spaCy model loaded in this process.
+
+    Returns:
+        dict: A dictionary keyed by model name with the load time in seconds, the memory in MB (the
+        growth of the peak RSS during the load, None on Windows) and the active pipeline components.
+    """
+    return {name: dict(stats) for name, stats in _nlp_load_stats.items()}
+
+def get_emotion_cache():
+    """
+    Returns the process-wide persistent emotion cache, opening it on first use.
+
+    Returns:
+        EmotionCache: The emotion cache.
+    """
+    global _emotion_cache
+    if _emotion_cache is None:
+        _emotion_cache = EmotionCache()
+    return _emotion_cache
+
+def get_emotion_scores(text, cache=True, engine=None):
+    """
+    Scores the emotions of a text, reusing the cached scores of identical texts.
+
+    Args:
+        text (str): The text to be analyzed for emotions.
+        cache (bool, optional): Whether to use the persistent emotion cache. Defaults to True.
+        engine (str, optional): The emotion engine, 'text2emotion' or 'lexicon'. Defaults to EMOTION_ENGINE.
+
+    Returns:
+        dict: The Happy, Angry, Surprise, Sad and Fear scores.
+    """
+    engine = get_emotion_engine(engine)
+
+    def compute(text):
+        return dict(zip(EMOTIONS, engine.score([text])[0].tolist()))
+
+    if not cache:
+        return compute(text)
+    # The engine name and version are part of the key, so engines never share cached scores
+    return get_emotion_cache().get_or_compute(engine.name, text, compute)
+
+def build_emotion_records(record_dts, types, scores, label_texts=None):
+    """
+    Builds emotions rows for many entries at once, in the fixed schema of the emotions table.
+
+    Every column is assembled as a plain array and the DataFrame is constructed once, instead of
+    building, concatenating and merging one small DataFrame per row.
+
+    Args:
+        record_dts (list of str): The record date of each row, formatted as '%Y-%m-%d'.
+        types (list of str): The type/category of each row.
+        scores (np.ndarray): An array of shape (n, 5) with the emotion scores in EMOTIONS order.
+        label_texts (list of dict, optional): For each row, the most frequent texts of each entity
+            label, as returned by get_max_label_texts. When given, one column per label of NER_LABELS
+            is added (None where the label was not found), followed by any other label found.
+
+    Returns:
+        pd.DataFrame: The record date, type, emotion scores and main emotion, then the label columns.
+    """
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1, len(EMOTIONS))
+    columns = {
+        'record_dt': np.asarray(record_dts, dtype=object),
+        'type': np.asarray(types, dtype=object),
+    }
+    for i, emotion in enumerate(EMOTIONS):
+        columns[emotion.lower()] = scores[:, i]
+    # First maximum, like idxmax
+    columns['main_emotion'] = np.array(EMOTIONS, dtype=object)[scores.argmax(axis=1)] if len(scores) \
+        else np.array([], dtype=object)
+
+    if label_texts is not None:
+        other_labels = {label for texts in label_texts for label in texts} - set(NER_LABELS)
+        for label in NER_LABELS + sorted(other_labels):
+            columns[label] = [texts.get(label) for texts in label_texts]
+    return pd.DataFrame(columns)
+
+def get_emotions_batch(texts, types, record_dts, engine=None):
+    """
+    Analyzes the emotions of several texts at once and returns them in the get_emotions_from_text layout.
+
+    Engines that count emotion words score the whole batch in one pass; the others score the texts
+    one by one through the persistent emotion cache.
+
+    Args:
+        texts (list of str): The texts to be analyzed for emotions.
+        types (list of str): The type/category of each text.
+        record_dts (list of str): The record date of each text, formatted as '%Y-%m-%d'.
+        engine (str, optional): The emotion engine, 'text2emotion' or 'lexicon'. Defaults to EMOTION_ENGINE.
+
+    Returns:
+        pd.DataFrame: One row per text with the record date, type, emotion scores and main emotion.
+    """
+    return build_emotion_records(record_dts, types, get_emotion_score_array(texts, engine=engine))
+
+def get_emotion_score_array(texts, engine=None):
+    """
+    Scores the emotions of several texts.
+
+    Args:
+        texts (list of str): The texts to be analyzed for emotions.
+        engine (str, optional): The emotion engine, 'text2emotion' or 'lexicon'. Defaults to EMOTION_ENGINE.
+
+    Returns:
+        np.ndarray: An array of shape (len(texts), 5) with the scores in EMOTIONS order.
+    """
+    emotion_engine = get_emotion_engine(engine)
+    texts = [text if isinstance(text, str) else '' for text in texts]
+    if emotion_engine.supports_counts:
+        return emotion_engine.score(texts)
+    return np.array(
+        [[get_emotion_scores(text, engine=engine)[emotion] for emotion in EMOTIONS] for text in texts],
+        dtype=np.float64
+    ).reshape(len(texts), len(EMOTIONS))
+
+def get_entry_emotion_scores(df, engine=None):
+    """
+    Scores the emotions of every section of the diary entries plus each whole day.
+
+    With engines that count emotion words, the day scores come from the summed counts of the
+    sections instead of a second pass over the combined text.
+
+    Args:
+        df (pd.DataFrame): The text rows with the '<category>_txt' columns.
+        engine (str, optional): The emotion engine, 'text2emotion' or 'lexicon'. Defaults to EMOTION_ENGINE.
+
+    Returns:
+        np.ndarray: An array of shape (len(df), len(EMOTION_RECORD_TYPES), 5) with the scores of each
+        category and of the day, in EMOTIONS order.
+    """
+    emotion_engine = get_emotion_engine(engine)
+    sections = np.array(
+        [[text if isinstance(text, str) else '' for text in df[f'{category}_txt']] for category in NER_CATEGORIES],
+        dtype=object
+    ).reshape(len(NER_CATEGORIES), len(df)).T
+
+    if emotion_engine.supports_counts:
+        counts = emotion_engine.count(sections.ravel().tolist()).reshape(len(df), len(NER_CATEGORIES), len(EMOTIONS))
+        counts = np.concatenate([counts, counts.sum(axis=1, keepdims=True)], axis=1)
+        return normalize_emotion_counts(counts.reshape(-1, len(EMOTIONS))).reshape(counts.shape)
+
+    texts = np.column_stack([sections, ["\n\n".join(entry) for entry in sections]]) if len(df) \
+        else np.empty((0, len(EMOTION_RECORD_TYPES)), dtype=object)
+    scores = get_emotion_score_array(texts.ravel().tolist(), engine=engine)
+    return scores.reshape(len(df), len(EMOTION_RECORD_TYPES), len(EMOTIONS))
 
 def get_emotions_from_text(text, type, selected_date=datetime.now(), filter=True):
     """
@@ -17,19 +256,10 @@ def get_emotions_from_text(text, type, selected_date=datetime.now(), filter=True
     Returns:
         pd.DataFrame: A DataFrame containing the record date, type, main emotion, and emotion scores.
     """
-    emotions = te.get_emotion(text)
-    base_df = pd.DataFrame(
-        {
-            'record_dt': selected_date.strftime("%Y-%m-%d"),
-            'type': type,
-        },
-        index=[0]
+    emotions = get_emotion_scores(text)
+    return build_emotion_records(
+        [selected_date.strftime("%Y-%m-%d")], [type], [[emotions[emotion] for emotion in EMOTIONS]]
     )
-    emotions = pd.DataFrame(emotions, index=[0])
-    emotions[f'main_emotion'] = emotions.idxmax(axis=1)
-    emotions = pd.concat([base_df, emotions], axis=1)
-    emotions.columns = [x.lower() for x in list(emotions.columns)]
-    return emotions
 def combine_string_category(df,filter='combined'):
     """
     Combines text from a specified column in the DataFrame into a single string, replacing newlines with spaces.
@@ -45,36 +275,99 @@ def combine_string_category(df,filter='combined'):
     combine_string = combine_string.replace('\n', ' ')
     return combine_string
 
-def get_ner(text):
+def count_words(text):
+    """
+    Counts the words of a text the way WordCloud tokenises it: trailing 's removed, numbers and
+    stopwords left out. Counts of several texts can be summed.
+
+    Args:
+        text (str): The text to be counted.
+
+    Returns:
+        dict: The count of every word, in its original case.
+    """
+    words = (word[:-2] if word.lower().endswith("'s") else word for word in WORD_PATTERN.findall(text))
+    return dict(Counter(
+        word for word in words if not word.isdigit() and word.lower() not in WORD_CLOUD_STOPWORDS
+    ))
+
+def merge_word_counts(word_counts):
+    """
+    Merges the case variants and plurals of summed word counts, like WordCloud does: each word is
+    shown in its most common case, and 'words' is merged into 'word' when both appear.
+
+    Args:
+        word_counts (dict): The count of every word, in its original case.
+
+    Returns:
+        dict: The merged counts.
+    """
+    cases = {}
+    for word, count in word_counts.items():
+        case_counts = cases.setdefault(word.lower(), {})
+        case_counts[word] = case_counts.get(word, 0) + count
+
+    for word_lower in list(cases):
+        if word_lower.endswith('s') and not word_lower.endswith('ss') and word_lower[:-1] in cases:
+            singular_counts = cases[word_lower[:-1]]
+            for word, count in cases.pop(word_lower).items():
+                singular_counts[word[:-1]] = singular_counts.get(word[:-1], 0) + count
+
+    return {
+        max(case_counts.items(), key=lambda item: item[1])[0]: sum(case_counts.values())
+        for case_counts in cases.values()
+    }
+
+def get_ner(text, model_name=None):
     """
     Extracts named entities from the given text using spaCy and returns a DataFrame with entity counts by label.
 
     Args:
         text (str): The text to be analyzed for named entities.
+        model_name (str, optional): The spaCy model to use. Defaults to NER_MODEL_NAME.
 
     Returns:
         pd.DataFrame: A DataFrame with named entity counts by label, with columns for each entity label
         and rows for each entity text.
     """
-    # Load the spaCy model
-    nlp = spacy.load("en_core_web_sm")
+    # Get the cached spaCy model
+    nlp = get_nlp(model_name)
 
     # Process the text with spaCy
     doc = nlp(text)
 
-    # Initialize a dictionary to collect name counts by entity labels
-    name_counts = {}
+    return name_counts_to_df(count_entities(doc))
+
+def count_entities(doc, name_counts=None):
+    """
+    Counts the named entities of a processed spaCy document by entity label.
+
+    Args:
+        doc (spacy.tokens.Doc): The processed document.
+        name_counts (dict, optional): Existing counts to be updated in place. Defaults to a new dictionary.
+
+    Returns:
+        dict: A nested dictionary of {label: {entity text: count}}.
+    """
+    if name_counts is None:
+        name_counts = {}
 
     # Extract and count names for each entity label
     for ent in doc.ents:
-      if ent.label_ not in name_counts:
-          name_counts[ent.label_] = {}
+        label_counts = name_counts.setdefault(ent.label_, {})
+        label_counts[ent.text] = label_counts.get(ent.text, 0) + 1
+    return name_counts
 
-      if ent.text in name_counts[ent.label_]:
-          name_counts[ent.label_][ent.text] += 1
-      else:
-          name_counts[ent.label_][ent.text] = 1
+def name_counts_to_df(name_counts):
+    """
+    Converts nested entity counts into the DataFrame layout returned by get_ner.
+
+    Args:
+        name_counts (dict): A nested dictionary of {label: {entity text: count}}.
 
+    Returns:
+        pd.DataFrame: A DataFrame with a 'text' column and one lowercase column per entity label.
+    """
     # Convert the nested dictionary to a DataFrame
     df = pd.DataFrame(name_counts)
 
@@ -84,6 +377,146 @@ def get_ner(text):
     df.rename(columns={'index':'text'}, inplace=True)
     return df
 
+def sum_name_counts(name_counts_list):
+    """
+    Sums several nested entity counts into one.
+
+    Args:
+        name_counts_list (iterable of dict): Nested dictionaries of {label: {entity text: count}}.
+
+    Returns:
+        dict: The summed nested dictionary of {label: {entity text: count}}.
+    """
+    total_counts = {}
+    for name_counts in name_counts_list:
+        for label, label_counts in name_counts.items():
+            total_label_counts = total_counts.setdefault(label, {})
+            for text, count in label_counts.items():
+                total_label_counts[text] = total_label_counts.get(text, 0) + count
+    return total_counts
+
+def get_max_label_texts(name_counts):
+    """
+    Finds the most frequent texts of each entity label, like get_max_label_count but on nested counts.
+
+    Args:
+        name_counts (dict): A nested dictionary of {label: {entity text: count}}.
+
+    Returns:
+        dict: A dictionary mapping each lowercase label to the list of its texts with the highest count.
+    """
+    max_texts = {}
+    for label, label_counts in name_counts.items():
+        max_count = max(label_counts.values())
+        max_texts[label.lower()] = [text for text, count in label_counts.items() if count == max_count]
+    return max_texts
+
+def get_entry_entity_counts(df, categories=None, batch_size=None, n_process=None, model_name=None):
+    """
+    Counts the named entities of every entry and category of the text DataFrame in a single nlp.pipe pass.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the '<category>_txt' columns.
+        categories (list of str, optional): The categories to analyze. Defaults to NER_CATEGORIES.
+        batch_size (int, optional): Number of documents per nlp.pipe batch. Defaults to NER_BATCH_SIZE.
+        n_process (int, optional): Number of worker processes for nlp.pipe. Defaults to NER_N_PROCESS.
+        model_name (str, optional): The spaCy model to use. Defaults to NER_MODEL_NAME.
+
+    Returns:
+        list of dict: One dictionary per row of df, mapping each category to its nested
+        {label: {entity text: count}} dictionary.
+    """
+    categories = categories or NER_CATEGORIES
+    nlp = get_nlp(model_name)
+
+    # One (text, (row, category)) pair per non-empty entry section
+    docs = (
+        (text.replace('\n', ' '), (row, category))
+        for category in categories
+        for row, text in enumerate(df[f'{category}_txt'])
+        if isinstance(text, str) and text.strip()
+    )
+
+    entry_counts = [{category: {} for category in categories} for _ in range(len(df))]
+    for doc, (row, category) in nlp.pipe(
+            docs,
+            as_tuples=True,
+            batch_size=batch_size or NER_BATCH_SIZE,
+            n_process=n_process or NER_N_PROCESS
+    ):
+        count_entities(doc, entry_counts[row][category])
+    return entry_counts
+
+def get_ner_by_category(df, categories=None, batch_size=None, n_process=None, model_name=None):
+    """
+    Extracts named entities for every entry and category of the text DataFrame in a single nlp.pipe pass.
+
+    Each entry/category text is parsed exactly once. The 'combined' counts are the sum of the
+    category counts instead of a second parse of the concatenated text.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing the '<category>_txt' columns.
+        categories (list of str, optional): The categories to analyze. Defaults to NER_CATEGORIES.
+        batch_size (int, optional): Number of documents per nlp.pipe batch. Defaults to NER_BATCH_SIZE.
+        n_process (int, optional): Number of worker processes for nlp.pipe. Defaults to NER_N_PROCESS.
+        model_name (str, optional): The spaCy model to use. Defaults to NER_MODEL_NAME.
+
+    Returns:
+        dict: A dictionary mapping each category, plus 'combined', to a DataFrame in the get_ner layout.
+    """
+    categories = categories or NER_CATEGORIES
+    entry_counts = get_entry_entity_counts(
+        df, categories=categories, batch_size=batch_size, n_process=n_process, model_name=model_name
+    )
+
+    category_counts = {
+        category: sum_name_counts(counts[category] for counts in entry_counts)
+        for category in categories
+    }
+
+    # Combined counts are the sum of the category counts
+    ner_dfs = {category: name_counts_to_df(counts) for category, counts in category_counts.items()}
+    ner_dfs['combined'] = name_counts_to_df(sum_name_counts(category_counts.values()))
+    return ner_dfs
+
+def get_entry_records(df, engine=None, model_name=None, entity_counts=None):
+    """
+    Analyzes diary entries and builds their emotions rows: one row per category plus one 'day' row
+    per entry, with the emotion scores and the most frequent entities of each label.
+
+    The emotions of all the entries are scored in one batch and their entities found in a single
+    nlp.pipe pass; the 'day' entities are the sum of the category counts.
+
+    Args:
+        df (pd.DataFrame): The text rows with 'record_dt' and the '<category>_txt' columns.
+        engine (str, optional): The emotion engine, 'text2emotion' or 'lexicon'. Defaults to EMOTION_ENGINE.
+        model_name (str, optional): The spaCy model to use. Defaults to NER_MODEL_NAME.
+        entity_counts (list of dict, optional): The entity counts of every entry, from
+            get_entry_entity_counts, when they were already computed.
+
+    Returns:
+        pd.DataFrame: The emotions rows, in the fixed schema of build_emotion_records.
+    """
+    scores = get_entry_emotion_scores(df, engine=engine)
+    if entity_counts is None:
+        entity_counts = get_entry_entity_counts(df, model_name=model_name)
+
+    label_texts = []
+    for entry_counts in entity_counts:
+        entry_counts = {**entry_counts, 'day': sum_name_counts(entry_counts.values())}
+        label_texts.extend(get_max_label_texts(entry_counts[category]) for category in EMOTION_RECORD_TYPES)
+
+    record_dts = [
+        record_dt if isinstance(record_dt, str) else record_dt.strftime("%Y-%m-%d")
+        for record_dt in df['record_dt']
+    ]
+    return build_emotion_records(
+        np.repeat(np.array(record_dts, dtype=object), len(EMOTION_RECORD_TYPES)),
+        np.tile(np.array(EMOTION_RECORD_TYPES, dtype=object), len(df)),
+        scores.reshape(-1, len(EMOTIONS)),
+        label_texts
+    )
+
 def get_max_label_count(df,):
     """
     Finds the texts with the maximum count for each named entity label in the given DataFrame.
@@ -166,24 +599,16 @@ def add_remaining_ner_labels(df, value=None):
         - ORDINAL:     “first”, “second”, etc.
         - CARDINAL:    Numerals that do not fall under another type.
     """
-    ner_labels = ['cardinal', 'date', 'event', 'fac', 'gpe', 'language', 'law', 'loc', 'money',
-                  'norp', 'ordinal', 'org', 'percent', 'person', 'product', 'quantity', 'time',
-                  'work_of_art', 'loc', 'misc', 'org', 'per']
-    cols_list = df.columns.to_list()
-
-    # Convert lists to sets
-    set1 = set(ner_labels)
-    set2 = set(cols_list)
-
-    # Find missing elements
-    missing_elements = set1 - set2
-
-    # Convert the result back to a list
-    missing_elements_list = list(missing_elements)
-
-    for col in missing_elements_list:
-        df[col] = value
-    return df
+    missing_labels = [label for label in NER_LABELS if label not in df.columns]
+    if not missing_labels:
+        return df
+    # Add all the missing columns at once rather than one insert per column
+    missing_df = pd.DataFrame(
+        np.full((len(df), len(missing_labels)), value, dtype=object), index=df.index, columns=missing_labels
+    )
+    if value is not None:
+        missing_df = missing_df.infer_objects()
+    return pd.concat([df, missing_df], axis=1)
 
 def get_current_emotion(df, type='day'):
     """
@@ -219,49 +644,31 @@ def get_sentences_from_emotions(df):
     """
     last_date = df['record_dt'].max()
     current_df = df[df['record_dt']==last_date]
-    current_df = current_df.groupby('main_emotion')['type'].apply(list).reset_index()
+    current_df = current_df.groupby('main_emotion', observed=True)['type'].apply(list).reset_index()
     emotions_sentences = []
     for i in range(0,len(current_df)):
         sentence = current_df.iloc[i,0] + " is the emotion to describe your writing about: " + ', '.join(current_df.iloc[i,1])
         emotions_sentences.append(sentence)
     return emotions_sentences
 
-def get_emotions_trend(df, category):
+def get_emotions_trend(df, category, window=None):
     """
     Analyzes the trend of a specific emotion category over time and returns a descriptive sentence.
 
     Args:
         df (pd.DataFrame): The DataFrame containing emotion data.
         category (str): The emotion category to analyze (e.g., 'happy', 'sad').
+        window (int, optional): The number of days, ending on the last entry, to analyze. Defaults to all of them.
 
     Returns:
         str: A sentence describing the trend of the specified emotion category.
     """
-    df = df[df['type']=='day'][[category]]
-    slope, intercept, r_value, p_value, std_err = linregress(range(len(df)), df[category])
-    mapping ={
-      'happy':'happiness',
-      'angry': 'anger',
-      'surprise': 'surprise',
-      'sad': 'sadness',
-      'fear': 'fear',
-    }
+    from src.trends import TrendEngine, describe_trend
 
-    high_upward_threshold = 1.5
-    low_upward_threshold = 0.1
-    low_downward_threshold = -0.1
-    high_downward_threshold = -1.5
-
-    if slope > high_upward_threshold:
-        return f"The data shows a strong upward trend in related to {mapping[category]}"
-    elif slope > low_upward_threshold:
-        return f"The analysis reveals a modest increase related to {mapping[category]}."
-    elif slope < high_downward_threshold:
-        return f"The data shows a strong downward  trend in related to {mapping[category]}."
-    elif slope < low_downward_threshold:
-        return f"The analysis reveals a modest decrease related to {mapping[category]}."
-    else:
-        return f"Your emotion related to {mapping[category]} is steady."
+    engine = TrendEngine.from_emotions_df(df, types=['day'])
+    if engine is None:
+        return describe_trend(category, 0.0)
+    return engine.describe(window)[category]
 
 def get_most_cited_person(df):
     """
@@ -1,26 +1,97 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 import PyPDF2
+import argparse
+import io
+import itertools
+import json
 import os
+import re
 import shutil
 import textwrap
+import time
 
 base_dir = os.path.dirname(__file__)
 
+# Number of pages rendered per worker before they are added to the output
+EXPORT_CHUNK_SIZE = 32
+# Default number of pages per volume of an export. PyPDF2 only writes a whole document at once, so
+# the pages of a volume are all held in memory until it is written
+EXPORT_VOLUME_SIZE = int(os.getenv("LLM_DIARY_EXPORT_VOLUME_SIZE", "500"))
+# Date written at the start of every answer of a page, e.g. "On March 3, 2024,"
+PAGE_DATE_PATTERN = re.compile(
+    r'\bOn (January|February|March|April|May|June|July|August|September|October|November|December) (\d{1,2}), (\d{4}),'
+)
+
+
+def render_page_bytes(entry):
+    """
+    Renders a diary entry as a single PDF page in memory. Used by the export process pool.
+
+    Args:
+        entry (tuple): The (content, record_dt) of the entry.
+
+    Returns:
+        bytes: The rendered PDF page.
+    """
+    content, record_dt = entry
+    buffer = io.BytesIO()
+    CreateDiary().render_page(buffer, content, record_dt)
+    return buffer.getvalue()
+
+
+def get_page_date(page):
+    """
+    Reads the date of a diary page from its text.
+
+    Args:
+        page (PyPDF2.PageObject): The page.
+
+    Returns:
+        datetime.date: The date of the entry, or None if the page has no date.
+    """
+    match = PAGE_DATE_PATTERN.search(page.extract_text() or '')
+    if match is None:
+        return None
+    return datetime.strptime(' '.join(match.groups()), '%B %d %Y').date()
+
+
 class CreateDiary:
+    """
+    Writes the diary pages and appends them to monthly volumes (my_diary_<year>_<month>.pdf).
+
+    Appending a page only rewrites the volume of its month, so saving costs the same however long
+    the diary is. A lightweight index document (my_diary_index.json) lists every volume and the
+    date of each of its pages. The single diary file of the previous versions (my_diary.pdf) is
+    split into the volumes the first time a page is appended.
+    """
     def __init__(self):
         self.diary_page_directory = os.path.join(base_dir, 'data', 'diary_pages').replace('\\', '/')
         self.my_diary_directory = os.path.join(base_dir, 'data', 'my_diary').replace('\\', '/')
-        self.my_diary_filename = 'my_diary.pdf'
+        self.my_diary_index_filename = 'my_diary_index.json'
+        self.legacy_diary_filename = 'my_diary.pdf'
+        self.undated_volume_filename = 'my_diary_undated.pdf'
 
-    def create_pdf(self, filename, content):
-        file_path = os.path.join(base_dir, 'data', 'diary_pages', filename).replace('\\', '/')
-        c = canvas.Canvas(file_path, pagesize=letter)
+    def render_page(self, output, content, record_dt):
+        """
+        Renders a diary entry as a single PDF page.
+
+        Args:
+            output (str or file-like): The path or binary buffer the page is written to.
+            content (str): The entry text, with questions on their own lines ending with '?'.
+            record_dt (datetime.date): The date of the entry.
+
+        Returns:
+            None
+        """
+        c = canvas.Canvas(output, pagesize=letter)
         width, height = letter
 
         # Title
         c.setFont("Helvetica-Bold", 18)
-        c.drawCentredString(width // 2, height - 50, "Your 2024 Diary!")
+        c.drawCentredString(width // 2, height - 50, f"Your {record_dt.year} Diary!")
 
         # Content
         c.setFont("Helvetica", 12)
@@ -50,35 +121,259 @@ class CreateDiary:
 
         c.save()
 
-        if self.is_folder_empty(self.my_diary_directory):
-            self.copy_pdf_file(self.diary_page_directory, filename, self.my_diary_directory)
-            self.rename_pdf_file(self.my_diary_directory, filename, self.my_diary_filename)
-            print(f"The folder '{self.my_diary_directory}' is empty.")
+    def create_pdf(self, filename, content, record_dt=None):
+        """
+        Writes a diary page and appends it to the volume of its month.
+
+        Args:
+            filename (str): The file name of the page in the diary pages folder.
+            content (str): The entry text.
+            record_dt (datetime.date, optional): The date of the entry. Defaults to today.
+
+        Returns:
+            None
+        """
+        record_dt = record_dt or datetime.now().date()
+        os.makedirs(self.diary_page_directory, exist_ok=True)
+        file_path = os.path.join(self.diary_page_directory, filename).replace('\\', '/')
+        self.render_page(file_path, content, record_dt)
+        self.append_page(file_path, record_dt)
+
+    def get_volume_filename(self, record_dt):
+        """
+        Returns the file name of the volume that holds the pages of a given month.
+
+        Args:
+            record_dt (datetime.date): The date of the entry.
+
+        Returns:
+            str: The volume file name.
+        """
+        return f"my_diary_{record_dt.strftime('%Y_%m')}.pdf"
+
+    def append_page(self, page_path, record_dt):
+        """
+        Appends a page to the volume of its month and records it in the index document.
+
+        Args:
+            page_path (str): The path of the single page PDF.
+            record_dt (datetime.date): The date of the entry.
+
+        Returns:
+            None
+        """
+        os.makedirs(self.my_diary_directory, exist_ok=True)
+        self.migrate_legacy_diary()
+        volume_filename = self.get_volume_filename(record_dt)
+        volume_path = os.path.join(self.my_diary_directory, volume_filename).replace('\\', '/')
+
+        if not os.path.exists(volume_path):
+            tmp_path = f'{volume_path}.tmp'
+            shutil.copy(page_path, tmp_path)
+            os.replace(tmp_path, volume_path)
+            print(f"Started the volume '{volume_path}'.")
         else:
-            my_diary_path = os.path.join(self.my_diary_directory, self.my_diary_filename)
-            new_page_path = os.path.join(self.diary_page_directory, filename)
-            self.merge_pdfs(my_diary_path, new_page_path, my_diary_path)
-            print(f"The folder '{my_diary_path}' is not empty.")
-    def merge_pdfs(self,pdf1_path, pdf2_path, output_path):
-        pdf_writer = PyPDF2.PdfWriter()
+            self.merge_pdfs(volume_path, page_path, volume_path)
+            print(f"Added a page to the volume '{volume_path}'.")
+
+        diary_index = self.load_index()
+        pages = diary_index['volumes'].setdefault(volume_filename, [])
+        pages.append({'record_dt': record_dt.strftime("%Y-%m-%d"), 'page': os.path.basename(page_path)})
+        self.save_index(diary_index)
+
+    def migrate_legacy_diary(self):
+        """
+        Splits the legacy diary (my_diary.pdf, one file for the whole history) into the monthly
+        volumes, ahead of the pages the volumes already have, and records its pages in the index.
+
+        The date of each page is read from its text. A page without a date goes in the volume of the
+        page before it, or in my_diary_undated.pdf if no page before it has a date. Once done, the
+        legacy file is renamed to my_diary.pdf.migrated so the migration only runs once; volumes
+        already holding legacy pages are skipped if it is interrupted and run again.
+
+        Returns:
+            dict: The number of legacy pages added to each volume.
+        """
+        legacy_path = os.path.join(self.my_diary_directory, self.legacy_diary_filename).replace('\\', '/')
+        if not os.path.exists(legacy_path):
+            return {}
 
-        # Open the first PDF
-        pdf1 = PyPDF2.PdfReader(open(pdf1_path, "rb"))
+        diary_index = self.load_index()
+        migrated = {}
+        with open(legacy_path, 'rb') as legacy_file:
+            volumes = {}
+            volume_filename = self.undated_volume_filename
+            for page_number, page in enumerate(PyPDF2.PdfReader(legacy_file).pages, start=1):
+                record_dt = get_page_date(page)
+                if record_dt is not None:
+                    volume_filename = self.get_volume_filename(record_dt)
+                volumes.setdefault(volume_filename, []).append((page, {
+                    'record_dt': record_dt.strftime("%Y-%m-%d") if record_dt else None,
+                    'page': f'{self.legacy_diary_filename}#{page_number}',
+                }))
 
-        # Loop through each page and add it to the writer
-        for page_num in range(len(pdf1.pages)):
-            pdf_writer.add_page(pdf1.pages[page_num])
+            for volume_filename, pages in volumes.items():
+                index_pages = diary_index['volumes'].get(volume_filename, [])
+                if any(entry['page'].startswith(f'{self.legacy_diary_filename}#') for entry in index_pages):
+                    continue
 
-        # Open the second PDF
-        pdf2 = PyPDF2.PdfReader(open(pdf2_path, "rb"))
+                pdf_writer = PyPDF2.PdfWriter()
+                for page, _ in pages:
+                    pdf_writer.add_page(page)
+                volume_path = os.path.join(self.my_diary_directory, volume_filename).replace('\\', '/')
+                if os.path.exists(volume_path):
+                    with open(volume_path, 'rb') as volume_file:
+                        volume_reader = PyPDF2.PdfReader(io.BytesIO(volume_file.read()))
+                    for page in volume_reader.pages:
+                        pdf_writer.add_page(page)
 
-        # Loop through each page and add it to the writer
-        for page_num in range(len(pdf2.pages)):
-            pdf_writer.add_page(pdf2.pages[page_num])
+                tmp_path = f'{volume_path}.tmp'
+                with open(tmp_path, "wb") as output_file:
+                    pdf_writer.write(output_file)
+                os.replace(tmp_path, volume_path)
+                diary_index['volumes'][volume_filename] = [entry for _, entry in pages] + index_pages
+                self.save_index(diary_index)
+                migrated[volume_filename] = len(pages)
 
-        # Write the merged PDF to the output file
-        with open(output_path, "wb") as output_file:
-            pdf_writer.write(output_file)
+        os.replace(legacy_path, f'{legacy_path}.migrated')
+        print(f"Split the legacy diary '{legacy_path}' into {len(volumes)} volume(s).")
+        return migrated
+
+    def load_index(self):
+        """
+        Loads the index document listing the diary volumes and their pages.
+
+        Returns:
+            dict: The index, with the pages of each volume under 'volumes'.
+        """
+        index_path = os.path.join(self.my_diary_directory, self.my_diary_index_filename)
+        if not os.path.exists(index_path):
+            return {'volumes': {}}
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            return json.load(index_file)
+
+    def save_index(self, diary_index):
+        """
+        Saves the index document atomically.
+
+        Args:
+            diary_index (dict): The index to be saved.
+
+        Returns:
+            None
+        """
+        index_path = os.path.join(self.my_diary_directory, self.my_diary_index_filename)
+        tmp_path = f'{index_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump(diary_index, index_file, indent=2)
+        os.replace(tmp_path, index_path)
+
+    def export_range(self, text_chunks, output_path, volume_size=None, workers=None, single_file=False):
+        """
+        Renders the entries of a stream of text chunks into new PDF volumes in one streaming pass.
+
+        Pages are rendered in a process pool in batches of EXPORT_CHUNK_SIZE pages per worker, and
+        each batch is added to the current volume before the next one is rendered. PyPDF2 writes a
+        document in one go, so each volume is held in memory until it is full and written; memory is
+        bounded by the text chunk and by volume_size pages. A range that fits in one volume is
+        written to output_path itself. With single_file, every page goes to output_path and memory
+        grows with the number of exported pages.
+
+        Args:
+            text_chunks (iterable of pd.DataFrame): The text rows to export, with 'record_dt' and the
+                '<category>_txt' columns, e.g. from src.storage.iter_range_chunks.
+            output_path (str): The output PDF path. Volumes are written as <name>_001.pdf,
+                <name>_002.pdf, ...
+            volume_size (int, optional): The maximum number of pages per volume. Defaults to
+                EXPORT_VOLUME_SIZE.
+            workers (int, optional): The number of rendering processes. Defaults to the number of CPUs;
+                1 renders in the current process.
+            single_file (bool, optional): Whether to write every page to output_path, without
+                volumes. Defaults to False.
+
+        Returns:
+            list of str: The paths of the written PDF files.
+        """
+        from src.prompts import diary_questions, format_diary_section
+
+        def entries():
+            for text_df in text_chunks:
+                for row in text_df.to_dict('records'):
+                    record_dt = datetime.strptime(str(row['record_dt'])[:10], '%Y-%m-%d').date()
+                    sections = [
+                        format_diary_section(
+                            question,
+                            row[f'{category}_txt'] if isinstance(row[f'{category}_txt'], str) else '',
+                            record_dt
+                        )
+                        for category, question in diary_questions.items()
+                    ]
+                    yield "\n\n".join(sections), record_dt
+
+        workers = workers or os.cpu_count() or 1
+        volume_size = None if single_file else volume_size or EXPORT_VOLUME_SIZE
+        root, ext = os.path.splitext(output_path)
+        output_paths = []
+
+        def write_volume(pdf_writer):
+            volume_path = f'{root}_{len(output_paths) + 1:03d}{ext}' if volume_size else output_path
+            tmp_path = f'{volume_path}.tmp'
+            with open(tmp_path, "wb") as output_file:
+                pdf_writer.write(output_file)
+            os.replace(tmp_path, volume_path)
+            output_paths.append(volume_path)
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            # The readers of the pages of a volume are kept until it is written: PyPDF2 maps the
+            # objects it copied by id(reader), which a new reader can reuse once an old one is freed
+            pdf_writer, readers = PyPDF2.PdfWriter(), []
+            entry_iterator = entries()
+            while True:
+                batch = list(itertools.islice(entry_iterator, EXPORT_CHUNK_SIZE * workers))
+                if not batch:
+                    break
+                if executor:
+                    rendered = executor.map(render_page_bytes, batch, chunksize=EXPORT_CHUNK_SIZE)
+                else:
+                    rendered = map(render_page_bytes, batch)
+
+                for page_bytes in rendered:
+                    readers.append(PyPDF2.PdfReader(io.BytesIO(page_bytes)))
+                    pdf_writer.add_page(readers[-1].pages[0])
+                    if volume_size and len(readers) == volume_size:
+                        write_volume(pdf_writer)
+                        pdf_writer, readers = PyPDF2.PdfWriter(), []
+
+            if readers or not output_paths:
+                write_volume(pdf_writer)
+        finally:
+            if executor:
+                executor.shutdown()
+
+        # A range that fits in a single volume needs no volume number
+        if volume_size and len(output_paths) == 1:
+            os.replace(output_paths[0], output_path)
+            output_paths = [output_path]
+        return output_paths
+
+    def merge_pdfs(self,pdf1_path, pdf2_path, output_path):
+        pdf_writer = PyPDF2.PdfWriter()
+
+        # Open both PDFs and add their pages to the writer
+        with open(pdf1_path, "rb") as pdf1_file, open(pdf2_path, "rb") as pdf2_file:
+            for page in PyPDF2.PdfReader(pdf1_file).pages:
+                pdf_writer.add_page(page)
+
+            for page in PyPDF2.PdfReader(pdf2_file).pages:
+                pdf_writer.add_page(page)
+
+            # Write the merged PDF to a temporary file and swap it in, so a failed write never
+            # leaves a truncated diary behind
+            tmp_path = f'{output_path}.tmp'
+            with open(tmp_path, "wb") as output_file:
+                pdf_writer.write(output_file)
+        os.replace(tmp_path, output_path)
 
     def copy_pdf_file(self,source_directory, filename, target_directory):
         # Ensure the target directory exists
@@ -107,3 +402,41 @@ class CreateDiary:
         os.rename(old_path, new_path)
         print(f"Renamed '{old_filename}' to '{new_filename}' in '{directory}'")
 
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export diary entries to PDF.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate', help='Split the legacy my_diary.pdf into monthly volumes.')
+    export_parser = subparsers.add_parser('export', help='Render a date range of entries into a new PDF.')
+    export_parser.add_argument('--begin', help="First date to export, as YYYY-MM-DD. Defaults to the first entry.")
+    export_parser.add_argument('--end', help="Last date to export, as YYYY-MM-DD. Defaults to the last entry.")
+    export_parser.add_argument('--output', required=True, help='The output PDF path.')
+    export_parser.add_argument('--volume-size', type=int, help='Maximum number of pages per volume. Defaults to EXPORT_VOLUME_SIZE.')
+    export_parser.add_argument(
+        '--single-file', action='store_true',
+        help='Write every page to the output file, without volumes. Memory grows with the number of pages.'
+    )
+    export_parser.add_argument('--workers', type=int, help='Number of rendering processes.')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        CreateDiary().migrate_legacy_diary()
+
+    if args.command == 'export':
+        from src.storage import iter_range_chunks
+
+        start = time.perf_counter()
+        entries = 0
+
+        def text_chunks():
+            global entries
+            for text_df in iter_range_chunks('text', args.begin, args.end):
+                entries += len(text_df)
+                yield text_df
+
+        paths = CreateDiary().export_range(
+            text_chunks(), args.output, volume_size=args.volume_size, workers=args.workers,
+            single_file=args.single_file
+        )
+        elapsed = time.perf_counter() - start
+        print(f"Exported {entries} entries to {len(paths)} file(s) in {elapsed:.1f}s: {', '.join(paths)}")
@@ -1,9 +1,34 @@
 import plotly.graph_objects as go
 import streamlit as st
-from wordcloud import WordCloud, STOPWORDS
+from wordcloud import WordCloud
 import matplotlib.pyplot as plt
 import plotly.express as px
-from src.nlp import add_remaining_ner_labels
+import hashlib
+import json
+import numpy as np
+import os
+import pandas as pd
+from src.nlp import WORD_CLOUD_STOPWORDS, add_remaining_ner_labels
+
+# Maximum number of points per emotion sent to the browser, whatever the length of the range
+PLOT_MAX_POINTS = int(os.getenv("LLM_DIARY_PLOT_MAX_POINTS", "1500"))
+# Traces with more points than this are drawn with WebGL
+PLOT_WEBGL_THRESHOLD = int(os.getenv("LLM_DIARY_PLOT_WEBGL_THRESHOLD", "500"))
+# 'resample' (day, week or month means) or 'lttb' (downsampling of the daily means)
+PLOT_DOWNSAMPLING = os.getenv("LLM_DIARY_PLOT_DOWNSAMPLING", "resample")
+# Size of the rendered word cloud, in pixels
+WORD_CLOUD_SIZE = (800, 400)
+# Resolutions tried from the finest, as (name, resample rule, days per point)
+PLOT_RESOLUTIONS = [('day', 'D', 1), ('week', 'W', 7), ('month', 'MS', 30.4)]
+EMOTION_COLUMNS = ['happy', 'angry', 'surprise', 'sad', 'fear']
+HOVER_COLUMNS = {
+    'Date': 'date',
+    'Person': 'person',
+    'Time': 'time',
+    'Money': 'money',
+    'Org': 'org',
+    'Product': 'product',
+}
 
 def plot_filtered_df(df, category):
     """
@@ -16,46 +41,146 @@ def plot_filtered_df(df, category):
     Returns:
         None
     """
+    st.plotly_chart(build_emotion_figure(df, category), use_container_width=True, key= f'plot_{category}')
+
+def build_emotion_figure(df, category, max_points=None):
+    """
+    Builds the figure of the emotions of one category over time.
+
+    The points are aggregated on the server so the figure never holds more than max_points per
+    emotion: daily, weekly or monthly means depending on the length of the range, or LTTB
+    downsampling of the daily means (LLM_DIARY_PLOT_DOWNSAMPLING=lttb). Long traces are drawn
+    with WebGL.
+
+    Args:
+        df (pd.DataFrame): The DataFrame containing emotion data.
+        category (str): The category of data to be filtered and plotted.
+        max_points (int, optional): The maximum number of points per emotion. Defaults to PLOT_MAX_POINTS.
+
+    Returns:
+        go.Figure: The figure with one trace per emotion.
+    """
+    max_points = max_points or PLOT_MAX_POINTS
     df = df[df['type'] == category]
+    if PLOT_DOWNSAMPLING == 'lttb':
+        df, resolution = resample_emotions(df, 'D'), 'day'
+    else:
+        resolution, rule = choose_resolution(df['record_dt'], max_points)
+        df = resample_emotions(df, rule)
 
-    # Define hover text for each trace
-    hover_text = (
-          "Date: " + df['date'].astype(str) + "<br>" +
-          "Person: " + df['person'].astype(str) + "<br>" +
-          "Time: " + df['time'].astype(str) + "<br>" +
-          "Money: " + df['money'].astype(str) + "<br>" +
-          "Org: " + df['org'].astype(str) + "<br>" +
-          "Product: " + df['product'].astype(str)
-    )
+    # Define hover text for each point
+    hover_text = build_hover_text(df)
 
-    # Create traces
-    trace_happy = go.Scatter(x=df['record_dt'], y=df['happy'], mode='lines+markers', name='Happy',
-                           hovertext=hover_text)
-    trace_angry = go.Scatter(x=df['record_dt'], y=df['angry'], mode='lines+markers', name='Angry',
-                           hovertext=hover_text)
-    trace_surprise = go.Scatter(x=df['record_dt'], y=df['surprise'], mode='lines+markers', name='Surprise',
-                              hovertext=hover_text)
-    trace_sad = go.Scatter(x=df['record_dt'], y=df['sad'], mode='lines+markers', name='Sad',
-                         hovertext=hover_text)
-    trace_fear = go.Scatter(x=df['record_dt'], y=df['fear'], mode='lines+markers', name='Fear',
-                          hovertext=hover_text)
-
-    # Create the figure
+    # Create the figure with one trace per emotion
     fig = go.Figure()
-
-    # Add traces to the figure
-    fig.add_trace(trace_happy)
-    fig.add_trace(trace_angry)
-    fig.add_trace(trace_surprise)
-    fig.add_trace(trace_sad)
-    fig.add_trace(trace_fear)
+    x_days = df['record_dt'].to_numpy(dtype='datetime64[D]').astype(np.float64)
+    for emotion in ['happy', 'angry', 'surprise', 'sad', 'fear']:
+        points = lttb_indices(x_days, df[emotion].to_numpy(), max_points)
+        trace = go.Scattergl if len(points) > PLOT_WEBGL_THRESHOLD else go.Scatter
+        fig.add_trace(trace(
+            x=df['record_dt'].iloc[points], y=df[emotion].iloc[points], mode='lines+markers',
+            name=emotion.capitalize(), hovertext=hover_text[points]
+        ))
 
     # Customize layout
     fig.update_layout(
-      xaxis_title='Date',
+      xaxis_title='Date' if resolution == 'day' else f'Date ({resolution}ly mean)',
       yaxis_title='Emotion Intensity',
     )
-    st.plotly_chart(fig, use_container_width=True, key= f'plot_{category}')
+    return fig
+
+def choose_resolution(record_dt, max_points):
+    """
+    Picks the finest resolution (day, week or month) that keeps a date range under max_points points.
+
+    Args:
+        record_dt (pd.Series): The record dates of the plotted rows.
+        max_points (int): The maximum number of points per emotion.
+
+    Returns:
+        tuple: The resolution name and its pandas resample rule.
+    """
+    if record_dt.empty:
+        return 'day', 'D'
+    record_dt = pd.to_datetime(record_dt)
+    span_days = (record_dt.max() - record_dt.min()).days + 1
+    for resolution, rule, days in PLOT_RESOLUTIONS:
+        if span_days / days <= max_points:
+            return resolution, rule
+    return PLOT_RESOLUTIONS[-1][:2]
+
+def resample_emotions(df, rule):
+    """
+    Aggregates the emotion rows of one category into periods: mean scores, and the last entities
+    mentioned in each period for the hover text.
+
+    Args:
+        df (pd.DataFrame): The emotion rows of one category.
+        rule (str): The pandas resample rule, e.g. 'D', 'W' or 'MS'.
+
+    Returns:
+        pd.DataFrame: One row per period with entries, with 'record_dt', the scores and the hover columns.
+    """
+    df = add_remaining_ner_labels(df.assign(record_dt=pd.to_datetime(df['record_dt'])))
+    df = df[['record_dt', *EMOTION_COLUMNS, *HOVER_COLUMNS.values()]]
+    resampled = df.set_index('record_dt').resample(rule)
+    scores = resampled[EMOTION_COLUMNS].mean()
+    hover = resampled[list(HOVER_COLUMNS.values())].last()
+    return pd.concat([scores, hover], axis=1).dropna(subset=EMOTION_COLUMNS, how='all').reset_index()
+
+def build_hover_text(df):
+    """
+    Formats the hover text of every point with vectorised string operations.
+
+    Args:
+        df (pd.DataFrame): The plotted rows with the HOVER_COLUMNS.
+
+    Returns:
+        np.ndarray: The hover text of each row.
+    """
+    columns = [
+        f"{label}: " + df[column].astype(object).where(df[column].notna(), '-').astype(str)
+        for label, column in HOVER_COLUMNS.items()
+    ]
+    if not columns or df.empty:
+        return np.array([], dtype=object)
+    return columns[0].str.cat(columns[1:], sep="<br>").to_numpy()
+
+def lttb_indices(x, y, max_points):
+    """
+    Selects the points of a series that best keep its shape, with the Largest-Triangle-Three-Buckets
+    algorithm. Series already under max_points are kept whole.
+
+    Args:
+        x (np.ndarray): The x values, increasing.
+        y (np.ndarray): The y values.
+        max_points (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The indices of the selected points.
+    """
+    n = len(x)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    # The first and last points are kept; the others are split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), np.nanmean(y[end:edges[i + 2]])
+        else:
+            next_x, next_y = x[-1], y[-1]
+        previous = selected[i]
+        # Keep the point forming the largest triangle with the previous point and the next bucket average
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        selected[i + 1] = start + np.nanargmax(areas) if not np.isnan(areas).all() else start
+    return selected
 
 def plot_ner(df, ner_label, color='blue'):
     """
@@ -87,18 +212,83 @@ def plot_word_cloud(text):
     Returns:
         None
     """
-    # Define stopwords
-    stopwords = set(STOPWORDS)
-    stopwords.update(["and", "or", "the", "of", "to",
-                    "January","February","March"])
+    plot_word_cloud_image(build_word_cloud_image(text))
+
+def build_word_cloud_image(text):
+    """
+    Renders the word cloud of the given text.
+
+    Args:
+        text (str): The text to be used for generating the word cloud.
+
+    Returns:
+        np.ndarray: The word cloud as an RGB image array.
+    """
     # Create a word cloud object with customization
-    wordcloud = WordCloud(width=800, height=400, background_color='white', max_words=200, stopwords=stopwords, contour_width=3, contour_color='steelblue').generate(text)
+    wordcloud = WordCloud(width=WORD_CLOUD_SIZE[0], height=WORD_CLOUD_SIZE[1], background_color='white', max_words=200, stopwords=WORD_CLOUD_STOPWORDS, contour_width=3, contour_color='steelblue').generate(text)
+    return wordcloud.to_array()
 
+def get_frequencies_digest(frequencies):
+    """
+    Computes a digest of word frequencies, used to cache the rendered word cloud.
+
+    Args:
+        frequencies (dict): The count of every word.
+
+    Returns:
+        str: The SHA-1 hex digest of the frequencies.
+    """
+    return hashlib.sha1(json.dumps(sorted(frequencies.items())).encode('utf-8')).hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def render_word_cloud(frequencies_digest, width, height, _frequencies):
+    """
+    Renders a word cloud from word frequencies. The image is cached by Streamlit per
+    (frequencies digest, size); the frequencies themselves are not hashed.
+
+    Args:
+        frequencies_digest (str): The digest of the frequencies, from get_frequencies_digest.
+        width (int): The image width in pixels.
+        height (int): The image height in pixels.
+        _frequencies (dict): The count of every word.
+
+    Returns:
+        np.ndarray: The word cloud as an RGB image array.
+    """
+    wordcloud = WordCloud(width=width, height=height, background_color='white', max_words=200)
+    return wordcloud.generate_from_frequencies(_frequencies).to_array()
+
+def plot_word_cloud_frequencies(frequencies, size=WORD_CLOUD_SIZE):
+    """
+    Plots a word cloud from summed word counts, so it costs the same however much text they come from.
+
+    Args:
+        frequencies (dict): The count of every word, e.g. from AnalysisStore.get_word_frequencies.
+        size (tuple, optional): The (width, height) of the image. Defaults to WORD_CLOUD_SIZE.
+
+    Returns:
+        None
+    """
+    if not frequencies:
+        st.write('No words to show for the selected dates.')
+        return
+    st.image(render_word_cloud(get_frequencies_digest(frequencies), *size, frequencies), use_column_width=True)
+
+def plot_word_cloud_image(image):
+    """
+    Plots a rendered word cloud.
+
+    Args:
+        image (np.ndarray): The word cloud as an RGB image array.
+
+    Returns:
+        None
+    """
     # Create a matplotlib figure and axis
     fig, ax = plt.subplots(figsize=(10, 5))
 
     # Display the word cloud
-    ax.imshow(wordcloud, interpolation='bilinear')
+    ax.imshow(image, interpolation='bilinear')
     ax.axis('off')
 
     # Pass the figure to st.pyplot
@@ -33,4 +33,28 @@ new_prompt = PromptTemplate(
 )
 
 context = """Purpose: The primary role of this agent is to assist users by providing accurate 
-            information about the recorded daily routine. """
\ No newline at end of file
+            information about the recorded daily routine. """
+
+# Questions answered in each section of a diary entry
+diary_questions = {
+    'highlights': "What were the highlights of your day?",
+    'work': "How did your tasks and activities at work unfold today, and how did you feel in the work environment?",
+    'family': "how was the moments you shared with your family today?",
+    'friends': "How did your interactions with friends go today?",
+}
+
+def format_diary_section(question, text, record_date):
+    """
+    Formats a section of a diary entry as the question followed by the dated answer.
+
+    Args:
+        question (str): The question answered in the section.
+        text (str): The answer written for the section.
+        record_date (datetime.date): The date of the entry.
+
+    Returns:
+        str: The formatted section.
+    """
+    starting_sentence = f'On {record_date.strftime("%B")} {record_date.day}, {record_date.year},'
+    diary_text = starting_sentence + '' + text
+    return "\n\n".join([question, diary_text])
@@ -0,0 +1,263 @@
+from collections import Counter
+import re
+import numpy as np
+from src.emotion_engines import EMOTIONS
+from src.fulltext import parse_query_dates
+from src.nlp import WORD_CLOUD_STOPWORDS, get_current_emotion, get_most_cited_person
+from src.trends import EMOTION_NAMES, TrendEngine, describe_trend
+
+# Words naming each emotion, each row type and each entity label in a question
+EMOTION_WORDS = {
+    'happy': ['happy', 'happier', 'happiest', 'happiness', 'joy', 'joyful'],
+    'angry': ['angry', 'angrier', 'angriest', 'anger', 'mad'],
+    'surprise': ['surprise', 'surprised', 'surprising'],
+    'sad': ['sad', 'sadder', 'saddest', 'sadness', 'unhappy'],
+    'fear': ['fear', 'afraid', 'scared', 'fearful', 'anxious', 'worried'],
+}
+TYPE_WORDS = {
+    'highlights': ['highlight', 'highlights'],
+    'work': ['work', 'job', 'office', 'colleague', 'colleagues'],
+    'family': ['family'],
+    'friends': ['friend', 'friends'],
+}
+LABEL_WORDS = {
+    'person': ['person', 'people', 'name', 'names', 'who'],
+    'gpe': ['place', 'places', 'city', 'cities', 'country', 'countries'],
+    'org': ['organisation', 'organisations', 'organization', 'organizations', 'company', 'companies'],
+}
+WINDOW_DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+# The other words the routed questions are made of. A question with any word outside of these, the
+# stopwords and the dates asks for more than a routed answer gives, and goes to the agent
+ROUTER_VOCABULARY = {
+    'average', 'mean', 'score', 'scores', 'level', 'emotion', 'emotions', 'mood', 'moods', 'feel',
+    'feeling', 'feelings', 'felt', 'trend', 'trends', 'trending', 'changing', 'changed', 'change',
+    'evolving', 'evolved', 'increasing', 'decreasing', 'going', 'lately', 'recently', 'today', 'now',
+    'current', 'currently', 'latest', 'main', 'overall', 'dominant', 'last', 'past', 'days', 'weeks',
+    'months', 'years', 'mention', 'mentioned', 'mentions', 'cite', 'cited', 'talk', 'talked',
+    'write', 'wrote', 'often', 'frequent', 'frequently', 'common', 'commonly', 'diary', 'entries',
+    'entry', 'day', 'date', 'show', 'give', 'tell', 'much', 'general', 'generally', 'usually',
+}
+# Words that ask for an explanation or an inverted ranking the routed answers don't give
+ROUTER_BLOCKERS = {
+    'why', 'explain', 'describe', 'summarise', 'summarize', 'summary', 'happened', 'compare',
+    'least', 'lowest', 'fewest', 'rarely', 'never', 'not', "don't", "didn't",
+}
+ROUTER_KNOWN_WORDS = WORD_CLOUD_STOPWORDS | ROUTER_VOCABULARY | set(WINDOW_DAYS) | {
+    word for words_by_key in (EMOTION_WORDS, TYPE_WORDS, LABEL_WORDS)
+    for words in words_by_key.values() for word in words
+}
+TOKEN_PATTERN = re.compile(r"\w[\w']*")
+WINDOW_PATTERN = re.compile(r'\b(?:last|past|this)\s+(?:(\d+)\s+)?(day|week|month|year)s?\b', re.IGNORECASE)
+
+INTENT_PATTERNS = {
+    'emotion_trend': re.compile(r'\b(trends?|trending|chang\w*|evolv\w*|increas\w*|decreas\w*|going (up|down))\b', re.IGNORECASE),
+    'extreme_day': re.compile(r'\b(when|which day|what day)\b.*\b(\w+est|most)\b', re.IGNORECASE),
+    'average_emotion': re.compile(r'\b(average|mean)\b', re.IGNORECASE),
+    'most_cited': re.compile(r'\b(most|often|frequent\w*|common\w*)\b', re.IGNORECASE),
+    'current_emotion': re.compile(r'\b(feel\w*|felt|mood|emotions?)\b', re.IGNORECASE),
+}
+
+_router_stats = Counter()
+
+
+def find_words(tokens, words_by_key):
+    """
+    Finds the keys whose words appear in a question.
+
+    Args:
+        tokens (set of str): The lowercase words of the question.
+        words_by_key (dict): The words naming each key, e.g. EMOTION_WORDS.
+
+    Returns:
+        list of str: The keys mentioned, in the order of words_by_key.
+    """
+    return [key for key, words in words_by_key.items() if tokens.intersection(words)]
+
+
+def parse_window(question):
+    """
+    Finds the window of a question such as "over the last 2 weeks" or "this month".
+
+    Args:
+        question (str): The question.
+
+    Returns:
+        int: The window in days, or None if the question has no window.
+    """
+    match = WINDOW_PATTERN.search(question)
+    if match is None:
+        return None
+    return int(match[1] or 1) * WINDOW_DAYS[match[2].lower()]
+
+
+def describe_window(window):
+    """
+    Describes the window of an answer.
+
+    Args:
+        window (int): The window in days, or None for the whole selected range.
+
+    Returns:
+        str: e.g. ' over the last 7 days', or '' without window.
+    """
+    return f" over the last {window} days" if window else ''
+
+
+def get_router_stats():
+    """
+    Returns how many chat questions the query routers of this process answered without the LLM.
+
+    Returns:
+        dict: The 'questions', 'hits' and 'hit_rate' counts, and the 'intents' hit counts.
+    """
+    questions = _router_stats['questions']
+    hits = sum(count for key, count in _router_stats.items() if key != 'questions')
+    return {
+        'questions': questions,
+        'hits': hits,
+        'hit_rate': hits / questions if questions else 0.0,
+        'intents': {key: count for key, count in _router_stats.items() if key != 'questions'},
+    }
+
+
+class QueryRouter:
+    """
+    Answers the common analytics questions of the chat directly from the dashboard DataFrames.
+
+    A question is matched to an intent (most cited person, place or organisation, current emotion,
+    emotion trend, average emotion, happiest day...) with regular expressions and word lists, and is
+    only routed when all of its words are understood. The answer is computed with the vectorised
+    functions of src.nlp and src.trends, without writing pandas code with the LLM. Every other
+    question returns None and goes to the agent.
+    """
+
+    def __init__(self, emotions_df, ner_df):
+        self.emotions_df = emotions_df
+        self.ner_df = ner_df
+        # Precomputed once for every question of the date range
+        self._days = emotions_df['record_dt'].dt.strftime('%Y-%m-%d').to_numpy(dtype=str)
+        self._day_numbers = emotions_df['record_dt'].to_numpy().astype('datetime64[D]')
+        self._types = emotions_df['type'].astype(str).to_numpy()
+        self._scores = emotions_df[[emotion.lower() for emotion in EMOTIONS]].to_numpy(dtype=np.float64)
+        self._trend_engine = None
+
+    def route(self, question):
+        """
+        Answers a chat question locally when it matches a known intent.
+
+        Args:
+            question (str): The chat message.
+
+        Returns:
+            str: The answer, or None if the question has to go to the agent.
+        """
+        _router_stats['questions'] += 1
+        if self.emotions_df.empty:
+            return None
+
+        date_patterns, rest = parse_query_dates(question)
+        tokens = {token.lower() for token in TOKEN_PATTERN.findall(rest)}
+        if tokens & ROUTER_BLOCKERS or any(not token.isdigit() and token not in ROUTER_KNOWN_WORDS for token in tokens):
+            return None
+
+        emotions = find_words(tokens, EMOTION_WORDS)
+        types = find_words(tokens, TYPE_WORDS) or ['day']
+        window = parse_window(rest)
+        for intent, pattern in INTENT_PATTERNS.items():
+            if not pattern.search(rest):
+                continue
+            answer = getattr(self, f'_answer_{intent}')(rest, tokens, emotions, types, date_patterns, window)
+            if answer is not None:
+                _router_stats[intent] += 1
+                return answer
+        return None
+
+    def _select(self, types, date_patterns, window=None):
+        mask = np.isin(self._types, types)
+        if window:
+            # The window ends on the latest entry of the selected dates, like the trends
+            mask &= self._day_numbers > self._day_numbers.max() - np.timedelta64(window, 'D')
+        if date_patterns:
+            dates = np.zeros(len(mask), dtype=bool)
+            for pattern in date_patterns:
+                dates |= np.char.endswith(self._days, pattern[1:]) if pattern.startswith('%') else self._days == pattern
+            mask &= dates
+        return mask
+
+    def _answer_emotion_trend(self, question, tokens, emotions, types, date_patterns, window):
+        if date_patterns or types != ['day']:
+            return None
+        if self._trend_engine is None:
+            self._trend_engine = TrendEngine.from_emotions_df(self.emotions_df, types=['day'])
+        trends = self._trend_engine.describe(window) if self._trend_engine else {}
+        return '\n'.join(trends.get(emotion, describe_trend(emotion, 0.0)) for emotion in emotions or EMOTION_NAMES)
+
+    def _answer_extreme_day(self, question, tokens, emotions, types, date_patterns, window):
+        if len(emotions) != 1 or len(types) != 1:
+            return None
+        mask = self._select(types, date_patterns, window)
+        if not mask.any():
+            return None
+        column = [emotion.lower() for emotion in EMOTIONS].index(emotions[0])
+        scores = np.where(mask, self._scores[:, column], -np.inf)
+        best = scores.max()
+        days = sorted(set(self._days[scores == best]), reverse=True)
+        section = '' if types == ['day'] else f' about {types[0]}'
+        return (
+            f"You wrote with the most {EMOTION_NAMES[emotions[0]]}{section}{describe_window(window)} on "
+            f"{', '.join(days[:5])} (score {best:.2f})."
+        )
+
+    def _answer_average_emotion(self, question, tokens, emotions, types, date_patterns, window):
+        mask = self._select(types, date_patterns, window)
+        if not mask.any():
+            return None
+        means = self._scores[mask].mean(axis=0)
+        section = 'your days' if types == ['day'] else ', '.join(types)
+        sentences = [
+            f"Your average {EMOTION_NAMES[emotion.lower()]} score for {section}{describe_window(window)} is {mean:.2f}"
+            for emotion, mean in zip(EMOTIONS, means) if not emotions or emotion.lower() in emotions
+        ]
+        return '. '.join(sentences) + f" (over {int(mask.sum())} entries)."
+
+    def _answer_most_cited(self, question, tokens, emotions, types, date_patterns, window):
+        labels = find_words(tokens, LABEL_WORDS)
+        if not labels and tokens & {'emotion', 'emotions', 'mood', 'feeling', 'feelings'}:
+            return self._answer_most_common_emotion(types, date_patterns, window)
+        # The entity counts cover the whole selected range, they can't answer about a part of it
+        if len(labels) != 1 or emotions or date_patterns or window or types != ['day'] or self.ner_df.empty:
+            return None
+        label = labels[0]
+        if label not in self.ner_df or self.ner_df[label].max() <= 0:
+            return None
+        if label == 'person':
+            names = get_most_cited_person(self.ner_df)
+        else:
+            names = ','.join(self.ner_df.loc[self.ner_df[label] == self.ner_df[label].max(), 'text'])
+        return f"The most frequent {'/'.join(LABEL_WORDS[label][:2])} in your diary: {names} ({int(self.ner_df[label].max())} mentions)."
+
+    def _answer_current_emotion(self, question, tokens, emotions, types, date_patterns, window):
+        # e.g. "what is my most common emotion?" is about every day, not the latest one
+        if emotions or types != ['day'] or window or INTENT_PATTERNS['most_cited'].search(question):
+            return None
+        if not date_patterns:
+            last_date = self.emotions_df['record_dt'].max().strftime('%Y-%m-%d')
+            return f"Your main emotion on {last_date}, your latest entry, is {get_current_emotion(self.emotions_df)}."
+        mask = self._select(['day'], date_patterns)
+        if not mask.any():
+            return None
+        day = np.sort(self._days[mask])[-1]
+        main_emotion = self.emotions_df.loc[mask & (self._days == day), 'main_emotion'].iloc[0]
+        return f"Your main emotion on {day} was {main_emotion}."
+
+    def _answer_most_common_emotion(self, types, date_patterns, window):
+        mask = self._select(types, date_patterns, window)
+        if not mask.any():
+            return None
+        counts = self.emotions_df.loc[mask, 'main_emotion'].value_counts()
+        section = 'your days' if types == ['day'] else ', '.join(types)
+        return (
+            f"{counts.index[0]} is the most common main emotion of {section}{describe_window(window)} "
+            f"({counts.iloc[0]} of {int(mask.sum())} entries)."
+        )
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import re
+from typing import Any
+from llama_index.core.query_engine import CustomQueryEngine
+from src.sqlite_cache import SQLiteLRUCache
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+RESPONSE_CACHE_PATH = os.path.join(base_dir, 'data', 'cache', 'responses.db').replace('\\', '/')
+RESPONSE_CACHE_SIZE = int(os.getenv("LLM_DIARY_RESPONSE_CACHE_SIZE", "1000"))
+
+
+def normalize_question(question):
+    """
+    Normalises a chat question so that trivially different phrasings share a cache entry.
+
+    Args:
+        question (str): The question, e.g. "  Who do I mention most?? ".
+
+    Returns:
+        str: The lowercase question with collapsed whitespace and no trailing punctuation.
+    """
+    return re.sub(r'\s+', ' ', question).strip().lower().rstrip('?!. ')
+
+
+class ResponseCache(SQLiteLRUCache):
+    """
+    Persistent LRU cache of the chat answers and of the agent tool results.
+
+    Entries are keyed by their kind ('answer' or 'tool:<name>'), the query and a scope made of the
+    diary data version, the selected date range and, for answers, the conversation before the
+    question. Saving an entry bumps the data version, so answers about data that changed are never
+    reused. The cache holds at most max_entries responses; the least recently used are evicted
+    first.
+    """
+
+    table = 'response_cache'
+    key_columns = ('key_hash',)
+    value_columns = ('kind', 'response')
+
+    def __init__(self, db_path=None, max_entries=None):
+        super().__init__(db_path or RESPONSE_CACHE_PATH, max_entries or RESPONSE_CACHE_SIZE)
+
+    @staticmethod
+    def key_hash(kind, scope, query):
+        key = json.dumps([kind, scope, normalize_question(query)], sort_keys=True, default=str)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, kind, scope, query):
+        """
+        Returns a cached response, marking it as recently used.
+
+        Args:
+            kind (str): 'answer' for chat answers or 'tool:<name>' for tool results.
+            scope (dict): The data version and date range the response depends on.
+            query (str): The question or the tool input.
+
+        Returns:
+            str: The cached response, or None if it is not cached.
+        """
+        row = self.get_row((self.key_hash(kind, scope, query),))
+        return row[1] if row is not None else None
+
+    def put(self, kind, scope, query, response):
+        """
+        Stores a response and evicts the least recently used entries above max_entries.
+
+        Args:
+            kind (str): 'answer' for chat answers or 'tool:<name>' for tool results.
+            scope (dict): The data version and date range the response depends on.
+            query (str): The question or the tool input.
+            response (str): The response to cache.
+
+        Returns:
+            None
+        """
+        self.put_row((self.key_hash(kind, scope, query),), (kind, response))
+
+    def get_or_compute(self, kind, scope, query, compute):
+        """
+        Returns a cached response, computing and storing it on a miss.
+
+        Args:
+            kind (str): 'answer' for chat answers or 'tool:<name>' for tool results.
+            scope (dict): The data version and date range the response depends on.
+            query (str): The question or the tool input.
+            compute (callable): The function that computes the response on a miss.
+
+        Returns:
+            str: The response.
+        """
+        response = self.get(kind, scope, query)
+        if response is None:
+            response = str(compute())
+            self.put(kind, scope, query, response)
+        return response
+
+
+class CachedQueryEngine(CustomQueryEngine):
+    """
+    Wraps the query engine of an agent tool so that the same tool input, for the same data version
+    and date range, is answered from the response cache instead of calling the LLM again.
+    """
+
+    query_engine: Any
+    tool_name: str
+    scope: dict
+    cache: Any
+
+    def custom_query(self, query_str: str) -> str:
+        return self.cache.get_or_compute(
+            f'tool:{self.tool_name}', self.scope, query_str, lambda: self.query_engine.query(query_str)
+        )
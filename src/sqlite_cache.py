@@ -0,0 +1,82 @@
+from contextlib import closing
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteLRUCache:
+    """
+    Base of the persistent LRU caches: one SQLite table holding the key columns, the value columns
+    and the last use time of every entry.
+
+    Reading an entry marks it as recently used, and every write evicts the least recently used
+    entries above max_entries. Subclasses set the table and its columns and build their keys and
+    values on top of get_row and put_row.
+    """
+
+    table = None
+    key_columns = ()
+    value_columns = ()
+
+    def __init__(self, db_path, max_entries):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._key_condition = ' AND '.join(f'{column} = ?' for column in self.key_columns)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            column_defs = ', '.join(f'{column} TEXT NOT NULL' for column in self.key_columns + self.value_columns)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    {column_defs},
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY ({', '.join(self.key_columns)})
+                )
+            ''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used ON {self.table} (last_used)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def get_row(self, key):
+        """
+        Returns the values of an entry, marking it as recently used.
+
+        Args:
+            key (tuple): The values of the key columns.
+
+        Returns:
+            tuple: The values of the value columns, or None if the entry is not cached.
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                f"SELECT {', '.join(self.value_columns)} FROM {self.table} WHERE {self._key_condition}", key
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(f'UPDATE {self.table} SET last_used = ? WHERE {self._key_condition}', (time.time(), *key))
+        return row
+
+    def put_row(self, key, values):
+        """
+        Stores an entry and evicts the least recently used entries above max_entries.
+
+        Args:
+            key (tuple): The values of the key columns.
+            values (tuple): The values of the value columns.
+
+        Returns:
+            None
+        """
+        placeholders = ', '.join('?' * (len(self.key_columns) + len(self.value_columns) + 1))
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} VALUES ({placeholders})', (*key, *values, time.time()))
+            conn.execute(
+                f'''DELETE FROM {self.table} WHERE rowid IN (
+                        SELECT rowid FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )''',
+                (self.max_entries,)
+            )
@@ -0,0 +1,530 @@
+from contextlib import closing
+import argparse
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+
+base_dir = os.path.dirname(__file__)[:-4]
+
+# Backend used by get_storage, overridable without touching the code
+STORAGE_BACKEND = os.getenv("LLM_DIARY_STORAGE", "sqlite")
+
+# Legacy CSV location of each table as (folder, filename)
+CSV_TABLES = {
+    'emotions': ('stats', 'emotions_df'),
+    'text': ('text', 'text'),
+}
+
+# Columns every table starts with; other columns (NER labels) are added as they show up
+TABLE_COLUMNS = {
+    'emotions': {
+        'record_dt': 'TEXT NOT NULL',
+        'type': 'TEXT NOT NULL',
+        'happy': 'REAL',
+        'angry': 'REAL',
+        'surprise': 'REAL',
+        'sad': 'REAL',
+        'fear': 'REAL',
+        'main_emotion': 'TEXT',
+    },
+    'text': {
+        'record_dt': 'TEXT NOT NULL',
+        'highlights_txt': 'TEXT',
+        'work_txt': 'TEXT',
+        'family_txt': 'TEXT',
+        'friends_txt': 'TEXT',
+        'combined_txt': 'TEXT',
+    },
+}
+
+# Compact dtypes applied when the tables are loaded for analysis
+EMOTION_SCORE_COLUMNS = ['happy', 'angry', 'surprise', 'sad', 'fear']
+CATEGORICAL_COLUMNS = {
+    'emotions': ['type', 'main_emotion'],
+    'text': [],
+}
+CSV_CHUNK_SIZE = 10000
+
+# Databases already checked for a first-use migration by this process
+_checked_databases = set()
+
+
+class CsvStorage:
+    """
+    Stores each table in its legacy CSV file under data/<folder>/<filename>.csv.
+
+    New rows are appended to the end of the file. The file is only rewritten, atomically, when the
+    new rows bring columns the file does not have yet.
+    """
+
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir or os.path.join(base_dir, 'data').replace('\\', '/')
+
+    def get_path(self, table):
+        folder, filename = CSV_TABLES[table]
+        return os.path.join(self.data_dir, folder, f'{filename}.csv').replace('\\', '/')
+
+    def append(self, table, df):
+        """
+        Appends rows to a table.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            df (pd.DataFrame): The rows to be appended.
+
+        Returns:
+            None
+        """
+        path = self.get_path(table)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            self._write_atomic(df, path)
+            return
+
+        columns = pd.read_csv(path, nrows=0).columns.to_list()
+        if set(df.columns) <= set(columns):
+            df.reindex(columns=columns).to_csv(path, mode='a', header=False, index=False)
+        else:
+            stored_df = pd.read_csv(path)
+            self._write_atomic(pd.concat([stored_df, df]), path)
+
+    def load(self, table, begin_dt=None, end_dt=None):
+        """
+        Loads the rows of a table, optionally limited to a date range.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            begin_dt (str, optional): The first date of the range, formatted as '%Y-%m-%d'.
+            end_dt (str, optional): The last date of the range, formatted as '%Y-%m-%d'.
+
+        Returns:
+            pd.DataFrame: The rows of the table in chronological order, with the stored columns and no
+            rows if the file is missing or only has its header.
+        """
+        path = self.get_path(table)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=list(TABLE_COLUMNS[table]))
+
+        # Filter chunk by chunk so that only the rows of the range are kept in memory
+        chunks = []
+        for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_SIZE):
+            if begin_dt is not None:
+                chunk = chunk[chunk['record_dt'] >= begin_dt]
+            if end_dt is not None:
+                chunk = chunk[chunk['record_dt'] <= end_dt]
+            chunks.append(chunk)
+        if not chunks:
+            return pd.DataFrame(columns=pd.read_csv(path, nrows=0).columns)
+        df = pd.concat(chunks)
+        return df.sort_values('record_dt', kind='stable').reset_index(drop=True)
+
+    def iter_chunks(self, table, chunk_size=CSV_CHUNK_SIZE):
+        """
+        Reads a table chunk by chunk, in file order, without loading it all in memory.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            chunk_size (int, optional): The number of rows per chunk. Defaults to CSV_CHUNK_SIZE.
+
+        Returns:
+            iterator of pd.DataFrame: The chunks of the table.
+        """
+        yield from pd.read_csv(self.get_path(table), chunksize=chunk_size)
+
+    def replace(self, table, dfs, columns):
+        """
+        Replaces all the rows of a table atomically. The new file is written next to the old one
+        and swapped in only once it is complete.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            dfs (iterable of pd.DataFrame): The new rows, chunk by chunk.
+            columns (list of str): The columns of the new table.
+
+        Returns:
+            None
+        """
+        path = self.get_path(table)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        pd.DataFrame(columns=columns).to_csv(tmp_path, index=False)
+        for df in dfs:
+            df.reindex(columns=columns).to_csv(tmp_path, mode='a', header=False, index=False)
+        os.replace(tmp_path, path)
+
+    def get_date_bounds(self, table):
+        """
+        Returns the first and last record dates of a table.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+
+        Returns:
+            tuple: The (min, max) record dates as '%Y-%m-%d' strings, (None, None) if the table is empty.
+        """
+        if not os.path.exists(self.get_path(table)):
+            return None, None
+        record_dt = pd.read_csv(self.get_path(table), usecols=['record_dt'])['record_dt']
+        return record_dt.min(), record_dt.max()
+
+    def get_data_version(self):
+        """
+        Returns a version of the stored data that changes whenever a table file is written.
+
+        Returns:
+            str: The modification time and size of every table file.
+        """
+        version = []
+        for table in CSV_TABLES:
+            path = self.get_path(table)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                version.append(f'{table}:{stat.st_mtime_ns}:{stat.st_size}')
+        return '|'.join(version)
+
+    def count(self, table):
+        """
+        Returns the number of rows of a table.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+
+        Returns:
+            int: The number of rows, 0 if the file does not exist.
+        """
+        path = self.get_path(table)
+        if not os.path.exists(path):
+            return 0
+        return sum(len(chunk) for chunk in pd.read_csv(path, usecols=['record_dt'], chunksize=CSV_CHUNK_SIZE))
+
+    def _write_atomic(self, df, path):
+        tmp_path = f'{path}.tmp'
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+class SQLiteStorage:
+    """
+    Stores the tables in a single SQLite database with indexes on record_dt and type.
+
+    Each append is one transaction, so concurrent saves cannot overwrite each other and a failed
+    save leaves the database unchanged. Reads filter by date in SQL and only touch the rows of the
+    requested range.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(base_dir, 'data', 'diary.db').replace('\\', '/')
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            for table, columns in TABLE_COLUMNS.items():
+                column_defs = ', '.join(f'{name} {sql_type}' for name, sql_type in columns.items())
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({column_defs})')
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_record_dt ON {table} (record_dt)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_emotions_type ON emotions (type, record_dt)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def append(self, table, df):
+        """
+        Appends rows to a table in a single transaction.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            df (pd.DataFrame): The rows to be appended. List values (most frequent entities) are
+                stored as text, the same way they are written to CSV.
+
+        Returns:
+            None
+        """
+        with closing(self._connect()) as conn, conn:
+            self._insert(conn, table, df)
+            self._bump_data_version(conn)
+
+    def get_data_version(self):
+        """
+        Returns a version of the stored data, bumped by every append and replace.
+
+        Returns:
+            int: The data version, 0 before the first write.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+        return row[0] if row else 0
+
+    def _bump_data_version(self, conn):
+        conn.execute('''
+            INSERT INTO meta VALUES ('data_version', 1)
+            ON CONFLICT (key) DO UPDATE SET value = value + 1
+        ''')
+
+    def _insert(self, conn, table, df):
+        df = df.map(lambda value: str(value) if isinstance(value, list) else value)
+        df = df.astype(object).where(df.notna(), None)
+        columns = df.columns.to_list()
+
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for column in columns:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}" TEXT')
+
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(
+            f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})',
+            (
+                tuple(value.item() if isinstance(value, np.generic) else value for value in row)
+                for row in df.itertuples(index=False, name=None)
+            )
+        )
+
+    def iter_chunks(self, table, chunk_size=CSV_CHUNK_SIZE):
+        """
+        Reads a table chunk by chunk, in insertion order, without loading it all in memory.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            chunk_size (int, optional): The number of rows per chunk. Defaults to CSV_CHUNK_SIZE.
+
+        Returns:
+            iterator of pd.DataFrame: The chunks of the table.
+        """
+        with closing(self._connect()) as conn:
+            yield from pd.read_sql_query(f'SELECT * FROM {table} ORDER BY rowid', conn, chunksize=chunk_size)
+
+    def replace(self, table, dfs, columns=None):
+        """
+        Replaces all the rows of a table in a single transaction, so readers see either the old rows
+        or the new ones.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            dfs (iterable of pd.DataFrame): The new rows, chunk by chunk.
+            columns (list of str, optional): Unused; new columns are added as they show up.
+
+        Returns:
+            None
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f'DELETE FROM {table}')
+            for df in dfs:
+                self._insert(conn, table, df)
+            self._bump_data_version(conn)
+
+    def load(self, table, begin_dt=None, end_dt=None):
+        """
+        Loads the rows of a table, optionally limited to a date range.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+            begin_dt (str, optional): The first date of the range, formatted as '%Y-%m-%d'.
+            end_dt (str, optional): The last date of the range, formatted as '%Y-%m-%d'.
+
+        Returns:
+            pd.DataFrame: The rows of the table in chronological order.
+        """
+        query = f'SELECT * FROM {table} WHERE record_dt >= ? AND record_dt <= ? ORDER BY record_dt, rowid'
+        params = (begin_dt or '0000-00-00', end_dt or '9999-99-99')
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def get_date_bounds(self, table):
+        """
+        Returns the first and last record dates of a table.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+
+        Returns:
+            tuple: The (min, max) record dates as '%Y-%m-%d' strings, (None, None) if the table is empty.
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute(f'SELECT MIN(record_dt), MAX(record_dt) FROM {table}').fetchone()
+
+    def count(self, table):
+        """
+        Returns the number of rows of a table.
+
+        Args:
+            table (str): The table name ('emotions' or 'text').
+
+        Returns:
+            int: The number of rows.
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+STORAGE_BACKENDS = {
+    'csv': CsvStorage,
+    'sqlite': SQLiteStorage,
+}
+
+
+def get_storage(backend=None):
+    """
+    Returns the storage backend used to save and load the diary tables.
+
+    The first time an empty SQLite database is used, the legacy CSV files found under data/ are
+    migrated into it, so that switching to the SQLite backend never hides an existing diary.
+
+    Args:
+        backend (str, optional): The backend name ('sqlite' or 'csv'). Defaults to STORAGE_BACKEND.
+
+    Returns:
+        CsvStorage or SQLiteStorage: The storage backend.
+    """
+    storage = STORAGE_BACKENDS[backend or STORAGE_BACKEND]()
+    if isinstance(storage, SQLiteStorage) and storage.db_path not in _checked_databases:
+        _checked_databases.add(storage.db_path)
+        csv_storage = CsvStorage()
+        if any(os.path.exists(csv_storage.get_path(table)) for table in CSV_TABLES) and not any(
+            storage.count(table) for table in CSV_TABLES
+        ):
+            print(f"Empty database '{storage.db_path}', migrating the CSV files of '{csv_storage.data_dir}'")
+            migrate_csv_to_sqlite(csv_storage, storage)
+    return storage
+
+
+def format_date(value):
+    """
+    Formats a date as the '%Y-%m-%d' string used as record_dt in storage.
+
+    Args:
+        value (str, datetime.date or pd.Timestamp): The date to format. Strings are returned unchanged.
+
+    Returns:
+        str: The formatted date, or None if value is None.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime("%Y-%m-%d")
+
+
+def apply_dtypes(df, table):
+    """
+    Converts a loaded table to compact dtypes: record_dt as datetime64, emotion scores as float32
+    and the low-cardinality text columns as categoricals.
+
+    Args:
+        df (pd.DataFrame): The rows loaded from storage.
+        table (str): The table name ('emotions' or 'text').
+
+    Returns:
+        pd.DataFrame: The DataFrame with the converted dtypes.
+    """
+    df['record_dt'] = pd.to_datetime(df['record_dt'], format='%Y-%m-%d')
+    if table == 'emotions':
+        df[EMOTION_SCORE_COLUMNS] = df[EMOTION_SCORE_COLUMNS].astype('float32')
+    for column in CATEGORICAL_COLUMNS[table]:
+        df[column] = df[column].astype('category')
+    return df
+
+
+def load_emotions(begin_dt=None, end_dt=None, storage=None):
+    """
+    Loads the emotion rows of a date range with compact dtypes.
+
+    The date filter runs in the storage backend, so only the rows of the range are read.
+
+    Args:
+        begin_dt (str or datetime.date, optional): The first date of the range.
+        end_dt (str or datetime.date, optional): The last date of the range.
+        storage (CsvStorage or SQLiteStorage, optional): The storage backend. Defaults to get_storage().
+
+    Returns:
+        pd.DataFrame: The emotion rows in chronological order.
+    """
+    storage = storage or get_storage()
+    df = storage.load('emotions', format_date(begin_dt), format_date(end_dt))
+    return apply_dtypes(df, 'emotions')
+
+
+def load_text(begin_dt=None, end_dt=None, storage=None):
+    """
+    Loads the diary text rows of a date range, with record_dt parsed as datetime64.
+
+    Args:
+        begin_dt (str or datetime.date, optional): The first date of the range.
+        end_dt (str or datetime.date, optional): The last date of the range.
+        storage (CsvStorage or SQLiteStorage, optional): The storage backend. Defaults to get_storage().
+
+    Returns:
+        pd.DataFrame: The text rows in chronological order.
+    """
+    storage = storage or get_storage()
+    df = storage.load('text', format_date(begin_dt), format_date(end_dt))
+    return apply_dtypes(df, 'text')
+
+
+def iter_range_chunks(table, begin_dt=None, end_dt=None, chunk_size=CSV_CHUNK_SIZE, storage=None):
+    """
+    Reads the rows of a date range chunk by chunk, in storage order, without loading the range in memory.
+
+    Args:
+        table (str): The table name ('emotions' or 'text').
+        begin_dt (str or datetime.date, optional): The first date of the range.
+        end_dt (str or datetime.date, optional): The last date of the range.
+        chunk_size (int, optional): The number of rows read per chunk. Defaults to CSV_CHUNK_SIZE.
+        storage (CsvStorage or SQLiteStorage, optional): The storage backend. Defaults to get_storage().
+
+    Returns:
+        iterator of pd.DataFrame: The non-empty chunks of rows of the range.
+    """
+    storage = storage or get_storage()
+    begin_dt, end_dt = format_date(begin_dt), format_date(end_dt)
+    for chunk in storage.iter_chunks(table, chunk_size):
+        if begin_dt is not None:
+            chunk = chunk[chunk['record_dt'] >= begin_dt]
+        if end_dt is not None:
+            chunk = chunk[chunk['record_dt'] <= end_dt]
+        if len(chunk):
+            yield chunk
+
+
+def migrate_csv_to_sqlite(csv_storage=None, sqlite_storage=None):
+    """
+    Copies the legacy CSV tables into the SQLite database. Tables that already have rows in SQLite
+    are skipped, so running the migration twice does not duplicate data.
+
+    Args:
+        csv_storage (CsvStorage, optional): The source storage. Defaults to the CSV files under data/.
+        sqlite_storage (SQLiteStorage, optional): The target storage. Defaults to data/diary.db.
+
+    Returns:
+        dict: The number of rows migrated per table.
+    """
+    csv_storage = csv_storage or CsvStorage()
+    sqlite_storage = sqlite_storage or SQLiteStorage()
+    migrated = {}
+    for table in CSV_TABLES:
+        if not os.path.exists(csv_storage.get_path(table)):
+            print(f"No CSV file found for '{table}', skipping.")
+            continue
+        df = csv_storage.load(table)
+        # Checked and written in one write transaction, so that two processes migrating at the same
+        # time cannot both copy the rows
+        with closing(sqlite_storage._connect()) as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:
+                print(f"Table '{table}' already has rows in '{sqlite_storage.db_path}', skipping.")
+                continue
+            sqlite_storage._insert(conn, table, df)
+            sqlite_storage._bump_data_version(conn)
+        migrated[table] = len(df)
+        print(f"Migrated {len(df)} rows of '{table}' to '{sqlite_storage.db_path}'")
+    return migrated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the diary storage.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('migrate', help='Copy the legacy CSV files into the SQLite database.')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate_csv_to_sqlite()
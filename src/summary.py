@@ -0,0 +1,123 @@
+import os
+import streamlit as st
+from src.analysis_store import AnalysisStore
+from src.fulltext import FullTextIndex
+from src.nlp import (
+    NER_CATEGORIES, get_current_emotion, get_most_cited_person, get_sentences_from_emotions
+)
+from src.plots import build_emotion_figure
+from src.storage import get_storage, load_emotions, load_text
+from src.trends import EMOTION_NAMES, TrendEngine, describe_trend
+
+# Number of (date range, data version) combinations kept by each cached function
+DASHBOARD_CACHE_ENTRIES = int(os.getenv("LLM_DIARY_DASHBOARD_CACHE_ENTRIES", "16"))
+
+# The dashboard artefacts below are cached by Streamlit per (begin_dt, end_dt, data_version). The
+# storage bumps the data version on every write, so saving an entry invalidates them, while chat
+# messages, tab switches and other reruns of the page reuse them without touching NLP.
+
+
+def get_data_version():
+    """
+    Returns the version of the stored diary data, used as part of every dashboard cache key.
+
+    Returns:
+        int or str: The data version of the configured storage backend.
+    """
+    return get_storage().get_data_version()
+
+
+@st.cache_data(show_spinner=False, max_entries=DASHBOARD_CACHE_ENTRIES)
+def get_date_bounds(data_version):
+    """
+    Returns the first and last dates of the diary.
+
+    Args:
+        data_version (int or str): The data version, only used as cache key.
+
+    Returns:
+        tuple: The (min, max) record dates as '%Y-%m-%d' strings.
+    """
+    return get_storage().get_date_bounds('emotions')
+
+
+@st.cache_data(show_spinner=False, max_entries=DASHBOARD_CACHE_ENTRIES)
+def get_dashboard_data(begin_dt, end_dt, data_version):
+    """
+    Loads the rows of a date range and the named entity counts of every category.
+
+    Args:
+        begin_dt (str): The first date of the range, formatted as '%Y-%m-%d'.
+        end_dt (str): The last date of the range, formatted as '%Y-%m-%d'.
+        data_version (int or str): The data version, only used as cache key.
+
+    Returns:
+        dict: The 'emotions_df', the 'ner' DataFrames by category (plus 'combined') and the
+        'word_frequencies' of the word cloud.
+    """
+    storage = get_storage()
+    emotions_df = load_emotions(begin_dt, end_dt, storage=storage)
+    text_df = load_text(begin_dt, end_dt, storage=storage)
+
+    # Only entries that were never analysed before go through spaCy and the word counter
+    analysis_store = AnalysisStore()
+    analysis_store.index_text_df(text_df)
+    FullTextIndex().index_text_df(text_df)
+    return {
+        'emotions_df': emotions_df,
+        'ner': analysis_store.get_ner_by_category(begin_dt, end_dt),
+        'word_frequencies': analysis_store.get_word_frequencies(begin_dt, end_dt),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=DASHBOARD_CACHE_ENTRIES)
+def get_dashboard_summary(begin_dt, end_dt, data_version):
+    """
+    Computes the summary of a date range: latest date, dominant emotion, emotion sentences, trends
+    and most cited person.
+
+    Args:
+        begin_dt (str): The first date of the range, formatted as '%Y-%m-%d'.
+        end_dt (str): The last date of the range, formatted as '%Y-%m-%d'.
+        data_version (int or str): The data version, only used as cache key.
+
+    Returns:
+        dict: The summary values used by the dashboard, or None if the range has no entries.
+    """
+    data = get_dashboard_data(begin_dt, end_dt, data_version)
+    emotions_df = data['emotions_df']
+    if emotions_df.empty:
+        return None
+    # One vectorised pass gives the slopes of every emotion, over the whole range and each window
+    trend_engine = TrendEngine.from_emotions_df(emotions_df)
+    if trend_engine is None:
+        # No rows of the trend types: every emotion is flat, and there are no windows to describe
+        trends, window_trends = {emotion: describe_trend(emotion, 0.0) for emotion in EMOTION_NAMES}, {}
+    else:
+        trends, window_trends = trend_engine.describe(), trend_engine.describe_windows()
+    return {
+        'latest_dt': emotions_df['record_dt'].max().strftime('%Y-%m-%d'),
+        'overall_emotion': get_current_emotion(emotions_df),
+        'emotions_sentences': get_sentences_from_emotions(emotions_df),
+        'trends': trends,
+        'window_trends': window_trends,
+        'names': get_most_cited_person(data['ner']['combined']),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=DASHBOARD_CACHE_ENTRIES)
+def get_emotion_figures(begin_dt, end_dt, data_version):
+    """
+    Builds the emotions over time figure of every category.
+
+    Args:
+        begin_dt (str): The first date of the range, formatted as '%Y-%m-%d'.
+        end_dt (str): The last date of the range, formatted as '%Y-%m-%d'.
+        data_version (int or str): The data version, only used as cache key.
+
+    Returns:
+        dict: A figure per category.
+    """
+    emotions_df = get_dashboard_data(begin_dt, end_dt, data_version)['emotions_df']
+    return {category: build_emotion_figure(emotions_df, category) for category in NER_CATEGORIES}
+
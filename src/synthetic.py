@@ -0,0 +1,187 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+from src.emotion_engines import EMOTIONS
+from src.nlp import EMOTION_RECORD_TYPES, NER_CATEGORIES, build_emotion_records
+
+# Last day of the generated diaries, fixed so that a seed always gives the same diary
+SYNTHETIC_END_DATE = date(2024, 12, 31)
+# Share of the days without an entry
+SYNTHETIC_SKIP_RATE = 0.1
+
+FIRST_NAMES = [
+    'Alice', 'Bob', 'Carla', 'David', 'Emma', 'Farid', 'Grace', 'Hugo', 'Ines', 'James', 'Keiko',
+    'Lucas', 'Maria', 'Noah', 'Olivia', 'Pedro', 'Quentin', 'Rosa', 'Samir', 'Tomas', 'Uma',
+    'Victor', 'Wen', 'Yara', 'Zoe',
+]
+FAMILY_NAMES = ['Mom', 'Dad', 'Grandma', 'Grandpa', 'my sister', 'my brother', 'Aunt Julia', 'Uncle Tom']
+PLACES = [
+    'Paris', 'Lisbon', 'Berlin', 'London', 'New York', 'Tokyo', 'Madrid', 'Rome', 'Amsterdam',
+    'Barcelona', 'Montreal', 'Sydney', 'the beach', 'the park', 'the mountains',
+]
+ORGANIZATIONS = ['Google', 'Acme Corp', 'the bank', 'the hospital', 'the university', 'Globex', 'Initech']
+ACTIVITIES = [
+    'went for a run', 'cooked dinner', 'watched a movie', 'read a book', 'played board games',
+    'went hiking', 'visited a museum', 'had coffee', 'went shopping', 'played football',
+]
+# Words of the text2emotion lexicon, so that the lexicon engine finds the mood of each section
+MOOD_WORDS = {
+    'Happy': ['happy', 'great', 'wonderful', 'glad', 'proud', 'relaxed', 'excited'],
+    'Angry': ['angry', 'annoyed', 'frustrated', 'furious', 'irritated'],
+    'Surprise': ['surprised', 'amazed', 'shocked', 'astonished', 'unexpected'],
+    'Sad': ['sad', 'lonely', 'disappointed', 'tired', 'upset'],
+    'Fear': ['afraid', 'worried', 'nervous', 'anxious', 'scared'],
+}
+SECTION_TEMPLATES = {
+    'highlights': [
+        'The best part of the day was when I {activity} with {person} in {place}. I felt {mood}.',
+        'I {activity} and met {person} by chance. It was {mood} and a bit {mood2}.',
+        'We {activity} in {place}; {person} told me about the trip and I was {mood}.',
+    ],
+    'work': [
+        'At {org} the meeting with {person} ran late and I felt {mood}.',
+        'I finished the report for {org}. {person} reviewed it and I was {mood}.',
+        'A busy day at {org}, the deadline moved again, {mood} and {mood2} all afternoon.',
+    ],
+    'family': [
+        '{family} called in the evening, I was {mood} to hear the news.',
+        'Dinner with {family}, we {activity} afterwards and everyone was {mood}.',
+        '{family} visited from {place}. I felt {mood}.',
+    ],
+    'friends': [
+        'I {activity} with {person} and {person2}, it was {mood}.',
+        '{person} invited me to {place}, I was {mood} but also {mood2}.',
+        'Long chat with {person} about {org}, I felt {mood}.',
+    ],
+}
+
+
+def generate_dates(n_entries, rng, end_date=None):
+    """
+    Draws the dates of a synthetic diary: one entry per day, with some days skipped.
+
+    Args:
+        n_entries (int): The number of entries.
+        rng (np.random.Generator): The random generator.
+        end_date (datetime.date, optional): The date of the last entry. Defaults to SYNTHETIC_END_DATE.
+
+    Returns:
+        np.ndarray: The n_entries dates as datetime64[D], oldest first.
+    """
+    end_date = np.datetime64(end_date or SYNTHETIC_END_DATE, 'D')
+    gaps = rng.geometric(1 - SYNTHETIC_SKIP_RATE, size=max(n_entries - 1, 0))
+    offsets = np.concatenate([[0], np.cumsum(gaps[::-1])])[::-1][:n_entries]
+    return end_date - offsets.astype('timedelta64[D]')
+
+
+def generate_moods(n_entries, rng):
+    """
+    Draws the mood of every section of every entry. The mood of the day drifts slowly, like a real
+    diary, and each section mostly follows it.
+
+    Args:
+        n_entries (int): The number of entries.
+        rng (np.random.Generator): The random generator.
+
+    Returns:
+        np.ndarray: An array of shape (n_entries, len(NER_CATEGORIES)) with the index of each mood in EMOTIONS.
+    """
+    day_moods = np.empty(n_entries, dtype=np.int64)
+    mood = 0
+    changes = rng.random(n_entries) < 0.15
+    new_moods = rng.choice(len(EMOTIONS), size=n_entries, p=[0.4, 0.12, 0.13, 0.2, 0.15])
+    for i in range(n_entries):
+        if changes[i]:
+            mood = new_moods[i]
+        day_moods[i] = mood
+    section_moods = rng.choice(len(EMOTIONS), size=(n_entries, len(NER_CATEGORIES)))
+    follow = rng.random((n_entries, len(NER_CATEGORIES))) < 0.7
+    return np.where(follow, day_moods[:, None], section_moods)
+
+
+def generate_diary(n_entries, seed=0, end_date=None):
+    """
+    Generates a reproducible synthetic diary in the layout of the text table.
+
+    Args:
+        n_entries (int): The number of entries, e.g. 1000 to 100000.
+        seed (int, optional): The random seed. Defaults to 0.
+        end_date (datetime.date, optional): The date of the last entry. Defaults to SYNTHETIC_END_DATE.
+
+    Returns:
+        pd.DataFrame: One row per entry with 'record_dt', the '<category>_txt' columns and 'combined_txt'.
+    """
+    rng = np.random.default_rng(seed)
+    record_dts = np.datetime_as_string(generate_dates(n_entries, rng, end_date), unit='D')
+    moods = generate_moods(n_entries, rng)
+
+    # Vectorised draws of every placeholder, then one format() per section
+    shape = (n_entries, len(NER_CATEGORIES))
+    picks = {
+        'person': rng.choice(FIRST_NAMES, size=shape),
+        'person2': rng.choice(FIRST_NAMES, size=shape),
+        'family': rng.choice(FAMILY_NAMES, size=shape),
+        'place': rng.choice(PLACES, size=shape),
+        'org': rng.choice(ORGANIZATIONS, size=shape),
+        'activity': rng.choice(ACTIVITIES, size=shape),
+        'mood': moods,
+        'mood2': rng.choice(len(EMOTIONS), size=shape),
+        'word': rng.integers(0, 7, size=shape),
+        'template': rng.integers(0, 3, size=shape),
+        'blank': rng.random(shape) < 0.05,
+    }
+
+    columns = {'record_dt': record_dts}
+    for j, category in enumerate(NER_CATEGORIES):
+        templates = SECTION_TEMPLATES[category]
+        texts = []
+        for person, person2, family, place, org, activity, mood, mood2, word, template, blank in zip(
+            *(values[:, j].tolist() for values in picks.values())
+        ):
+            if blank:
+                texts.append('')
+                continue
+            mood_words, mood2_words = MOOD_WORDS[EMOTIONS[mood]], MOOD_WORDS[EMOTIONS[mood2]]
+            texts.append(templates[template].format(
+                person=person, person2=person2, family=family, place=place, org=org, activity=activity,
+                mood=mood_words[word % len(mood_words)], mood2=mood2_words[word % len(mood2_words)],
+            ))
+        columns[f'{category}_txt'] = texts
+
+    text_df = pd.DataFrame(columns)
+    text_df['combined_txt'] = [
+        "\n\n".join(sections) for sections in zip(*(columns[f'{category}_txt'] for category in NER_CATEGORIES))
+    ]
+    return text_df
+
+
+def generate_emotions(text_df, seed=0):
+    """
+    Generates emotion scores for a synthetic diary without running an emotion engine. The scores of
+    each section lean towards the emotion words it contains, and the day scores are their average.
+
+    Args:
+        text_df (pd.DataFrame): The synthetic diary, from generate_diary.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: The emotions rows, in the layout of build_emotion_records.
+    """
+    rng = np.random.default_rng(seed)
+    n_entries = len(text_df)
+    mood_columns = []
+    for category in NER_CATEGORIES:
+        texts = text_df[f'{category}_txt'].str.lower()
+        hits = np.column_stack([
+            texts.str.contains('|'.join(MOOD_WORDS[emotion]), regex=True).to_numpy() for emotion in EMOTIONS
+        ])
+        mood_columns.append(hits)
+    hits = np.stack(mood_columns, axis=1).astype(np.float64)
+
+    scores = rng.dirichlet(np.ones(len(EMOTIONS)), size=(n_entries, len(NER_CATEGORIES)))
+    scores = (scores + 4 * hits) / (1 + 4 * hits.sum(axis=-1, keepdims=True))
+    scores = np.concatenate([scores, scores.mean(axis=1, keepdims=True)], axis=1).round(2)
+
+    record_dts = np.repeat(text_df['record_dt'].to_numpy(), len(EMOTION_RECORD_TYPES))
+    types = np.tile(EMOTION_RECORD_TYPES, n_entries)
+    return build_emotion_records(record_dts, types, scores.reshape(-1, len(EMOTIONS)))
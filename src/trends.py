@@ -0,0 +1,210 @@
+import os
+import numpy as np
+import pandas as pd
+from src.emotion_engines import EMOTIONS
+from src.nlp import EMOTION_RECORD_TYPES
+
+# Windows, in days, the trends are computed over
+TREND_WINDOWS = [7, 30, 90]
+# Change of an emotion score over a window (scores are between 0 and 1) above which a trend is
+# reported as modest or strong
+TREND_MODEST_CHANGE = float(os.getenv("LLM_DIARY_TREND_MODEST_CHANGE", "0.1"))
+TREND_STRONG_CHANGE = float(os.getenv("LLM_DIARY_TREND_STRONG_CHANGE", "0.3"))
+
+EMOTION_NAMES = {
+    'happy': 'happiness',
+    'angry': 'anger',
+    'surprise': 'surprise',
+    'sad': 'sadness',
+    'fear': 'fear',
+}
+
+
+def daily_emotion_array(df, types=None):
+    """
+    Arranges the emotion scores on a daily calendar, averaging the entries saved on the same day.
+
+    Args:
+        df (pd.DataFrame): The emotions rows, with 'record_dt', 'type' and the five score columns.
+        types (list of str, optional): The row types to keep. Defaults to EMOTION_RECORD_TYPES.
+
+    Returns:
+        tuple: The first day as np.datetime64 and an array of shape (n_days, len(types), 5) with the
+        daily scores in EMOTIONS order, NaN on the days without entries.
+    """
+    types = list(types or EMOTION_RECORD_TYPES)
+    days = pd.to_datetime(df['record_dt']).to_numpy().astype('datetime64[D]')
+    type_ids = pd.Categorical(df['type'].astype(str), categories=types).codes
+    keep = type_ids >= 0
+    if not keep.any():
+        return None, np.empty((0, len(types), len(EMOTIONS)))
+
+    days, type_ids = days[keep], type_ids[keep]
+    scores = df[[emotion.lower() for emotion in EMOTIONS]].to_numpy(dtype=np.float64)[keep]
+    start = days.min()
+    day_ids = (days - start).astype(np.int64)
+
+    shape = (day_ids.max() + 1, len(types), len(EMOTIONS))
+    sums, counts = np.zeros(shape), np.zeros(shape[:2])
+    np.add.at(sums, (day_ids, type_ids), scores)
+    np.add.at(counts, (day_ids, type_ids), 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return start, sums / counts[..., None]
+
+
+class TrendEngine:
+    """
+    Least-squares slopes of the daily emotion scores over rolling windows, for every emotion and row
+    type at once.
+
+    The x axis is the actual date, in days, so gaps between entries are taken into account. The
+    engine keeps the cumulative sums of n, x, y, x*x and x*y along the calendar; the slope over any
+    window is then a difference of two rows of these sums. Asking for a trend costs the same for a
+    week of data or a decade, and a new day is added with update() in constant time.
+    """
+
+    def __init__(self, start_date, types=None):
+        self.start_date = np.datetime64(start_date, 'D')
+        self.types = list(types or EMOTION_RECORD_TYPES)
+        # One row of cumulative sums per day, after an initial row of zeros
+        self._sums = np.zeros((1, 5, len(self.types), len(EMOTIONS)))
+
+    @classmethod
+    def from_emotions_df(cls, df, types=None):
+        """
+        Builds the engine from emotions rows.
+
+        Args:
+            df (pd.DataFrame): The emotions rows, with 'record_dt', 'type' and the five score columns.
+            types (list of str, optional): The row types to keep. Defaults to EMOTION_RECORD_TYPES.
+
+        Returns:
+            TrendEngine: The engine, or None if df has no rows of these types.
+        """
+        start, daily = daily_emotion_array(df, types=types)
+        if start is None:
+            return None
+        engine = cls(start, types=types)
+        engine._append(daily)
+        return engine
+
+    @property
+    def n_days(self):
+        return len(self._sums) - 1
+
+    @property
+    def last_date(self):
+        return self.start_date + np.timedelta64(self.n_days - 1, 'D')
+
+    def _append(self, daily):
+        x = (self.n_days + np.arange(len(daily), dtype=np.float64))[:, None, None]
+        observed = ~np.isnan(daily)
+        y = np.where(observed, daily, 0.0)
+        n = observed.astype(np.float64)
+        terms = np.stack([n, n * x, y, n * x * x, y * x], axis=1)
+        self._sums = np.concatenate([self._sums, self._sums[-1] + np.cumsum(terms, axis=0)])
+
+    def update(self, df):
+        """
+        Adds the emotions rows of new days, after the last day of the engine.
+
+        Args:
+            df (pd.DataFrame): The emotions rows of the new days.
+
+        Returns:
+            None
+        """
+        start, daily = daily_emotion_array(df, types=self.types)
+        if start is None:
+            return
+        if start <= self.last_date:
+            raise ValueError(f"Rows dated {start} are not after {self.last_date}; rebuild the engine instead.")
+        gap = int((start - self.last_date).astype(np.int64)) - 1
+        self._append(np.concatenate([np.full((gap,) + daily.shape[1:], np.nan), daily]))
+
+    def rolling_slopes(self, window=None):
+        """
+        Computes the slopes over the window ending on every day.
+
+        Args:
+            window (int, optional): The window length in days. Defaults to the whole history.
+
+        Returns:
+            np.ndarray: An array of shape (n_days, n_types, 5) with the slopes in score per day, NaN
+            where the window has fewer than two days with entries.
+        """
+        window = window or self.n_days
+        end = self._sums[1:]
+        begin = self._sums[np.maximum(np.arange(1, self.n_days + 1) - window, 0)]
+        n, sx, sy, sxx, sxy = np.moveaxis(end - begin, 1, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slopes = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        return np.where(n >= 2, slopes, np.nan)
+
+    def slopes(self, window=None):
+        """
+        Computes the slopes over the window ending on the last day.
+
+        Args:
+            window (int, optional): The window length in days. Defaults to the whole history.
+
+        Returns:
+            pd.DataFrame: The slopes in score per day, with one row per type and one column per emotion.
+        """
+        window = min(window or self.n_days, self.n_days)
+        n, sx, sy, sxx, sxy = self._sums[-1] - self._sums[-1 - window]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slopes = np.where(n >= 2, (n * sxy - sx * sy) / (n * sxx - sx * sx), np.nan)
+        return pd.DataFrame(slopes, index=self.types, columns=[emotion.lower() for emotion in EMOTIONS])
+
+    def describe(self, window=None, type='day'):
+        """
+        Describes the trend of every emotion of one row type over a window.
+
+        Args:
+            window (int, optional): The window length in days. Defaults to the whole history.
+            type (str, optional): The row type. Defaults to 'day'.
+
+        Returns:
+            dict: A sentence per emotion, keyed by the lowercase emotion name.
+        """
+        window = min(window or self.n_days, self.n_days)
+        slopes = self.slopes(window).loc[type]
+        return {emotion: describe_trend(emotion, slope * (window - 1)) for emotion, slope in slopes.items()}
+
+    def describe_windows(self, windows=None, type='day'):
+        """
+        Describes the trends of one row type over several windows.
+
+        Args:
+            windows (list of int, optional): The window lengths in days. Defaults to TREND_WINDOWS.
+            type (str, optional): The row type. Defaults to 'day'.
+
+        Returns:
+            dict: The describe() sentences of every window, keyed by window length.
+        """
+        return {window: self.describe(window, type=type) for window in windows or TREND_WINDOWS}
+
+
+def describe_trend(emotion, change):
+    """
+    Describes the change of an emotion score over a window.
+
+    Args:
+        emotion (str): The lowercase emotion name, e.g. 'happy'.
+        change (float): The change of the fitted score from the first to the last day of the window.
+
+    Returns:
+        str: A sentence describing the trend.
+    """
+    name = EMOTION_NAMES[emotion]
+    if change > TREND_STRONG_CHANGE:
+        return f"The data shows a strong upward trend in related to {name}"
+    elif change > TREND_MODEST_CHANGE:
+        return f"The analysis reveals a modest increase related to {name}."
+    elif change < -TREND_STRONG_CHANGE:
+        return f"The data shows a strong downward  trend in related to {name}."
+    elif change < -TREND_MODEST_CHANGE:
+        return f"The analysis reveals a modest decrease related to {name}."
+    else:
+        return f"Your emotion related to {name} is steady."
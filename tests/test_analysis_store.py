@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+from src.analysis_store import AnalysisStore
+from src.backfill import backfill_emotions
+from src.storage import SQLiteStorage
+
+spacy = pytest.importorskip('spacy')
+
+
+def save_model(path, patterns):
+    nlp = spacy.blank('en')
+    nlp.add_pipe('entity_ruler').add_patterns(patterns)
+    nlp.to_disk(path)
+    return str(path)
+
+
+@pytest.fixture
+def models(tmp_path):
+    return {
+        'people': save_model(tmp_path / 'people', [{'label': 'PERSON', 'pattern': 'Alice'}]),
+        'places': save_model(tmp_path / 'places', [{'label': 'GPE', 'pattern': 'Paris'}]),
+    }
+
+
+@pytest.fixture
+def text_df():
+    return pd.DataFrame({
+        'record_dt': ['2024-05-01', '2024-05-02'],
+        'highlights_txt': ['Lunch with Alice in Paris.', 'Alice called.'],
+        'work_txt': ['', 'Meeting in Paris.'],
+        'family_txt': ['', ''],
+        'friends_txt': ['Alice again.', ''],
+        'combined_txt': ['', ''],
+    })
+
+
+def test_model_change_reanalyses_entries(tmp_path, models, text_df):
+    db_path = str(tmp_path / 'analysis.db')
+    people_store = AnalysisStore(db_path, models['people'])
+    assert people_store.index_text_df(text_df) == 2
+    assert people_store.index_text_df(text_df) == 0
+    assert people_store.get_name_counts('2024-05-01', '2024-05-02') == {'PERSON': {'Alice': 3}}
+
+    places_store = AnalysisStore(db_path, models['places'])
+    assert places_store.index_text_df(text_df) == 2
+    assert places_store.get_name_counts('2024-05-01', '2024-05-02') == {'GPE': {'Paris': 2}}
+    assert places_store.get_ner_by_category('2024-05-01', '2024-05-02')['work']['gpe'].tolist() == [1]
+    # The counts of the first model are kept for it
+    assert people_store.get_name_counts('2024-05-01', '2024-05-02') == {'PERSON': {'Alice': 3}}
+
+
+def test_backfill_stores_the_entity_counts_of_its_model(tmp_path, models, text_df):
+    storage = SQLiteStorage(str(tmp_path / 'diary.db'))
+    storage.append('text', text_df)
+    db_path = str(tmp_path / 'analysis.db')
+    backfill_emotions(
+        storage, engine='lexicon', model_name=models['places'], workers=1,
+        work_dir=str(tmp_path / 'backfill'), analysis_db_path=db_path,
+    )
+    store = AnalysisStore(db_path, models['places'])
+    assert store.index_text_df(text_df) == 0
+    assert store.get_name_counts('2024-05-01', '2024-05-02') == {'GPE': {'Paris': 2}}
+    assert AnalysisStore(db_path, models['people']).index_text_df(text_df) == 2
+
+
+def test_backfill_only_deletes_its_own_files(tmp_path, models, text_df):
+    storage = SQLiteStorage(str(tmp_path / 'diary.db'))
+    storage.append('text', text_df)
+    work_dir = tmp_path / 'backfill'
+    work_dir.mkdir()
+    (work_dir / 'notes.txt').write_text('keep me')
+    backfill_emotions(
+        storage, engine='lexicon', model_name=models['places'], chunk_size=1, workers=1,
+        work_dir=str(work_dir), analysis_db_path=str(tmp_path / 'analysis.db'),
+    )
+    assert storage.count('emotions') > 0
+    assert sorted(path.name for path in work_dir.iterdir()) == ['notes.txt']
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from src.emotion_engines import EMOTIONS, LexiconEmotionEngine
+
+SAMPLE_TEXTS = [
+    "I went for a walk and this is what you can do.",
+    "I was so happy to see Alice, what a wonderful surprise!",
+    "Work was awful today, I am angry and tired of the meetings.",
+    "I'm not happy about the news, I feel lonely and scared.",
+    "ty for the bday party, it was gr8 lol",
+    "We met at 10 and left at 12, nothing special.",
+    "I won't lie, the exam made me nervous but I passed it.",
+    "",
+]
+
+
+@pytest.fixture(scope='module')
+def lexicon_engine():
+    try:
+        return LexiconEmotionEngine()
+    except ImportError:
+        pytest.skip("text2emotion is not installed")
+
+
+def test_stopwords_are_not_emotion_words(lexicon_engine):
+    scores = lexicon_engine.score(["I went for a walk and this is what you can do."])
+    assert scores.tolist() == [[0.0] * len(EMOTIONS)]
+
+
+def test_shortcuts_and_digits(lexicon_engine):
+    assert lexicon_engine.count(["gr8"]).sum() == lexicon_engine.count(["great"]).sum() > 0
+    assert lexicon_engine.count(["2024 12"]).sum() == 0
+
+
+def test_counts_sum_over_texts(lexicon_engine):
+    counts = lexicon_engine.count(SAMPLE_TEXTS)
+    assert counts.shape == (len(SAMPLE_TEXTS), len(EMOTIONS))
+    assert np.allclose(counts.sum(axis=0), lexicon_engine.count([" ".join(SAMPLE_TEXTS)])[0])
+
+
+def test_parity_with_text2emotion(lexicon_engine):
+    try:
+        import text2emotion as te
+
+        expected = [[te.get_emotion(text)[emotion] for emotion in EMOTIONS] for text in SAMPLE_TEXTS]
+    except LookupError:
+        pytest.skip("text2emotion needs the NLTK punkt, stopwords and wordnet data")
+    if not lexicon_engine.name.endswith('-nltk-wordnet'):
+        pytest.skip("the lexicon engine needs the NLTK stopwords and wordnet data for parity")
+    assert lexicon_engine.score(SAMPLE_TEXTS).tolist() == expected
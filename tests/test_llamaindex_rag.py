@@ -0,0 +1,34 @@
+import json
+from src.llamaindex_rag import load_manifest, sync_index
+from src.storage import SQLiteStorage
+from src.synthetic import generate_diary
+
+
+class RecordingIndex:
+    def __init__(self):
+        self.nodes = []
+        self.deleted = []
+
+    def insert_nodes(self, nodes):
+        self.nodes.extend(nodes)
+
+    def delete_ref_doc(self, doc_id):
+        self.deleted.append(doc_id)
+
+
+def test_sync_index_upgrades_a_pdf_manifest(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'diary.db'))
+    storage.append('text', generate_diary(3, seed=4))
+    manifest_path = str(tmp_path / 'manifest.json')
+    # Manifest of the index built from the diary PDF, before the text table was the source
+    with open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+        json.dump({'files': {'my_diary.pdf': 'abc'}, 'documents': {'my_diary.pdf_0': 'def'}}, manifest_file)
+
+    index = RecordingIndex()
+    manifest = load_manifest(manifest_path)
+    assert sync_index(index, manifest, manifest_path, storage=storage) == 12
+    assert index.deleted == ['my_diary.pdf_0']
+
+    manifest = load_manifest(manifest_path)
+    assert manifest['text_rows'] == 3 and 'files' not in manifest
+    assert sync_index(index, manifest, manifest_path, storage=storage) == 0
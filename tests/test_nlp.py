@@ -0,0 +1,16 @@
+import pytest
+from src.nlp import get_nlp, get_nlp_stats, get_peak_rss_mb
+
+spacy = pytest.importorskip('spacy')
+
+
+def test_get_nlp_records_load_stats(tmp_path):
+    model_path = str(tmp_path / 'model')
+    spacy.blank('en').to_disk(model_path)
+
+    nlp = get_nlp(model_path)
+    assert get_nlp(model_path) is nlp
+    stats = get_nlp_stats()[model_path]
+    assert stats['load_seconds'] >= 0
+    if get_peak_rss_mb() is not None:
+        assert stats['memory_mb'] >= 0
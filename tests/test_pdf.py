@@ -0,0 +1,85 @@
+from datetime import date
+import json
+import os
+import PyPDF2
+import pytest
+from src.pdf import CreateDiary, get_page_date
+from src.prompts import diary_questions, format_diary_section
+
+
+def entry_content(record_dt, text='A quiet day.'):
+    return "\n\n".join(format_diary_section(question, text, record_dt) for question in diary_questions.values())
+
+
+@pytest.fixture
+def diary(tmp_path):
+    diary = CreateDiary()
+    diary.diary_page_directory = str(tmp_path / 'diary_pages')
+    diary.my_diary_directory = str(tmp_path / 'my_diary')
+    os.makedirs(diary.my_diary_directory)
+    return diary
+
+
+def page_dates(path):
+    return [get_page_date(page) for page in PyPDF2.PdfReader(path).pages]
+
+
+def test_migrate_legacy_diary(diary, tmp_path):
+    # The legacy diary: every page ever written, in a single file
+    legacy_dates = [date(2024, 2, 27), date(2024, 3, 1), date(2024, 3, 2)]
+    pdf_writer = PyPDF2.PdfWriter()
+    for i, record_dt in enumerate(legacy_dates):
+        page_path = str(tmp_path / f'legacy_{i}.pdf')
+        diary.render_page(page_path, entry_content(record_dt), record_dt)
+        pdf_writer.append(page_path)
+    with open(os.path.join(diary.my_diary_directory, 'my_diary.pdf'), 'wb') as legacy_file:
+        pdf_writer.write(legacy_file)
+
+    # The first page saved afterwards splits the legacy diary into the monthly volumes
+    diary.create_pdf('2024_03_05.pdf', entry_content(date(2024, 3, 5)), date(2024, 3, 5))
+
+    volumes_dir = diary.my_diary_directory
+    assert page_dates(os.path.join(volumes_dir, 'my_diary_2024_02.pdf')) == [date(2024, 2, 27)]
+    assert page_dates(os.path.join(volumes_dir, 'my_diary_2024_03.pdf')) == [
+        date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 5)
+    ]
+    assert not os.path.exists(os.path.join(volumes_dir, 'my_diary.pdf'))
+    assert os.path.exists(os.path.join(volumes_dir, 'my_diary.pdf.migrated'))
+
+    with open(os.path.join(volumes_dir, 'my_diary_index.json'), encoding='utf-8') as index_file:
+        volumes = json.load(index_file)['volumes']
+    assert volumes['my_diary_2024_03.pdf'] == [
+        {'record_dt': '2024-03-01', 'page': 'my_diary.pdf#2'},
+        {'record_dt': '2024-03-02', 'page': 'my_diary.pdf#3'},
+        {'record_dt': '2024-03-05', 'page': '2024_03_05.pdf'},
+    ]
+    assert diary.migrate_legacy_diary() == {}
+
+
+def test_export_range_writes_bounded_volumes(tmp_path, monkeypatch):
+    from src import pdf
+    from src.storage import SQLiteStorage, iter_range_chunks
+    from src.synthetic import generate_diary
+
+    storage = SQLiteStorage(str(tmp_path / 'diary.db'))
+    text_df = generate_diary(12, seed=3)
+    storage.append('text', text_df)
+    begin_dt, end_dt = text_df['record_dt'].iloc[2], text_df['record_dt'].iloc[10]
+    expected = [date.fromisoformat(record_dt) for record_dt in text_df['record_dt'].iloc[2:11]]
+    output_path = str(tmp_path / 'export.pdf')
+
+    def chunks():
+        return iter_range_chunks('text', begin_dt, end_dt, chunk_size=5, storage=storage)
+
+    # A range that fits in one volume is written to the output path
+    assert CreateDiary().export_range(chunks(), output_path, workers=1) == [output_path]
+    assert page_dates(output_path) == expected
+
+    monkeypatch.setattr(pdf, 'EXPORT_VOLUME_SIZE', 4)
+    paths = CreateDiary().export_range(chunks(), output_path, workers=1)
+    assert paths == [str(tmp_path / f'export_{i:03d}.pdf') for i in (1, 2, 3)]
+    assert [date for path in paths for date in page_dates(path)] == expected
+
+    paths = CreateDiary().export_range(chunks(), str(tmp_path / 'single.pdf'), workers=1, single_file=True)
+    assert paths == [str(tmp_path / 'single.pdf')]
+    assert page_dates(paths[0]) == expected
@@ -0,0 +1,84 @@
+import re
+import pandas as pd
+import pytest
+from src.query_router import QueryRouter, parse_window
+from src.synthetic import generate_diary, generate_emotions
+
+
+@pytest.fixture(scope='module')
+def emotions_df():
+    emotions_df = generate_emotions(generate_diary(200, seed=1), seed=1)
+    emotions_df['record_dt'] = pd.to_datetime(emotions_df['record_dt'])
+    return emotions_df
+
+
+@pytest.fixture(scope='module')
+def router(emotions_df):
+    ner_df = pd.DataFrame({'text': ['Alice', 'Paris'], 'person': [3, 0], 'gpe': [0, 2], 'org': [0, 0]})
+    return QueryRouter(emotions_df, ner_df)
+
+
+def last_days(emotions_df, days, entry_type):
+    start = emotions_df['record_dt'].max() - pd.Timedelta(days=days)
+    return emotions_df[(emotions_df['record_dt'] > start) & (emotions_df['type'] == entry_type)]
+
+
+def test_parse_window():
+    assert parse_window("average happiness over the last week") == 7
+    assert parse_window("most common emotion in the last 2 weeks") == 14
+    assert parse_window("fear at work last month") == 30
+    assert parse_window("happiness this year") == 365
+    assert parse_window("what is my average happiness?") is None
+
+
+def test_average_over_last_week(router, emotions_df):
+    answer = router.route("What is my average happiness over the last week?")
+    expected = last_days(emotions_df, 7, 'day')
+    assert f"{expected['happy'].mean():.2f}" in answer
+    assert f"over {len(expected)} entries" in answer
+    assert "last 7 days" in answer
+
+
+def test_average_fear_at_work_last_month(router, emotions_df):
+    answer = router.route("average fear score at work last month")
+    expected = last_days(emotions_df, 30, 'work')
+    assert f"{expected['fear'].mean():.2f}" in answer
+    assert f"over {len(expected)} entries" in answer
+
+
+def test_most_common_emotion_in_last_two_weeks(router, emotions_df):
+    answer = router.route("most common emotion in the last 2 weeks")
+    counts = last_days(emotions_df, 14, 'day')['main_emotion'].value_counts()
+    assert answer.startswith(f"{counts.index[0]} is the most common main emotion")
+    assert f"({counts.iloc[0]} of {counts.sum()} entries)" in answer
+
+
+def test_happiest_day_last_month(router, emotions_df):
+    answer = router.route("Which day was I happiest in the last month?")
+    expected = last_days(emotions_df, 30, 'day')
+    best_day = expected.loc[expected['happy'].idxmax(), 'record_dt'].strftime('%Y-%m-%d')
+    assert best_day in answer
+    assert f"score {expected['happy'].max():.2f}" in answer
+
+
+def test_without_window_uses_the_whole_range(router, emotions_df):
+    answer = router.route("What is my average happiness?")
+    days = emotions_df[emotions_df['type'] == 'day']
+    assert f"{days['happy'].mean():.2f}" in answer
+    assert "last" not in answer
+
+
+def test_most_cited_person(router):
+    assert "Alice" in router.route("Who is the most cited person?")
+    # The entity counts can't be restricted to a window
+    assert router.route("Who is the most cited person in the last week?") is None
+
+
+def test_current_emotion(router, emotions_df):
+    last_day = emotions_df['record_dt'].max().strftime('%Y-%m-%d')
+    assert re.search(rf"on {last_day}, your latest entry", router.route("How am I feeling?"))
+
+
+def test_open_questions_go_to_the_agent(router):
+    assert router.route("Why was I sad about my family last week?") is None
+    assert router.route("What did I eat with Alice in Paris?") is None
@@ -0,0 +1,96 @@
+from types import SimpleNamespace
+import time
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llama_index.core.chat_engine.types import AgentChatResponse
+from llama_index.core.memory import ChatMemoryBuffer
+from src.agent import CachedAgent
+from src.emotion_cache import EmotionCache
+from src.response_cache import ResponseCache
+
+
+class EchoAgent:
+    """Answers with the question and the number of messages it remembers, like a chat agent."""
+
+    def __init__(self):
+        self.memory = ChatMemoryBuffer.from_defaults()
+        self.calls = 0
+
+    def query(self, prompt):
+        self.calls += 1
+        answer = f"{prompt} after {len(self.memory.get_all())} messages"
+        self.memory.put_messages([
+            ChatMessage(role=MessageRole.USER, content=prompt), ChatMessage(role=MessageRole.ASSISTANT, content=answer)
+        ])
+        return answer
+
+
+def make_agent(cache):
+    cached_agent = CachedAgent(None, None, '2024-01-01', '2024-12-31', 1, cache=cache)
+    cached_agent._agent = EchoAgent()
+    return cached_agent
+
+
+def test_lru_eviction(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'), max_entries=2)
+    cache.put('answer', {}, 'one', '1')
+    cache.put('answer', {}, 'two', '2')
+    assert cache.get('answer', {}, 'One?') == '1'
+    cache.put('answer', {}, 'three', '3')
+    assert cache.get('answer', {}, 'two') is None
+    assert cache.get('answer', {}, 'one') == '1'
+
+    emotion_cache = EmotionCache(str(tmp_path / 'emotions.db'), max_entries=1)
+    emotion_cache.put('engine-1', 'text', {'Happy': 1.0})
+    assert emotion_cache.get('engine-1', 'text') == {'Happy': 1.0}
+    assert emotion_cache.get('engine-2', 'text') is None
+    emotion_cache.put('engine-1', 'other', {'Sad': 1.0})
+    assert emotion_cache.get('engine-1', 'text') is None
+
+
+def test_answers_depend_on_the_conversation(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'))
+    first = make_agent(cache)
+    assert first.query("who is Alice?") == "who is Alice? after 0 messages"
+    assert first.query("and Bob?") == "and Bob? after 2 messages"
+
+    # The same first question of a new conversation is answered from the cache
+    second = make_agent(cache)
+    assert second.query("Who is Alice") == "who is Alice? after 0 messages"
+    assert second._agent.calls == 0
+    # ...and added to the agent memory, so a follow-up sees it
+    assert [message.content for message in second._agent.memory.get_all()] == ["Who is Alice", "who is Alice? after 0 messages"]
+    assert second.query("and Bob?") == "and Bob? after 2 messages"
+    assert second._agent.calls == 0
+
+    # A follow-up asked after a different conversation is not reused
+    third = make_agent(cache)
+    third.remember("what is my mood?", "Happy")
+    assert third.get_cached_answer("and Bob?") is None
+    assert third.query("and Bob?") == "and Bob? after 2 messages"
+    assert third._agent.calls == 1
+
+
+class SlowStreamingAgent(EchoAgent):
+    """Takes longer than the chat timeout to finish its reasoning step."""
+
+    def create_task(self, prompt):
+        return SimpleNamespace(task_id='task', extra_state={'current_reasoning': []})
+
+    def stream_step(self, task_id):
+        time.sleep(0.5)
+        return SimpleNamespace(is_last=True)
+
+    def finalize_response(self, task_id, step_output):
+        return AgentChatResponse(response='late answer')
+
+
+def test_timed_out_stream_discards_the_agent(tmp_path):
+    cached_agent = make_agent(ResponseCache(str(tmp_path / 'responses.db')))
+    cached_agent._agent = SlowStreamingAgent()
+    chat_stream = cached_agent.stream("who is Alice?", timeout=0.1)
+    assert list(chat_stream.iter_events()) == []
+    assert chat_stream.status == 'timeout'
+    # The agent may still record the late turn, so it is rebuilt from the history on the next question
+    assert cached_agent._agent is None
+    assert cached_agent.history == []
+    assert cached_agent.get_cached_answer("who is Alice?") is None
@@ -0,0 +1,49 @@
+import pytest
+from src import storage as storage_module
+from src.storage import CsvStorage, SQLiteStorage, get_storage, migrate_csv_to_sqlite
+from src.synthetic import generate_diary, generate_emotions
+
+
+@pytest.fixture
+def csv_storage(tmp_path):
+    csv_storage = CsvStorage(str(tmp_path / 'data'))
+    text_df = generate_diary(30, seed=2)
+    csv_storage.append('text', text_df)
+    csv_storage.append('emotions', generate_emotions(text_df, seed=2))
+    return csv_storage
+
+
+def test_migrate_csv_to_sqlite_once(csv_storage, tmp_path):
+    sqlite_storage = SQLiteStorage(str(tmp_path / 'diary.db'))
+    assert migrate_csv_to_sqlite(csv_storage, sqlite_storage) == {'text': 30, 'emotions': 150}
+    assert migrate_csv_to_sqlite(csv_storage, sqlite_storage) == {}
+    assert sqlite_storage.count('text') == 30
+    assert sqlite_storage.get_date_bounds('emotions') == csv_storage.get_date_bounds('emotions')
+
+
+def test_get_storage_migrates_an_empty_database(csv_storage, tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'diary.db')
+    monkeypatch.setitem(storage_module.STORAGE_BACKENDS, 'sqlite', lambda: SQLiteStorage(db_path))
+    monkeypatch.setattr(storage_module, 'CsvStorage', lambda: csv_storage)
+    storage = get_storage('sqlite')
+    assert storage.count('emotions') == 150
+    assert storage.get_date_bounds('text') == csv_storage.get_date_bounds('text')
+
+
+def test_empty_diary_date_bounds(tmp_path):
+    assert SQLiteStorage(str(tmp_path / 'diary.db')).get_date_bounds('emotions') == (None, None)
+    assert CsvStorage(str(tmp_path / 'data')).get_date_bounds('emotions') == (None, None)
+
+
+def test_csv_load_without_rows(tmp_path):
+    csv_storage = CsvStorage(str(tmp_path / 'data'))
+    assert csv_storage.load('emotions').columns.to_list() == list(storage_module.TABLE_COLUMNS['emotions'])
+
+    text_df = generate_diary(3, seed=2)
+    csv_storage.append('text', text_df.iloc[:0])
+    empty_df = csv_storage.load('text')
+    assert empty_df.empty
+    assert empty_df.columns.to_list() == text_df.columns.to_list()
+
+    csv_storage.append('text', text_df)
+    assert len(csv_storage.load('text')) == 3
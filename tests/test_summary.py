@@ -0,0 +1,23 @@
+import pandas as pd
+from src import summary
+from src.synthetic import generate_diary, generate_emotions
+
+
+def dashboard_data(emotions_df):
+    emotions_df['record_dt'] = pd.to_datetime(emotions_df['record_dt'])
+    return {'emotions_df': emotions_df, 'ner': {'combined': pd.DataFrame(columns=['text', 'person'])}}
+
+
+def test_dashboard_summary_of_an_empty_range(monkeypatch):
+    empty_df = generate_emotions(generate_diary(5, seed=5)).iloc[:0].copy()
+    monkeypatch.setattr(summary, 'get_dashboard_data', lambda *args: dashboard_data(empty_df))
+    assert summary.get_dashboard_summary.__wrapped__('2024-01-01', '2024-01-02', 0) is None
+
+
+def test_dashboard_summary_without_trend_engine(monkeypatch):
+    emotions_df = generate_emotions(generate_diary(5, seed=5))
+    monkeypatch.setattr(summary, 'get_dashboard_data', lambda *args: dashboard_data(emotions_df))
+    monkeypatch.setattr(summary.TrendEngine, 'from_emotions_df', classmethod(lambda cls, df: None))
+    dashboard_summary = summary.get_dashboard_summary.__wrapped__('2024-01-01', '2024-12-31', 0)
+    assert set(dashboard_summary['trends']) == {'happy', 'angry', 'surprise', 'sad', 'fear'}
+    assert dashboard_summary['window_trends'] == {}